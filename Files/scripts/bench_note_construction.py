@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark note window construction.
+
+Opens COUNT notes at once (200 by default) and reports the time per note and
+the resident memory they added. With --eager every note also builds its
+menus and spell checker right away, the way notes were constructed before
+those became lazy, so running with and without it compares the two. --lines
+sets the length of each note; code notes above LARGE_CODE_LINES lines open
+in large-code mode (try --count 1 --type code --lines 20000).
+
+--tree times the note classes of another checkout of Files/, so a change can
+be measured against the commit before it:
+
+    git worktree add /tmp/before HEAD~1
+    python3 scripts/bench_note_construction.py --tree /tmp/before/Files
+    python3 scripts/bench_note_construction.py
+
+Usage: python3 scripts/bench_note_construction.py [--count 200] [--type text|code] [--lines 5] [--eager] [--tree DIR]
+"""
+import argparse
+import os
+import sys
+import time
+
+FILES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gio, Gtk
+
+class BenchApp(object):
+    """The few parts of the application a note window uses while it is built"""
+
+    def __init__(self):
+        self.settings = Gio.Settings(schema_id='org.x.sticky')
+        self.current_file_name = None
+
+    def new_note(self, *args):
+        pass
+
+    def duplicate_note(self, *args):
+        pass
+
+def flush_events():
+    while Gtk.events_pending():
+        Gtk.main_iteration_do(False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure note window construction time and memory")
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--type', choices=('text', 'code'), default='text')
+    parser.add_argument('--lines', type=int, default=5, help="lines of text in each note")
+    parser.add_argument('--eager', action='store_true', help="build menus and spell checker up front")
+    parser.add_argument('--tree', default=FILES_DIR, help="the Files/ directory whose note classes are timed")
+    args = parser.parse_args()
+
+    # the note modules are imported from the chosen tree, which may be an older checkout
+    tree = os.path.abspath(args.tree)
+    sys.path.insert(0, os.path.join(tree, 'src'))
+    sys.path.insert(0, tree)
+    from src.note_extended import NoteExtended
+    from src.note_code import NoteCode
+    from src.note_hibernation import resident_memory_mb
+
+    app = BenchApp()
+    note_class = NoteCode if args.type == 'code' else NoteExtended
+    text = "Benchmark note with a little text in it.\n" * args.lines
+
+    flush_events()
+    memory_before = resident_memory_mb()
+    start = time.perf_counter()
+
+    notes = []
+    for i in range(args.count):
+        note = note_class(app, None, {'x': 20 + i % 40 * 10, 'y': 20 + i % 30 * 10, 'text': text})
+        if args.eager:
+            note.build_menus()
+            note.setup_spell_checker(note.view, None)
+        notes.append(note)
+
+    flush_events()
+    elapsed = time.perf_counter() - start
+    memory_after = resident_memory_mb()
+
+    mode = "eager" if args.eager else "lazy"
+    print(f"{tree}")
+    print(f"{args.count} {args.type} notes ({mode}): {elapsed:.2f}s, {elapsed / args.count * 1000:.1f} ms per note")
+    if memory_before is not None and memory_after is not None:
+        added = memory_after - memory_before
+        print(f"memory: {added:.1f} MB added, {added / args.count * 1024:.0f} KB per note")
+
+    for note in notes:
+        note.destroy()
+
+if __name__ == '__main__':
+    main()
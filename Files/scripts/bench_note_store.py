@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Note Book data layer without a display.
+
+Fills a temporary data directory with FILES Note Files of NOTES notes each
+(every third note a sub-note of the one before it), then times loading
+notebook.json, building the hierarchy of every Note File, reordering and
+saving through NoteStore.
+
+Usage: python3 scripts/bench_note_store.py [--files 20] [--notes 500]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.note_store import NoteStore
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"{label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    return result
+
+def fill(store, files, notes):
+    for file_number in range(files):
+        file_name = f"File {file_number}"
+        store.create_file(file_name)
+        previous = None
+        for note_number in range(notes):
+            note_data = {'title': f"Note {note_number}", 'text': "Some text in a note.\n" * 5,
+                         'id_tag': str(1000 + note_number)}
+            if previous and note_number % 3 == 0:
+                note_data['parent_id'] = previous
+            # writing notebook.json after every note would make the fill itself quadratic
+            previous = store.save_note(note_data)
+            store.note_files[file_name].append(previous)
+    store.save()
+
+def build_hierarchies(store):
+    for file_name in store.file_names():
+        store.hierarchy(store.notes_in(file_name), {})
+
+def reorder(store):
+    for file_name in store.file_names():
+        note_ids = store.notes_in(file_name)
+        store.move_before(file_name, note_ids[-1], note_ids[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="Time NoteStore operations on a generated notebook")
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--notes', type=int, default=500)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        store = NoteStore(data_dir)
+        store.load()
+        timed(f"write {args.files * args.notes} notes", fill, store, args.files, args.notes)
+
+        store = NoteStore(data_dir)
+        timed("load notebook.json", store.load)
+        timed("build every hierarchy", build_hierarchies, store)
+        timed("move one note per file", reorder, store)
+        timed("collect index entries", store.index_entries)
+    finally:
+        shutil.rmtree(data_dir)
+
+if __name__ == '__main__':
+    main()
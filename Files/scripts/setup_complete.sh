@@ -41,21 +41,20 @@ export GI_TYPELIB_PATH="/usr/lib/x86_64-linux-gnu/girepository-1.0"
 export XDG_DATA_DIRS="/usr/local/share:/usr/share:${XDG_DATA_DIRS:-}"
 
 # Use system Python with GTK bindings
-if [ -f "$NOTEBOOK_DIR/notebook_wrapper.py" ]; then
+# (arguments such as --gapplication-service from the D-Bus service file are passed on)
+if [ -f "$NOTEBOOK_DIR/src/notebook_wrapper.py" ]; then
     cd "$NOTEBOOK_DIR"
-    exec python3 -c "
-import os, sys
-sys.path.insert(0, os.environ['PYTHONPATH'])
-with open('notebook_wrapper.py') as f:
-    exec(f.read())
-" "$@"
+    exec python3 "$NOTEBOOK_DIR/src/notebook_wrapper.py" "$@"
 else
-    echo "Error: notebook_wrapper.py not found in $NOTEBOOK_DIR"
+    echo "Error: src/notebook_wrapper.py not found in $NOTEBOOK_DIR"
     exit 1
 fi
 EOF
 chmod +x ~/.local/bin/notebook-launcher
 
+# Command line interface (no GTK needed)
+ln -sf ~/.local/share/notebook/Files/notebook ~/.local/bin/notebook
+
 # Create desktop entry
 echo "=== Creating Desktop Entry ==="
 cat > ~/.local/share/applications/notebook.desktop << EOF
@@ -73,6 +72,15 @@ StartupNotify=true
 StartupWMClass=notebook
 EOF
 
+# Let D-Bus start Note Book on demand (e.g. gapplication action org.x.notebook new-note)
+echo "=== Registering D-Bus Service ==="
+mkdir -p ~/.local/share/dbus-1/services
+cat > ~/.local/share/dbus-1/services/org.x.notebook.service << EOF
+[D-BUS Service]
+Name=org.x.notebook
+Exec=$HOME/.local/bin/notebook-launcher --gapplication-service
+EOF
+
 # Update desktop database
 update-desktop-database ~/.local/share/applications
 
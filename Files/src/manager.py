@@ -1,96 +1,17 @@
 #!/usr/bin/python3
 
-from gi.repository import Gdk, Gio, GLib, GObject, Gtk, Pango, XApp
-from src.note_buffer import NoteBuffer
+import uuid
+
+from gi.repository import Gdk, Gio, GLib, GObject, Gtk
+from src.preview_cache import PreviewCache, PREVIEW_SIZE
 from utils.common import HoverBox
-from utils.util import clean_text
+from utils.search_pipeline import SearchPipeline
+from utils.util import find_match, list_diff, make_snippet, preview_text
 
 NOTE_TARGETS = [Gtk.TargetEntry.new('note-entry', Gtk.TargetFlags.SAME_APP, 1)]
 
-class NoteEntry(Gtk.Container):
-    initialized = False
-
-    def __init__(self, item, settings):
-        super(NoteEntry, self).__init__(height_request=150,
-                                        width_request=150,
-                                        valign=Gtk.Align.START,
-                                        halign=Gtk.Align.CENTER)
-
-        self.item = item
-        self.settings = settings
-
-        self.set_has_window(False)
-        self.style_manager = XApp.StyleManager(widget=self)
-
-        self.title_bar = Gtk.Box(name='title-bar', visible=True)
-        self.title_bar.pack_start(Gtk.Label(label=item.title, name='title', visible=True, margin_top=5, margin_bottom=5, ellipsize=Pango.EllipsizeMode.END), False, False, 0)
-        self.title_bar.set_parent(self)
-
-        self.buffer = NoteBuffer()
-        self.text = Gtk.TextView(wrap_mode=Gtk.WrapMode.WORD_CHAR, populate_all=True, buffer=self.buffer, visible=True, sensitive=False)
-        self.text.set_parent(self)
-
-        self.buffer.set_view(self.text)
-        self.buffer.set_from_internal_markup(item.text)
-
-        self.settings.connect('changed::font', self.set_font)
-        self.set_font()
-
-        self.set_tooltip_text(item.title)
-
-        self.initialized = True
-
-        self.show_all()
-
-    def do_size_allocate(self, allocation):
-        Gtk.Widget.do_size_allocate(self, allocation)
-
-        title_bar_height = self.title_bar.get_preferred_height()[1]
-
-        title_rect = Gdk.Rectangle()
-        title_rect.x = allocation.x
-        title_rect.y = allocation.y
-        title_rect.width = allocation.width
-        title_rect.height = title_bar_height
-        self.title_bar.size_allocate(title_rect)
-
-        content_rect = Gdk.Rectangle()
-        content_rect.x = allocation.x + 10
-        content_rect.y = allocation.y + title_bar_height + 10
-        content_rect.width = allocation.width - 20
-        content_rect.height = allocation.height - title_bar_height - 20
-        self.text.size_allocate(content_rect)
-
-        self.set_clip(allocation)
-
-    def do_get_preferred_height(self):
-        return 150, 150
-
-    def do_get_preferred_height_for_width(self, width):
-        return 150, 150
-
-    def do_get_preferred_width(self):
-        return 150, 150
-
-    def do_get_preferred_width_for_height(self, height):
-        return 150, 150
-
-    def do_destroy(self):
-        if not self.initialized:
-            return
-
-        self.text.unparent()
-
-        self.initialized = False
-        Gtk.Container.do_destroy(self)
-
-    def do_forall(self, include_internals, callback, *args):
-        if include_internals:
-            callback(self.title_bar, *args)
-            callback(self.text, *args)
-
-    def set_font(self, *args):
-        self.style_manager.set_from_pango_font_string(self.settings.get_string('font'))
+TILE_POOL_SIZE = 64     # released preview images kept around for reuse
+INITIAL_TILES = 40      # tiles filled in before the flow box has been allocated
 
 class GroupEntry(Gtk.ListBoxRow):
     def __init__(self, item):
@@ -213,11 +134,13 @@ class Group(GObject.Object):
         self.model = model
 
 class Note(GObject.Object):
-    def __init__(self, info, group_name):
+    def __init__(self, info, group_name, match=None):
         super(Note, self).__init__()
         self.info = info
         self.group_name = group_name
         self.text = info['text']
+        # match is the (start, end) of a search hit in the note's preview text
+        (self.snippet, self.match) = make_snippet(preview_text(self.text), match)
         if not 'title'in info or info['title'] in [None, '']:
             self.title = _("Untitled")
         else:
@@ -228,6 +151,9 @@ class NotesManager(object):
         self.app = app
         self.dragged_note = None
         self.search_model = Gio.ListStore()
+        self.showing_search = False
+        self.search_pipeline = SearchPipeline(self.find_matching_notes, self.on_search_started, self.on_search_results,
+                                              prepare=self.snapshot_notes)
 
         self.file_handler = file_handler
         self.file_handler.connect('group-changed', self.on_list_changed)
@@ -243,6 +169,24 @@ class NotesManager(object):
         self.note_view.connect('child-activated', self.on_note_activated)
         self.note_view.connect('selected-children-changed', self.on_selected_notes_changed)
 
+        # previews are drawn once into images and cached, see src/preview_cache.py
+        self.preview_cache = PreviewCache(self.note_view)
+        self.preview_notes = {}  # group name -> ids of its notes that have a preview in preview_cache
+        self.app.settings.connect('changed::font', self.on_font_changed)
+
+        # tiles are empty placeholders until they scroll into view, and their images are recycled once they leave it
+        self.bound_model = None
+        self.filled_tiles = set()
+        self.tile_pool = []
+        self.tile_update_id = 0
+        self.note_adjustment = None
+        scrolled_window = self.note_view.get_ancestor(Gtk.ScrolledWindow)
+        if scrolled_window is not None:
+            self.note_adjustment = scrolled_window.get_vadjustment()
+            self.note_adjustment.connect('value-changed', self.queue_tile_update)
+            self.note_adjustment.connect('changed', self.queue_tile_update)
+        self.note_view.connect('size-allocate', self.queue_tile_update)
+
         def create_group_entry(item):
             widget = GroupEntry(item)
             widget.drag_dest_set(Gtk.DestDefaults.MOTION | Gtk.DestDefaults.HIGHLIGHT, NOTE_TARGETS, Gdk.DragAction.MOVE)
@@ -337,29 +281,65 @@ class NotesManager(object):
         self.app.settings.connect('changed::active-group', self.on_active_group_changed)
 
     def on_list_clicked(self, list, event):
-        for note in self.app.notes:
+        for note in self.app.notes.values():
             note.present_with_time(Gtk.get_current_event_time())
 
     def on_list_changed(self, a, group_name):
-        if group_name == self.get_current_group():
-            self.generate_previews()
+        if self.showing_search:
+            # refresh the results instead of replacing them with the group
+            self.on_search_changed()
+        else:
+            group = self.get_group(group_name)
+            if group is not None:
+                self.update_group_model(group)
+
+    def get_group(self, group_name):
+        for position in range(self.group_model.get_n_items()):
+            group = self.group_model.get_item(position)
+            if group.name == group_name:
+                return group
+
+        return None
 
     def generate_group_list(self, *args):
         name = None
-        selected_group_name = self.get_current_group()
-        self.group_model.remove_all()
+        group_names = self.file_handler.get_note_group_names()
 
-        for group_name in self.file_handler.get_note_group_names():
-            model = Gio.ListStore()
-            if self.app.settings.get_string('active-group') == group_name:
-                name = group_name
-            self.group_model.append(Group(group_name, self.file_handler, model))
+        # groups that still exist keep their Group item, and with it their note model
+        groups = {}
+        for position in range(self.group_model.get_n_items()):
+            group = self.group_model.get_item(position)
+            groups[group.name] = group
+
+        for (position, removed, start, end) in list_diff(list(groups), group_names):
+            new_groups = []
+            for group_name in group_names[start:end]:
+                group = groups.get(group_name)
+                if group is None:
+                    group = Group(group_name, self.file_handler, Gio.ListStore())
+                new_groups.append(group)
+
+            self.group_model.splice(position, removed, new_groups)
+
+        for group_name in groups:
+            if group_name not in group_names:
+                for note_id in self.preview_notes.pop(group_name, set()):
+                    self.preview_cache.invalidate((group_name, note_id))
+
+        if self.app.settings.get_string('active-group') in group_names:
+            name = self.app.settings.get_string('active-group')
 
         self.group_list.show_all()
 
         if name is not None:
             self.select_group(name)
 
+        # the selected row may not have changed, but its notes might have (e.g. after restoring a backup)
+        if self.showing_search:
+            self.on_search_changed()
+        else:
+            self.generate_previews()
+
         children = self.group_list.get_children()
         for item in children:
             item.set_can_remove(len(children) != 1)
@@ -386,17 +366,55 @@ class NotesManager(object):
     def on_search_changed(self, *args):
         search_text = self.search_box.get_text().lower().strip()
         if search_text == '':
+            self.search_pipeline.cancel()
+            self.showing_search = False
+            self.search_model.remove_all()
             self.generate_previews()
 
         else:
-            self.search_model.remove_all()
+            self.search_pipeline.request(search_text)
+
+    def snapshot_notes(self, search_text):
+        # the worker thread only ever sees this copy, never the live lists in the file handler
+        notes = []
+        for group_name in self.file_handler.get_note_group_names():
+            for note_info in self.file_handler.get_note_list(group_name):
+                notes.append((note_info, group_name))
+
+        return (search_text, notes)
 
-            for group_name in self.file_handler.get_note_group_names():
-                for note_info in self.file_handler.get_note_list(group_name):
-                    if note_info['title'].lower().find(search_text) != -1 or clean_text(note_info['text']).find(search_text) != -1:
-                        self.search_model.append(Note(note_info, group_name))
+    def find_matching_notes(self, query, is_cancelled):
+        # runs on the search worker thread; title matches are streamed before text matches
+        (search_text, notes) = query
+        text_matches = []
 
-            self.note_view.bind_model(self.search_model, self.create_note_entry)
+        for (note_info, group_name) in notes:
+            if is_cancelled():
+                return
+
+            if note_info.get('title', '').lower().find(search_text) != -1:
+                yield (note_info, group_name, None)
+            else:
+                text_matches.append((note_info, group_name))
+
+        for (note_info, group_name) in text_matches:
+            if is_cancelled():
+                return
+
+            match = find_match(preview_text(note_info.get('text', '')), search_text)
+            if match is not None:
+                yield (note_info, group_name, match)
+
+    def on_search_started(self):
+        self.search_model.remove_all()
+
+        if not self.showing_search:
+            self.showing_search = True
+            self.bind_note_model(self.search_model)
+
+    def on_search_results(self, results):
+        notes = [Note(note_info, group_name, match) for (note_info, group_name, match) in results]
+        self.search_model.splice(self.search_model.get_n_items(), 0, notes)
 
     def open_search(self, *args):
         self.search_bar.set_search_mode(True)
@@ -413,9 +431,15 @@ class NotesManager(object):
         self.remove_note_button.set_sensitive(sensitive)
         self.duplicate_note_button.set_sensitive(sensitive)
 
+    def bind_note_model(self, model):
+        self.bound_model = model
+        self.filled_tiles = set()
+        self.note_view.bind_model(model, self.create_note_entry)
+
     def create_note_entry(self, item):
         widget = Gtk.FlowBoxChild()
         widget.item = item
+        widget.preview = None
 
         dnd_wrapper = Gtk.EventBox(above_child=True)
         dnd_wrapper.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, NOTE_TARGETS, Gdk.DragAction.MOVE)
@@ -426,34 +450,139 @@ class NotesManager(object):
         outer_box.set_receives_default(True)
         dnd_wrapper.add(outer_box)
 
-        wrapper = Gtk.Box(halign=Gtk.Align.CENTER)
+        wrapper = Gtk.Box(halign=Gtk.Align.CENTER, width_request=PREVIEW_SIZE, height_request=PREVIEW_SIZE)
         context = wrapper.get_style_context()
         context.add_class(item.info['color'])
         context.add_class('note-preview')
         outer_box.pack_start(wrapper, False, False, 0)
+        widget.wrapper = wrapper
 
-        entry = NoteEntry(item, self.app.settings)
-        wrapper.pack_start(entry, False, False, 0)
-
+        widget.set_tooltip_text(item.title)
         widget.show_all()
 
+        self.queue_tile_update()
+
         return widget
 
+    def queue_tile_update(self, *args):
+        if not self.tile_update_id:
+            self.tile_update_id = GLib.idle_add(self.update_visible_tiles)
+
+    def get_visible_range(self):
+        # all tiles have the same size, so the range in view can be worked out from the first one
+        count = self.bound_model.get_n_items() if self.bound_model is not None else 0
+        first = self.note_view.get_child_at_index(0)
+        if first is None:
+            return (0, 0)
+
+        tile = first.get_allocation()
+        if self.note_adjustment is None:
+            return (0, count)
+        if tile.width <= 1:
+            return (0, min(count, INITIAL_TILES))
+
+        tile_width = tile.width + self.note_view.get_column_spacing()
+        tile_height = tile.height + self.note_view.get_row_spacing()
+        columns = (self.note_view.get_allocated_width() + self.note_view.get_column_spacing()) // tile_width
+        columns = max(self.note_view.get_min_children_per_line(), min(columns, self.note_view.get_max_children_per_line()), 1)
+
+        # one extra row above and below, so scrolling a little doesn't show empty tiles
+        top = self.note_adjustment.get_value() - tile.y
+        first_row = max(0, int(top // tile_height) - 1)
+        last_row = int((top + self.note_adjustment.get_page_size()) // tile_height) + 1
+
+        return (first_row * columns, min(count, (last_row + 1) * columns))
+
+    def update_visible_tiles(self):
+        self.tile_update_id = 0
+
+        (start, end) = self.get_visible_range()
+        visible = set()
+        for index in range(start, end):
+            child = self.note_view.get_child_at_index(index)
+            if child is None:
+                break
+
+            visible.add(child)
+            if child.preview is None:
+                self.fill_tile(child)
+
+        for child in self.filled_tiles - visible:
+            self.empty_tile(child)
+
+        self.filled_tiles = visible
+
+        return GLib.SOURCE_REMOVE
+
+    def fill_tile(self, child):
+        surface = self.preview_cache.get_surface(child.item, self.app.settings.get_string('font'))
+
+        preview = self.tile_pool.pop() if self.tile_pool else Gtk.Image()
+        preview.set_from_surface(surface)
+        child.wrapper.pack_start(preview, False, False, 0)
+        preview.show()
+        child.preview = preview
+
+    def empty_tile(self, child):
+        preview = child.preview
+        child.preview = None
+        if preview is None or child.get_parent() is None:
+            # the tile was removed from the flow box together with its image
+            return
+
+        child.wrapper.remove(preview)
+        if len(self.tile_pool) < TILE_POOL_SIZE:
+            preview.clear()
+            self.tile_pool.append(preview)
+
     def generate_previews(self, *args):
         selected_row = self.group_list.get_selected_row()
         if selected_row is None:
             return
 
-        group_info = selected_row.item
-        group_name = group_info.name
-        model = group_info.model
-
-        model.remove_all()
-
-        for note in self.file_handler.get_note_list(group_name):
-            model.append(Note(note, group_name))
-
-        self.note_view.bind_model(model, self.create_note_entry)
+        self.showing_search = False
+
+        group = selected_row.item
+        self.update_group_model(group)
+
+        if self.bound_model is not group.model:
+            self.bind_note_model(group.model)
+
+    def update_group_model(self, group):
+        # splice the group's persistent model into shape instead of rebuilding it, so the flow box only replaces the
+        # tiles of notes that were added, removed, moved or edited
+        model = group.model
+        notes = self.file_handler.get_note_list(group.name)
+
+        old_ids = [model.get_item(position).info.get('id') for position in range(model.get_n_items())]
+        new_ids = [note_info.get('id') for note_info in notes]
+        for (position, removed, start, end) in list_diff(old_ids, new_ids):
+            model.splice(position, removed, [Note(note_info, group.name) for note_info in notes[start:end]])
+
+        for (position, note_info) in enumerate(notes):
+            item = model.get_item(position)
+            if item.info is not note_info and item.info != note_info:
+                model.splice(position, 1, [Note(note_info, group.name)])
+
+        # let go of the cached previews of notes in this group that were edited or removed
+        font = self.app.settings.get_string('font')
+        note_ids = set()
+        for position in range(model.get_n_items()):
+            item = model.get_item(position)
+            note_id = item.info.get('id')
+            self.preview_cache.use((group.name, note_id), self.preview_cache.get_key(item, font))
+            note_ids.add(note_id)
+        for note_id in self.preview_notes.get(group.name, set()) - note_ids:
+            self.preview_cache.invalidate((group.name, note_id))
+        self.preview_notes[group.name] = note_ids
+
+    def on_font_changed(self, *args):
+        self.preview_cache.clear_memory()
+        self.preview_notes = {}
+
+        # every tile has to be redrawn
+        if self.bound_model is not None:
+            self.bind_note_model(self.bound_model)
 
     def get_current_group(self):
         row = self.group_list.get_selected_row()
@@ -533,27 +662,19 @@ class NotesManager(object):
     def duplicate_note(self, *args):
         selected = self.get_selected_note()
         note_info = selected.copy()
+        note_info['id'] = str(uuid.uuid4())
         note_info['x'] += 50
         note_info['y'] += 50
-        group = self.get_current_group()
-        notes = self.file_handler.get_note_list(group)
-        notes.append(note_info)
-        self.file_handler.update_note_list(notes, group)
+        self.file_handler.apply_changes(self.get_current_group(), {note_info['id']: note_info})
 
     def on_drag_begin(self, widget, *args):
         self.dragged_note = widget.get_parent().item.info
 
     def handle_drop(self, widget, context, x, y, time):
         new_group = widget.item.name
-        new_list = self.file_handler.get_note_list(new_group)
-        new_list.append(self.dragged_note)
-
         old_group = self.get_current_group()
-        old_list = self.file_handler.get_note_list(old_group)
-        old_list.remove(self.dragged_note)
-
-        self.file_handler.update_note_list(new_list, new_group)
-        self.file_handler.update_note_list(old_list, old_group)
+        if new_group != old_group:
+            self.file_handler.move_note(self.dragged_note['id'], old_group, new_group)
 
         self.dragged_note = None
 
@@ -561,19 +682,12 @@ class NotesManager(object):
 
     def handle_new_group_drop(self, widget, context, x, y, time):
         old_group = self.get_current_group()
-        old_list = self.file_handler.get_note_list(old_group)
 
         def on_created(group_name, success):
             if not success:
                 group_name = old_group
             else:
-                old_list.remove(self.dragged_note)
-
-                new_list = self.file_handler.get_note_list(group_name)
-                new_list.append(self.dragged_note)
-
-                self.file_handler.update_note_list(new_list, group_name)
-                self.file_handler.update_note_list(old_list, old_group)
+                self.file_handler.move_note(self.dragged_note['id'], old_group, group_name)
 
             self.dragged_note = None
 
@@ -6,7 +6,6 @@ Identical to NoteExtended but with code editor capabilities.
 
 import gi
 import os
-import uuid
 import sys
 from pathlib import Path
 
@@ -15,7 +14,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 gi.require_version('Gtk', '3.0')
 gi.require_version('GtkSource', '4')
-from gi.repository import Gtk, GtkSource, Gdk, GObject
+from gi.repository import Gtk, GtkSource, Gdk, GObject, GLib
 
 # Constants for GtkSource 4 compatibility
 GTKSOURCE_GUTTER_RENDERER_STATE_NORMAL = 0
@@ -24,21 +23,152 @@ GTKSOURCE_GUTTER_RENDERER_STATE_PRELIT = 2
 GTKSOURCE_GUTTER_RENDERER_STATE_SELECTED = 4
 
 from .note_extended import NoteExtended
+from .note_colors import COLOR_CODES
+from utils.note_store import DEFAULT_DATA_DIR
+from utils.util import code_to_markup
 import gettext
 
 # Initialize gettext for translations
 _ = gettext.gettext
 gettext.install("sticky", "/usr/share/locale", names="ngettext")
 
+LARGE_CODE_LINES = 3000  # code notes longer than this open in large-code mode
+HIGHLIGHT_CHUNK_LINES = 500  # lines highlighted per idle step in large-code mode
+
+color_css_providers = {}  # note color -> CSS provider shared by the editors of every code note of that color
+
+def code_color_class(color):
+    """Return the CSS class that colors code editors in notes of this color.
+
+    Its provider is added to the screen the first time the color is used and
+    stays there, so opening, recoloring and closing code notes never adds or
+    removes style providers.
+    """
+    css_class = f"code-color-{color}"
+    if color not in color_css_providers:
+        background = COLOR_CODES.get(color, '#f6f907')
+        text_color = '#eeeeee' if color == 'black' else '#303030'
+        css = f"""
+        .code-editor.{css_class},
+        .code-editor.{css_class} text {{
+            background-color: {background};
+            color: {text_color};
+        }}
+        .code-editor.{css_class} border {{
+            background-color: {background};
+        }}
+        """
+        
+        provider = Gtk.CssProvider()
+        provider.load_from_data(css.encode())
+        Gtk.StyleContext.add_provider_for_screen(
+            Gdk.Screen.get_default(),
+            provider,
+            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+        )
+        color_css_providers[color] = provider
+    
+    return css_class
+
+SCHEMES_DIR = os.path.join(DEFAULT_DATA_DIR, "styles")
+SCHEMES_STAMP = os.path.join(SCHEMES_DIR, "schemes.stamp")
+SCHEME_VERSION = 1  # bump whenever scheme_xml changes so installed schemes are regenerated
+
+color_schemes = {}  # note color -> GtkSource.StyleScheme
+
+def scheme_xml(color):
+    background = COLOR_CODES.get(color, '#f6f907')
+    text_color = '#eeeeee' if color == 'black' else '#303030'
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<style-scheme id="note-{color}" name="Note {color}" version="1.0">
+  <author>Note Book</author>
+  <description>Dynamic scheme for {color} notes</description>
+  
+  <!-- Basic Settings -->
+  <style name="text"                        foreground="{text_color}" background="{background}"/>
+  <style name="selection"                   background="#4a90d9"/>
+  <style name="cursor"                      foreground="{text_color}"/>
+  <style name="current-line"               background="{background}"/>
+  <style name="line-numbers"               foreground="{text_color}" background="{background}"/>
+  
+  <!-- Syntax Highlighting -->
+  <style name="def:comment"                foreground="#939393"/>
+  <style name="def:constant"               foreground="#8f5902"/>
+  <style name="def:boolean"                foreground="#0000ff"/>
+  <style name="def:number"                 foreground="#0000ff"/>
+  <style name="def:string"                 foreground="#2a6b30"/>
+  <style name="def:keyword"                foreground="#a81919" bold="true"/>
+  <style name="def:function"               foreground="#c4560c"/>
+  <style name="def:type"                   foreground="#2f8c9c" bold="true"/>
+  <style name="def:operator"               foreground="#ce5c00"/>
+  <style name="def:identifier"             foreground="{text_color}"/>
+  <style name="def:statement"              foreground="#204a87"/>
+  <style name="def:preprocessor"           foreground="#ac7d00"/>
+</style-scheme>'''
+
+def install_color_schemes():
+    """Write the style scheme of every note color, unless the ones on disk are already up to date"""
+    stamp = f"{SCHEME_VERSION} " + ','.join(f"{color}={code}" for (color, code) in sorted(COLOR_CODES.items()))
+    try:
+        with open(SCHEMES_STAMP, 'r') as f:
+            if f.read() == stamp:
+                return
+    except OSError:
+        pass
+    
+    os.makedirs(SCHEMES_DIR, exist_ok=True)
+    for color in COLOR_CODES:
+        with open(os.path.join(SCHEMES_DIR, f"note-{color}.xml"), 'w') as f:
+            f.write(scheme_xml(color))
+    with open(SCHEMES_STAMP, 'w') as f:
+        f.write(stamp)
+
+def color_scheme(color):
+    """Return the style scheme for code notes of this color.
+
+    The schemes are written to SCHEMES_DIR once (and again only when they
+    change), the directory is added to the scheme search path once, and each
+    scheme is looked up from the manager once.
+    """
+    if color not in color_schemes:
+        if not color_schemes:
+            install_color_schemes()
+            GtkSource.StyleSchemeManager.get_default().append_search_path(SCHEMES_DIR)
+        color_schemes[color] = GtkSource.StyleSchemeManager.get_default().get_scheme(f"note-{color}")
+    
+    return color_schemes[color]
+
+class GutterBG(GtkSource.GutterRenderer):
+    """A narrow gutter strip painted in the note color"""
+    def __init__(self, rgba):
+        GtkSource.GutterRenderer.__init__(self)
+        self.rgba = rgba
+        # Enable drawing for all states in GtkSource 4
+        self.set_size(5)  # Gutter width
+        
+    def set_rgba(self, rgba):
+        self.rgba = rgba
+        self.queue_draw()
+        
+    def do_draw(self, cr, background_area, cell_area, start, end, state):
+        # In GtkSource 4, state is a flags enum
+        cr.set_source_rgba(self.rgba.red, self.rgba.green, self.rgba.blue, self.rgba.alpha)
+        cr.rectangle(background_area.x, background_area.y, 
+                   background_area.width, background_area.height)
+        cr.fill()
+        
+    def do_query_activatable(self, iter, area, event):
+        # GtkSource 4 requires this for click handling
+        return False
 
 class NoteCode(NoteExtended):
     """
     Code-enabled note with syntax highlighting using GtkSourceView.
     Inherits all features from NoteExtended (save, minimize, delete, spell check, etc.)
-    but replaces TextView with SourceView for code editing.
+    but edits in a SourceView, built by create_editor in place of the TextView.
     """
     
-    def __init__(self, app, parent, info={}):
+    def __init__(self, app, parent, info={}, visible=True):
         # Store language before parent init
         self.language_id = info.get('language', 'python')
         self.is_code_note = True
@@ -46,41 +176,14 @@ class NoteCode(NoteExtended):
         # Prevent the parent class from adding its mode button
         info['is_code_note'] = True
         
-        # Call parent constructor
-        # This will create the note with TextView, which we'll replace
-        super().__init__(app, parent, info)
-        
-        # Now replace the TextView with SourceView
-        self._replace_textview_with_sourceview()
+        # Call parent constructor, which builds the editor through create_editor
+        super().__init__(app, parent, info, visible)
         
         # Add code editor icon to title bar
         self._add_code_indicator()
     
-    def _replace_textview_with_sourceview(self):
-        """Replace the TextView widget with GtkSourceView"""
-        # Find the scrolled window containing the view
-        scroll = None
-        for child in self.get_children():
-            if isinstance(child, Gtk.ScrolledWindow):
-                scroll = child
-                break
-        
-        if not scroll:
-            return
-        
-        # Store old buffer content
-        old_buffer = self.view.get_buffer()
-        start = old_buffer.get_start_iter()
-        end = old_buffer.get_end_iter()
-        text_content = old_buffer.get_text(start, end, True)
-        
-        # Remove old view
-        scroll.remove(self.view)
-        
-        # Initialize style manager and load styles
-        style_manager = GtkSource.StyleSchemeManager.get_default()
-        style_scheme = style_manager.get_scheme('classic')  # Use classic as fallback
-        
+    def create_editor(self):
+        """Build a GtkSourceView editor holding the note's plain text in place of the rich text view"""
         # Create SourceView buffer with language
         language_manager = GtkSource.LanguageManager.get_default()
         language = language_manager.get_language(self.language_id)
@@ -89,12 +192,6 @@ class NoteCode(NoteExtended):
         self.source_buffer = GtkSource.Buffer()
         if language:
             self.source_buffer.set_language(language)
-        if style_scheme:
-            self.source_buffer.set_style_scheme(style_scheme)
-        
-        # Enable syntax highlighting explicitly
-        self.source_buffer.set_highlight_syntax(True)
-        self.source_buffer.set_highlight_matching_brackets(True)
         
         # Create and configure SourceView
         self.source_view = GtkSource.View.new_with_buffer(self.source_buffer)
@@ -103,7 +200,6 @@ class NoteCode(NoteExtended):
         self.source_view.set_indent_on_tab(True)
         self.source_view.set_insert_spaces_instead_of_tabs(True)
         self.source_view.set_tab_width(4)
-        self.source_view.set_wrap_mode(Gtk.WrapMode.WORD_CHAR)
         
         # Set margins
         self.source_view.set_left_margin(10)
@@ -111,57 +207,37 @@ class NoteCode(NoteExtended):
         self.source_view.set_top_margin(10)
         self.source_view.set_bottom_margin(10)
         
-        # Give this editor a unique CSS id to style its gutter/content background
-        self._css_id = f"code-editor-{uuid.uuid4().hex[:8]}"
-        self.source_view.set_name(self._css_id)
+        # The editor background follows the note color through a CSS class shared by all notes of that color
+        self._color_class = None
         
-        # Try to tag the left gutter with a unique name/class for CSS targeting
-        try:
-            gutter = self.source_view.get_gutter(Gtk.TextWindowType.LEFT)
-            if gutter:
-                gutter.set_name(self._css_id + "-gutter")
-                gutter.get_style_context().add_class('code-gutter')
-        except Exception:
-            pass
+        # Wrapping, bracket matching, highlighting and the gutter renderer depend on the size of the text
+        self._gutter_bg = None
+        self._large_mode = None
+        self._highlight_id = 0
+        self._highlight_line = 0
+        self.connect('destroy', lambda w: self._stop_highlighting())
         
-        # Enable code editor features
-        # Paint gutter background to match note color
-        self._install_gutter_background_renderer()
         # Avoid white row highlight; the note color will be consistent
         self.source_view.set_highlight_current_line(False)
-        self.source_view.set_auto_indent(True)
-        self.source_view.set_indent_on_tab(True)
-        self.source_view.set_tab_width(4)
-        self.source_view.set_insert_spaces_instead_of_tabs(True)
         
         # Set background window to prevent white L artifact
         self.source_view.set_background_pattern(GtkSource.BackgroundPatternType.NONE)
         
-        # Enable bracket matching
-        self.source_buffer.set_highlight_matching_brackets(True)
-        
-        # Do NOT force a style scheme with a hardcoded white background
-        # (CSS will handle background so it matches note color)
-        # style_manager = GtkSource.StyleSchemeManager()
-        # scheme = style_manager.get_scheme('classic')
-        # if scheme:
-        #     self.source_buffer.set_style_scheme(scheme)
+        # Code keeps its own monospace font and has no spell checking
+        self.spell_focus_id = 0
         
-        # Set content
-        self.source_buffer.set_text(text_content)
+        # Set content; the initial text is not an undo step
+        self.source_buffer.begin_not_undoable_action()
+        self.source_buffer.set_text(self.cached_text)
+        self.source_buffer.end_not_undoable_action()
         
-        # Add to scroll window
-        scroll.add(self.source_view)
-        
-        # Update references
         self.view = self.source_view
         self.buffer = self.source_buffer
         
         # Connect change handler
         self.changed_id = self.source_buffer.connect('changed', self.queue_update, True)
         
-        # Show the new view
-        self.source_view.show()
+        self._update_large_mode()
         
         # Add CSS class to help with styling
         self.source_view.get_style_context().add_class('code-editor')
@@ -171,6 +247,14 @@ class NoteCode(NoteExtended):
         # Apply a dynamic GtkSource style scheme so line numbers and text obey the note color
         self._apply_dynamic_scheme()
     
+    def get_text(self):
+        """Code notes are saved as the plain text of the buffer"""
+        return self.source_buffer.get_text(self.source_buffer.get_start_iter(), self.source_buffer.get_end_iter(), True)
+    
+    def set_font(self, *args):
+        """Only the title follows the note font; code stays monospace"""
+        self.title_style_manager.set_from_pango_font_string(self.app.settings.get_string('font'))
+    
     def _add_code_indicator(self):
         """Add code editor control icons"""
         try:
@@ -198,16 +282,18 @@ class NoteCode(NoteExtended):
             code_color_button.set_size_request(24, 24)
             code_color_button.set_tooltip_text(_("Code Editor Colors (exclusive to code)"))
             
-            # Create CODE EDITOR color menu
-            code_color_menu = Gtk.Menu()
-            for color_name, display_name in COLORS.items():
-                item = Gtk.MenuItem(label=display_name, visible=True)
-                def on_code_color(_w, c=color_name):
-                    # Already a code note - just change color
-                    self.change_color(None, c)
-                item.connect('activate', on_code_color)
-                code_color_menu.append(item)
-            code_color_button.set_popup(code_color_menu)
+            # Create CODE EDITOR color menu on first use
+            def build_code_color_menu():
+                code_color_menu = Gtk.Menu()
+                for color_name, display_name in COLORS.items():
+                    item = Gtk.MenuItem(label=display_name, visible=True)
+                    def on_code_color(_w, c=color_name):
+                        # Already a code note - just change color
+                        self.change_color(None, c)
+                    item.connect('activate', on_code_color)
+                    code_color_menu.append(item)
+                code_color_button.set_popup(code_color_menu)
+            self.add_lazy_menu(build_code_color_menu, code_color_button)
             
             # Insert code button at position 0 (LEFT)
             self.title_bar.pack_start(code_color_button, False, False, 0)
@@ -232,22 +318,24 @@ class NoteCode(NoteExtended):
             self.mode_button = convert_button
             setattr(self, '_mode_button', convert_button)
             
-            # Create TEXT note color menu (converts to text)
-            convert_menu = Gtk.Menu()
-            for color_name, display_name in COLORS.items():
-                item = Gtk.MenuItem(label=display_name, visible=True)
-                def on_text_color(_w, c=color_name):
-                    if getattr(self, '_converting', False):
-                        return
-                    setattr(self, '_converting', True)
-                    from src.note_converter import NoteConverter
-                    convert_button.set_sensitive(False)
-                    if not NoteConverter.code_to_text(self, c):
-                        convert_button.set_sensitive(True)
-                        setattr(self, '_converting', False)
-                item.connect('activate', on_text_color)
-                convert_menu.append(item)
-            convert_button.set_popup(convert_menu)
+            # Create TEXT note color menu (converts to text) on first use
+            def build_convert_menu():
+                convert_menu = Gtk.Menu()
+                for color_name, display_name in COLORS.items():
+                    item = Gtk.MenuItem(label=display_name, visible=True)
+                    def on_text_color(_w, c=color_name):
+                        if getattr(self, '_converting', False):
+                            return
+                        setattr(self, '_converting', True)
+                        from src.note_converter import NoteConverter
+                        convert_button.set_sensitive(False)
+                        if not NoteConverter.code_to_text(self, c):
+                            convert_button.set_sensitive(True)
+                            setattr(self, '_converting', False)
+                    item.connect('activate', on_text_color)
+                    convert_menu.append(item)
+                convert_button.set_popup(convert_menu)
+            self.add_lazy_menu(build_convert_menu, convert_button)
             
             # Insert convert button at position 1 (RIGHT)
             self.title_bar.pack_start(convert_button, False, False, 0)
@@ -296,6 +384,7 @@ class NoteCode(NoteExtended):
             info['color'] = color_name
             if 'language' in info:
                 del info['language']  # Remove code-specific data
+            info['text'] = code_to_markup(info.get('text', ''))
             
             # Create new text note
             from src.note_extended import NoteExtended
@@ -330,6 +419,82 @@ class NoteCode(NoteExtended):
             except Exception:
                 print(f"Failed to convert to text: {e}")
     
+    def apply_info(self, info):
+        """Also follow language and color changes, which code notes draw themselves"""
+        old_color = self.color
+        language = info.get('language', self.language_id)
+        if language != self.language_id:
+            self.set_language(language)
+        
+        super().apply_info(info)
+        
+        if self.color != old_color:
+            self._update_gutter_color()
+            self._apply_dynamic_css()
+    
+    def load_text(self, text):
+        """Code notes hold plain text; loading it is neither an edit nor an undo step"""
+        self.source_buffer.handler_block(self.changed_id)
+        self.source_buffer.begin_not_undoable_action()
+        self.source_buffer.set_text(text)
+        self.source_buffer.end_not_undoable_action()
+        self.source_buffer.handler_unblock(self.changed_id)
+        self._update_large_mode()
+    
+    def _update_large_mode(self):
+        """Switch large-code mode on or off for the current text and restart syntax highlighting.
+
+        Notes with more than LARGE_CODE_LINES lines don't wrap, don't match
+        brackets and skip the gutter renderer (the style scheme already paints
+        the line numbers in the note color). Their highlighting starts after
+        the note is first drawn, with the visible lines, and the rest of the
+        text follows in idle time.
+        """
+        large = self.source_buffer.get_line_count() > LARGE_CODE_LINES
+        if large != self._large_mode:
+            self._large_mode = large
+            self.source_view.set_wrap_mode(Gtk.WrapMode.NONE if large else Gtk.WrapMode.WORD_CHAR)
+            self.source_buffer.set_highlight_matching_brackets(not large)
+            if large:
+                self._remove_gutter_background_renderer()
+            elif self._gutter_bg is None:
+                self._install_gutter_background_renderer()
+        
+        self._stop_highlighting()
+        if large:
+            self.source_buffer.set_highlight_syntax(False)
+            self._highlight_line = 0
+            self._highlight_id = GLib.idle_add(self._highlight_step, priority=GLib.PRIORITY_LOW)
+        else:
+            self.source_buffer.set_highlight_syntax(True)
+    
+    def _stop_highlighting(self):
+        if self._highlight_id:
+            GLib.source_remove(self._highlight_id)
+            self._highlight_id = 0
+    
+    def _highlight_step(self):
+        """Highlight the visible lines on the first call, then HIGHLIGHT_CHUNK_LINES more lines per call"""
+        buffer = self.source_buffer
+        if not buffer.get_highlight_syntax():
+            buffer.set_highlight_syntax(True)
+            rect = self.source_view.get_visible_rect()
+            (start, _top) = self.source_view.get_line_at_y(rect.y)
+            (end, _top) = self.source_view.get_line_at_y(rect.y + rect.height)
+            end.forward_to_line_end()
+            buffer.ensure_highlight(start, end)
+            return True
+        
+        start = buffer.get_iter_at_line(self._highlight_line)
+        self._highlight_line += HIGHLIGHT_CHUNK_LINES
+        if self._highlight_line >= buffer.get_line_count():
+            buffer.ensure_highlight(start, buffer.get_end_iter())
+            self._highlight_id = 0
+            return False
+        
+        buffer.ensure_highlight(start, buffer.get_iter_at_line(self._highlight_line))
+        return True
+    
     def get_info(self):
         """Override to save code note specific info"""
         info = super().get_info()
@@ -340,31 +505,8 @@ class NoteCode(NoteExtended):
     def _install_gutter_background_renderer(self):
         """Install a low-priority gutter renderer that paints the gutter background to match note color."""
         try:
-            class GutterBG(GtkSource.GutterRenderer):
-                def __init__(self, rgba):
-                    GtkSource.GutterRenderer.__init__(self)
-                    self.rgba = rgba
-                    # Enable drawing for all states in GtkSource 4
-                    self.set_size(5)  # Gutter width
-                    
-                def set_rgba(self, rgba):
-                    self.rgba = rgba
-                    self.queue_draw()
-                    
-                def do_draw(self, cr, background_area, cell_area, start, end, state):
-                    # In GtkSource 4, state is a flags enum
-                    cr.set_source_rgba(self.rgba.red, self.rgba.green, self.rgba.blue, self.rgba.alpha)
-                    cr.rectangle(background_area.x, background_area.y, 
-                               background_area.width, background_area.height)
-                    cr.fill()
-                    
-                def do_query_activatable(self, iter, area, event):
-                    # GtkSource 4 requires this for click handling
-                    return False
-                    
             self._gutter_rgba = Gdk.RGBA()
             # Initialize with current note color
-            from sticky_unmodified import COLOR_CODES
             color_code = COLOR_CODES.get(self.color, '#f6f907')
             self._gutter_rgba.parse(color_code)
             self._gutter_bg = GutterBG(self._gutter_rgba)
@@ -374,20 +516,19 @@ class NoteCode(NoteExtended):
             if gutter:
                 # Insert with higher priority to ensure background is drawn first
                 gutter.insert(self._gutter_bg, -100)
-                
-                # Set CSS name for additional styling
-                gutter_window = self.source_view.get_window(Gtk.TextWindowType.LEFT)
-                if gutter_window:
-                    gutter_window.set_name(self._css_id + "-gutter-window")
         except Exception as e:
             print(f"Gutter setup error: {e}")
             self._gutter_bg = None
 
+    def _remove_gutter_background_renderer(self):
+        if self._gutter_bg:
+            self.source_view.get_gutter(Gtk.TextWindowType.LEFT).remove(self._gutter_bg)
+            self._gutter_bg = None
+
     def _update_gutter_color(self):
         """Update gutter renderer color to match current note color"""
         try:
             if hasattr(self, '_gutter_bg') and self._gutter_bg:
-                from sticky_unmodified import COLOR_CODES
                 color_code = COLOR_CODES.get(self.color, '#f6f907')
                 self._gutter_rgba.parse(color_code)
                 self._gutter_bg.set_rgba(self._gutter_rgba)
@@ -395,92 +536,21 @@ class NoteCode(NoteExtended):
             print(f"Error updating gutter color: {e}")
 
     def _apply_dynamic_css(self):
-        """Apply dynamic CSS for editor styling"""
+        """Switch the editor to the shared CSS class of the note's color"""
         try:
-            from sticky_unmodified import COLOR_CODES
-            
-            color = COLOR_CODES.get(self.color, '#f6f907')
-            text_color = '#eeeeee' if self.color == 'black' else '#303030'
-            
-            css = f"""
-            #{self._css_id} {{
-                background-color: {color};
-                color: {text_color};
-            }}
-            #{self._css_id} text {{
-                background-color: {color};
-                color: {text_color};
-            }}
-            #{self._css_id} border {{
-                background-color: {color};
-            }}
-            """
-            
-            provider = Gtk.CssProvider()
-            provider.load_from_data(css.encode())
-            
-            screen = Gdk.Screen.get_default()
-            Gtk.StyleContext.add_provider_for_screen(
-                screen, 
-                provider,
-                Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-            )
-            
-            self._css_provider = provider
+            context = self.source_view.get_style_context()
+            if self._color_class:
+                context.remove_class(self._color_class)
             
+            self._color_class = code_color_class(self.color)
+            context.add_class(self._color_class)
         except Exception as e:
             print(f"Error applying CSS: {e}")
 
     def _apply_dynamic_scheme(self):
-        """Create and apply a GtkSource style scheme based on current note color"""
+        """Apply the GtkSource style scheme of the note's color"""
         try:
-            from sticky_unmodified import COLOR_CODES
-            
-            # Create scheme directory if needed
-            config_dir = os.path.join(os.path.expanduser("~/.config/notebook"), "styles")
-            os.makedirs(config_dir, exist_ok=True)
-            
-            # Generate color scheme
-            color = COLOR_CODES.get(self.color, '#f6f907')
-            text_color = '#eeeeee' if self.color == 'black' else '#303030'
-            scheme_id = f"note-{self.color}"
-            
-            scheme_xml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<style-scheme id="{scheme_id}" name="Note {self.color}" version="1.0">
-  <author>Note Book</author>
-  <description>Dynamic scheme for {self.color} notes</description>
-  
-  <!-- Basic Settings -->
-  <style name="text"                        foreground="{text_color}" background="{color}"/>
-  <style name="selection"                   background="#4a90d9"/>
-  <style name="cursor"                      foreground="{text_color}"/>
-  <style name="current-line"               background="{color}"/>
-  <style name="line-numbers"               foreground="{text_color}" background="{color}"/>
-  
-  <!-- Syntax Highlighting -->
-  <style name="def:comment"                foreground="#939393"/>
-  <style name="def:constant"               foreground="#8f5902"/>
-  <style name="def:boolean"                foreground="#0000ff"/>
-  <style name="def:number"                 foreground="#0000ff"/>
-  <style name="def:string"                 foreground="#2a6b30"/>
-  <style name="def:keyword"                foreground="#a81919" bold="true"/>
-  <style name="def:function"               foreground="#c4560c"/>
-  <style name="def:type"                   foreground="#2f8c9c" bold="true"/>
-  <style name="def:operator"               foreground="#ce5c00"/>
-  <style name="def:identifier"             foreground="{text_color}"/>
-  <style name="def:statement"              foreground="#204a87"/>
-  <style name="def:preprocessor"           foreground="#ac7d00"/>
-</style-scheme>'''
-            
-            # Save scheme
-            scheme_path = os.path.join(config_dir, f"{scheme_id}.xml")
-            with open(scheme_path, 'w') as f:
-                f.write(scheme_xml)
-            
-            # Load scheme
-            style_manager = GtkSource.StyleSchemeManager.get_default()
-            style_manager.append_search_path(config_dir)
-            scheme = style_manager.get_scheme(scheme_id)
+            scheme = color_scheme(self.color)
             if scheme:
                 self.source_buffer.set_style_scheme(scheme)
         except Exception as e:
@@ -497,6 +567,8 @@ class NoteCode(NoteExtended):
         info['note_file'] = self.note_file
         if self.note_id:
             info['id'] = self.note_id
+        else:
+            info.pop('id', None)
         return info
     
     def set_language(self, language_id):
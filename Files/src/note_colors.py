@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""
+Note colors shared by the note windows and the Note Book manager
+
+Kept apart from sticky_unmodified so the manager can draw color indicators
+without importing the note window code (XApp, Gspell, GtkSource).
+"""
+
+import gettext
+_ = gettext.translation("sticky", "/usr/share/locale", fallback=True).gettext
+
+COLORS = {
+    'red': _("Red"),
+    'green': _("Green"),
+    'blue': _("Blue"),
+    'yellow': _("Yellow"),
+    'purple': _("Purple"),
+    'teal': _("Teal"),
+    'orange': _("Orange"),
+    'magenta': _("Magenta"),
+    'white': _("White"),
+    'grey': _("Grey"),
+    'black': _("Black")
+}
+
+COLOR_CODES = {
+    'red': "#ff5561",
+    'green': "#67ff67",
+    'blue': "#3d9bff",
+    'yellow': "#f6f907",
+    'purple': "#a553ff",
+    'teal': "#41ffed",
+    'orange': "#ffa939",
+    'magenta': "#ff7ff7",
+    'white': "#f0f0f0",
+    'grey': "#a9a9a9",
+    'black': "#bbbbbb"  # Light grey titlebar for icon visibility
+}
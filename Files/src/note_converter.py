@@ -7,6 +7,8 @@ import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
+from utils.util import markup_to_code, code_to_markup
+
 import gettext
 _ = gettext.gettext
 
@@ -28,6 +30,7 @@ class NoteConverter:
             info['color'] = color_name
             info['is_code_note'] = True
             info['language'] = 'python'  # Default to Python
+            info['text'] = markup_to_code(info.get('text', ''))
             
             # Create new code note
             from src.note_code import NoteCode
@@ -84,6 +87,7 @@ class NoteConverter:
             info['is_code_note'] = False
             if 'language' in info:
                 del info['language']
+            info['text'] = code_to_markup(info.get('text', ''))
             
             # Create new text note
             from src.note_extended import NoteExtended
@@ -11,9 +11,11 @@ from gi.repository import Gtk, Gdk, Pango
 
 from sticky_unmodified import Note as StickyNote, FONT_SCALES, COLORS
 from utils.common import confirm
+from utils.util import markup_to_code
 import subprocess
 import gettext
 import os
+import uuid
 
 # Initialize gettext for translations
 _ = gettext.gettext
@@ -26,13 +28,13 @@ class NoteExtended(StickyNote):
     Replaces the trash button with a MenuButton offering three options
     """
     
-    def __init__(self, app, parent, info={}):
+    def __init__(self, app, parent, info={}, visible=True):
         # Store note_file before calling super().__init__
         self.note_file = info.get('note_file', None)
         self.note_id = info.get('id', None)
         
         # Call parent constructor (creates the full note UI)
-        super().__init__(app, parent, info)
+        super().__init__(app, parent, info, visible)
         
         # Now replace the delete button with our dropdown
         # The delete button was added at line 200 in sticky_unmodified.py
@@ -64,7 +66,21 @@ class NoteExtended(StickyNote):
         # Track if note is saved
         self.is_saved = bool(self.note_file and self.note_id)
         
-        # Create the dropdown menu
+        # The dropdown menu is built on first use
+        self.add_lazy_menu(lambda: self.close_menu_button.set_popup(self.create_options_menu()), self.close_menu_button)
+        
+        # Add the new button to the title bar (at the end, same position as old delete button)
+        self.title_bar.pack_end(self.close_menu_button, False, False, 0)
+        self.title_bar.reorder_child(self.close_menu_button, 0)  # Make it the rightmost button
+        
+        self.close_menu_button.show_all()
+
+        # Add Convert-to-Code menu button on the title bar (only for Text notes, NOT for Picture notes)
+        if not getattr(self, 'is_code_note', False) and not getattr(self, 'is_picture_note', False):
+            self._add_convert_to_code_button()
+    
+    def create_options_menu(self):
+        """Build the Save/Print/Close dropdown menu"""
         menu = Gtk.Menu()
         
         # Save to Note File
@@ -89,17 +105,7 @@ class NoteExtended(StickyNote):
         close_item.connect('activate', self.close_note)
         menu.append(close_item)
         
-        self.close_menu_button.set_popup(menu)
-        
-        # Add the new button to the title bar (at the end, same position as old delete button)
-        self.title_bar.pack_end(self.close_menu_button, False, False, 0)
-        self.title_bar.reorder_child(self.close_menu_button, 0)  # Make it the rightmost button
-        
-        self.close_menu_button.show_all()
-
-        # Add Convert-to-Code menu button on the title bar (only for Text notes, NOT for Picture notes)
-        if not getattr(self, 'is_code_note', False) and not getattr(self, 'is_picture_note', False):
-            self._add_convert_to_code_button()
+        return menu
     
     def _add_convert_to_code_button(self):
         """Add a menu button for code editor colors (LEFT icon)
@@ -125,24 +131,26 @@ class NoteExtended(StickyNote):
             # Store button reference
             setattr(self, '_mode_button', self.convert_to_code_btn)
             
-            # Build CODE EDITOR colors menu
-            menu = Gtk.Menu()
-            for color_name, display_name in COLORS.items():
-                item = Gtk.MenuItem(label=display_name, visible=True)
-                def on_activate(_w, c=color_name):
-                    # Prevent multiple conversions
-                    if getattr(self, '_converting', False):
-                        return
-                    setattr(self, '_converting', True)
-                    # Import here to avoid circular imports
-                    from src.note_converter import NoteConverter
-                    self.convert_to_code_btn.set_sensitive(False)
-                    if not NoteConverter.text_to_code(self, c):
-                        self.convert_to_code_btn.set_sensitive(True)
-                        setattr(self, '_converting', False)
-                item.connect('activate', on_activate)
-                menu.append(item)
-            self.convert_to_code_btn.set_popup(menu)
+            # Build CODE EDITOR colors menu on first use
+            def build_code_menu():
+                menu = Gtk.Menu()
+                for color_name, display_name in COLORS.items():
+                    item = Gtk.MenuItem(label=display_name, visible=True)
+                    def on_activate(_w, c=color_name):
+                        # Prevent multiple conversions
+                        if getattr(self, '_converting', False):
+                            return
+                        setattr(self, '_converting', True)
+                        # Import here to avoid circular imports
+                        from src.note_converter import NoteConverter
+                        self.convert_to_code_btn.set_sensitive(False)
+                        if not NoteConverter.text_to_code(self, c):
+                            self.convert_to_code_btn.set_sensitive(True)
+                            setattr(self, '_converting', False)
+                    item.connect('activate', on_activate)
+                    menu.append(item)
+                self.convert_to_code_btn.set_popup(menu)
+            self.add_lazy_menu(build_code_menu, self.convert_to_code_btn)
             
             # Place at position 0 (LEFT)
             self.title_bar.pack_start(self.convert_to_code_btn, False, False, 0)
@@ -172,29 +180,31 @@ class NoteExtended(StickyNote):
             text_color_button.set_size_request(24, 24)
             text_color_button.set_tooltip_text(_("Text Note Colors (exclusive to text)"))
             
-            # Build TEXT note colors menu
-            text_menu = Gtk.Menu()
-            for color_name, display_name in COLORS.items():
-                item = Gtk.MenuItem(label=display_name, visible=True)
-                def on_text_color(_w, c=color_name):
-                    # If already a text note, just change color
-                    # If code note, convert to text
-                    if getattr(self, 'is_code_note', False):
-                        # This shouldn't happen on text notes, but handle it
-                        if getattr(self, '_converting', False):
-                            return
-                        setattr(self, '_converting', True)
-                        from src.note_converter import NoteConverter
-                        text_color_button.set_sensitive(False)
-                        if not NoteConverter.code_to_text(self, c):
-                            text_color_button.set_sensitive(True)
-                            setattr(self, '_converting', False)
-                    else:
-                        # Already text note - just change color
-                        self.set_color(None, c)
-                item.connect('activate', on_text_color)
-                text_menu.append(item)
-            text_color_button.set_popup(text_menu)
+            # Build TEXT note colors menu on first use
+            def build_text_menu():
+                text_menu = Gtk.Menu()
+                for color_name, display_name in COLORS.items():
+                    item = Gtk.MenuItem(label=display_name, visible=True)
+                    def on_text_color(_w, c=color_name):
+                        # If already a text note, just change color
+                        # If code note, convert to text
+                        if getattr(self, 'is_code_note', False):
+                            # This shouldn't happen on text notes, but handle it
+                            if getattr(self, '_converting', False):
+                                return
+                            setattr(self, '_converting', True)
+                            from src.note_converter import NoteConverter
+                            text_color_button.set_sensitive(False)
+                            if not NoteConverter.code_to_text(self, c):
+                                text_color_button.set_sensitive(True)
+                                setattr(self, '_converting', False)
+                        else:
+                            # Already text note - just change color
+                            self.set_color(None, c)
+                    item.connect('activate', on_text_color)
+                    text_menu.append(item)
+                text_color_button.set_popup(text_menu)
+            self.add_lazy_menu(build_text_menu, text_color_button)
             
             # Place at position 1 (RIGHT, after code button)
             self.title_bar.pack_start(text_color_button, False, False, 0)
@@ -215,6 +225,7 @@ class NoteExtended(StickyNote):
             info['color'] = color_name
             info['is_code_note'] = True  # Mark as code note
             info['language'] = 'python'   # Default to Python
+            info['text'] = markup_to_code(info.get('text', ''))
             
             # Create new code note
             from src.note_code import NoteCode
@@ -390,24 +401,11 @@ class NoteExtended(StickyNote):
         
         # Save to file
         if hasattr(self.app, 'save_note_to_file'):
-            # Need to manually add parent_id field
-            import uuid
-            if not note_data.get('id'):
-                note_data['id'] = str(uuid.uuid4())
-                self.note_id = note_data['id']
-            
-            # Write note JSON with parent_id
-            import os
-            import json
-            from src.notebook_wrapper import DATA_DIR
-            note_path = os.path.join(DATA_DIR, f"note_{note_data['id']}.json")
-            with open(note_path, 'w') as f:
-                json.dump(note_data, f, indent=2)
+            # Write note JSON with parent_id and index it under the Note File
+            is_new = note_data.get('id') not in self.app.note_files[file_name]
+            self.note_id = self.app.store.save_note(note_data, file_name)
             
-            # Index under Note File
-            if note_data['id'] not in self.app.note_files[file_name]:
-                self.app.note_files[file_name].append(note_data['id'])
-                self.app.save_data()
+            if is_new:
                 self.app.populate_file_list()
                 # Force refresh by calling on_file_selected directly
                 for row in self.app.file_listbox.get_children():
@@ -439,12 +437,25 @@ class NoteExtended(StickyNote):
         """Print note - placeholder for future implementation"""
         self.show_info_dialog(_("Print"), _("Print functionality will be implemented soon."))
     
+    def reset(self, info):
+        """Turn a pooled, never shown window into the note described by info"""
+        self.note_file = info.get('note_file', None)
+        self.note_id = info.get('id', None)
+        self.is_saved = bool(self.note_file and self.note_id)
+        self.id = info.get('id') or str(uuid.uuid4())
+        self.apply_info(info)
+        # notes that were never saved start out dirty, like a freshly built window
+        self.dirty = not info.get('id')
+    
     def get_note_data(self):
         """Get note data for saving"""
         info = self.get_info()
         info['note_file'] = self.note_file
         if self.note_id:
             info['id'] = self.note_id
+        else:
+            # not saved to the Note Book yet - don't pass the window's Sticky id off as a note id
+            info.pop('id', None)
         return info
     
     # Black note icon fix removed - now handled by CSS with reversed contrast
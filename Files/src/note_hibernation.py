@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+"""
+Note Hibernation - swap idle note windows for lightweight placeholders
+
+Every open note is a full window with its own buffer, spell checker, style
+managers and menus. When more notes are open than the budget allows (a
+window count, and optionally a memory limit), the notes nobody has touched
+for a while are saved and replaced by a placeholder: a plain undecorated
+window at the same position showing a snapshot of the note. Clicking the
+placeholder opens the real note again.
+
+The budget comes from the 'preferences' section of notebook.json:
+max_open_notes, hibernate_after_minutes and max_memory_mb (0 turns the
+memory limit off).
+"""
+
+import os
+
+import cairo
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('Gdk', '3.0')
+from gi.repository import Gtk, Gdk, GLib
+
+DEFAULT_MAX_OPEN_NOTES = 30
+DEFAULT_HIBERNATE_AFTER_MINUTES = 10
+DEFAULT_MAX_MEMORY_MB = 0
+CHECK_INTERVAL = 60  # seconds
+MEMORY_BATCH = 5  # notes hibernated per check while over the memory limit
+
+def resident_memory_mb():
+    """Return the resident memory of this process in MB, or None if it can't be read"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+class HibernatedNote(Gtk.Window):
+    """Undecorated window showing a snapshot of a hibernated note"""
+
+    def __init__(self, note_id, surface, x, y, on_wake):
+        super().__init__(
+            skip_taskbar_hint=True,
+            type_hint=Gdk.WindowTypeHint.UTILITY,
+            decorated=False,
+            resizable=False,
+            name='sticky-note'
+        )
+        self.note_id = note_id
+        self.surface = surface
+        self.on_wake = on_wake
+
+        area = Gtk.DrawingArea()
+        area.set_size_request(surface.get_width(), surface.get_height())
+        area.connect('draw', self.on_draw)
+
+        event_box = Gtk.EventBox()
+        event_box.add(area)
+        event_box.connect('button-press-event', self.on_button_press)
+        self.add(event_box)
+
+        self.move(x, y)
+        self.show_all()
+
+    def on_draw(self, widget, cr):
+        cr.set_source_surface(self.surface, 0, 0)
+        cr.paint()
+        return False
+
+    def on_button_press(self, widget, event):
+        self.on_wake(self.note_id)
+        return True
+
+class NoteHibernator(object):
+    def __init__(self, manager, preferences):
+        # manager is the NoteFileManager: it owns the notes list, saves notes and reopens them from their data
+        self.manager = manager
+        self.configure(preferences)
+
+        self.last_active = {}   # note window -> monotonic time of its last use
+        self.placeholders = {}  # note_id -> HibernatedNote
+
+        GLib.timeout_add_seconds(CHECK_INTERVAL, self.check)
+
+    def configure(self, preferences):
+        """Read the budget from the Note Book preferences"""
+        self.max_open_notes = preferences.get('max_open_notes', DEFAULT_MAX_OPEN_NOTES)
+        self.idle_time = preferences.get('hibernate_after_minutes', DEFAULT_HIBERNATE_AFTER_MINUTES) * 60 * 1000000
+        self.max_memory_mb = preferences.get('max_memory_mb', DEFAULT_MAX_MEMORY_MB)
+
+    def register(self, note):
+        """Start tracking when a note window was last used"""
+        self.touch(note)
+        note.connect('focus-in-event', self.touch)
+        note.connect('update', self.touch)
+        note.connect('destroy', self.on_destroy)
+
+    def touch(self, note, *args):
+        self.last_active[note] = GLib.get_monotonic_time()
+        return False
+
+    def on_destroy(self, note):
+        self.last_active.pop(note, None)
+
+    def can_hibernate(self, note):
+        # only notes saved to a Note File can be reopened from disk; the others stay open
+        return (getattr(note, 'note_id', None) and getattr(note, 'note_file', None) and
+                note.get_visible() and not note.is_active() and note.get_realized())
+
+    def check(self):
+        open_notes = len(self.last_active)
+        over_count = open_notes - self.max_open_notes
+
+        over_memory = 0
+        if self.max_memory_mb:
+            memory = resident_memory_mb()
+            if memory is not None and memory > self.max_memory_mb:
+                over_memory = MEMORY_BATCH
+
+        to_hibernate = max(over_count, over_memory)
+        if to_hibernate > 0:
+            now = GLib.get_monotonic_time()
+            idle = [note for (note, last_active) in self.last_active.items()
+                    if now - last_active >= self.idle_time and self.can_hibernate(note)]
+            idle.sort(key=self.last_active.get)
+
+            for note in idle[:to_hibernate]:
+                self.hibernate(note)
+
+        return GLib.SOURCE_CONTINUE
+
+    def snapshot(self, note):
+        width = note.get_allocated_width()
+        height = note.get_allocated_height()
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        note.draw(cairo.Context(surface))
+        surface.flush()
+        return surface
+
+    def hibernate(self, note):
+        # flush an edit that is still waiting for its update, which saves the note through the manager
+        if note.changed_timer_id:
+            GLib.source_remove(note.changed_timer_id)
+            note.trigger_update()
+
+        try:
+            surface = self.snapshot(note)
+        except Exception as e:
+            print(f"Error taking note snapshot: {e}")
+            return
+
+        (x, y) = note.get_position()
+        note_id = note.note_id
+        note.destroy()
+
+        self.placeholders[note_id] = HibernatedNote(note_id, surface, x, y, self.wake)
+
+    def forget(self, note_id):
+        """Drop the placeholder of a note that is being opened some other way"""
+        placeholder = self.placeholders.pop(note_id, None)
+        if placeholder is not None:
+            placeholder.destroy()
+
+    def wake(self, note_id):
+        placeholder = self.placeholders.get(note_id)
+        if placeholder is None:
+            return
+
+        note_data = self.manager.load_note_by_id(note_id)
+        if note_data is None:
+            print(f"Error waking note: {note_id} was not found")
+            self.forget(note_id)
+            return
+
+        # opening the note drops the placeholder (see NoteFileManager.open_saved_note)
+        (note_data['x'], note_data['y']) = placeholder.get_position()
+        self.manager.open_saved_note(None, note_data)
+
+        for note in self.manager.notes:
+            if getattr(note, 'note_id', None) == note_id:
+                note.present_with_time(Gtk.get_current_event_time())
+                break
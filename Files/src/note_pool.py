@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+Note Pool - note windows built ahead of time
+
+Building a note window (title bar, buffer, style managers, and for code
+notes a source view) is the slow part of opening a note. The pool keeps a
+few hidden text and code note windows ready, built at idle priority after
+startup and after every reuse, and turns one into the requested note by
+resetting it with the note's data. When the pool is empty notes are built
+the usual way.
+
+The number of windows kept per note type is the 'note_pool_size'
+preference in notebook.json (0 turns the pool off).
+"""
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+DEFAULT_POOL_SIZE = 2
+
+class NotePool(object):
+    def __init__(self, app, kinds, note_class, size=DEFAULT_POOL_SIZE):
+        # note_class(kind) returns the class windows of a note kind ('text', 'code') are built from
+        self.app = app
+        self.note_class = note_class
+        self.size = size
+        self.free = {kind: [] for kind in kinds}
+        self.fill_id = 0
+
+    def queue_fill(self):
+        """Build missing windows in idle time; the owner calls this once it has finished starting up"""
+        if self.size > 0 and not self.fill_id:
+            self.fill_id = GLib.idle_add(self.fill_one, priority=GLib.PRIORITY_LOW)
+
+    def fill_one(self):
+        # one window per idle callback so the main loop never stalls for long
+        for kind, windows in self.free.items():
+            if len(windows) < self.size:
+                try:
+                    windows.append(self.note_class(kind)(self.app, self.app, {}, visible=False))
+                except Exception as e:
+                    print(f"Error prebuilding {kind} note: {e}")
+                    break
+                return GLib.SOURCE_CONTINUE
+
+        self.fill_id = 0
+        return GLib.SOURCE_REMOVE
+
+    def take(self, kind, info):
+        """Return a pooled window reset to info, or None if none is ready"""
+        windows = self.free.get(kind)
+        if not windows:
+            return None
+
+        note = windows.pop()
+        try:
+            note.reset(info)
+        except Exception as e:
+            print(f"Error reusing pooled note: {e}")
+            note.destroy()
+            note = None
+
+        self.queue_fill()
+        return note
+
+    def clear(self):
+        if self.fill_id:
+            GLib.source_remove(self.fill_id)
+            self.fill_id = 0
+
+        for windows in self.free.values():
+            for note in windows:
+                note.destroy()
+            windows.clear()
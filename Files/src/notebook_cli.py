@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+"""
+notebook - work with Note Book data from the command line
+
+Reads and writes the same ~/.config/notebook data as the Note Book window,
+without GTK, so it starts in a few tens of milliseconds and works without a
+display:
+
+    notebook list [FILE] [--tag PREFIX]    Note Files, or the notes of one (sub-notes indented)
+    notebook show NOTE [--json]            a note's text
+    notebook create FILE [options]         new notes, one from options or many from --json
+    notebook move NOTE FILE [--before N]   move a note to another Note File, or within one
+    notebook tag NOTE [TAG]                set (or with no TAG, clear) a note's ID tag
+    notebook export FILE [--format F]      a whole Note File as markdown, text or JSON lines
+    notebook search TEXT [--limit N]       full text search over every Note File
+
+NOTE is a note ID, a unique start of one, or an ID tag. Output is written
+note by note, so large Note Files can be piped straight into other tools.
+Changes can be made while the Note Book is running: it merges them into its
+own copy of the Note Files the next time it saves them.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add parent directory (Files/) to path so utils. imports work
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from utils.note_store import NoteStore, DEFAULT_DATA_DIR
+
+SEARCH_DB_FILE = 'search.db'
+
+class CommandError(Exception):
+    pass
+
+def write(line=''):
+    sys.stdout.write(line + '\n')
+
+def note_text(note_data):
+    """The text of a note without the sticky internal markup text notes are stored in"""
+    text = note_data.get('text', '') or ''
+    if note_data.get('is_code_note', False):
+        return text
+
+    # utils.util pulls in xml and difflib, so it is only imported by the commands that need it
+    from utils.util import plain_text
+    return plain_text(text, symbols=True)
+
+def note_label(note_data):
+    tag = f"[{note_data['id_tag']}] " if note_data.get('id_tag') else ''
+    return tag + (note_data.get('title') or '(Untitled)')
+
+def resolve_note(store, reference):
+    """Return the ID of the note a NOTE argument refers to"""
+    if store.note_path(reference):
+        return reference
+
+    listed = [note_id for note_ids in store.note_files.values() for note_id in note_ids]
+    matches = [note_id for note_id in listed if note_id.startswith(reference)]
+    if not matches:
+        tag = reference.upper()
+        for note_id in listed:
+            note_data = store.load_note(note_id)
+            if note_data and str(note_data.get('id_tag', '')).upper() == tag:
+                matches.append(note_id)
+
+    if not matches:
+        raise CommandError(f"no note matches '{reference}'")
+    if len(set(matches)) > 1:
+        raise CommandError(f"'{reference}' matches {len(set(matches))} notes, use more of the note ID")
+    return matches[0]
+
+def require_file(store, file_name):
+    if file_name not in store.note_files:
+        raise CommandError(f"no Note File named '{file_name}'")
+
+def cmd_list(store, args):
+    if args.file is None and args.tag is None:
+        for (file_name, count) in store.file_counts():
+            write(f"{count:6}  {file_name}")
+        return
+
+    if args.file is not None:
+        require_file(store, args.file)
+    file_names = [args.file] if args.file is not None else store.file_names()
+    tag = (args.tag or '').upper()
+
+    for file_name in file_names:
+        notes = {}
+        for (note_id, depth) in store.hierarchy(store.notes_in(file_name), notes):
+            note_data = notes[note_id]
+            if tag and not str(note_data.get('id_tag', '')).upper().startswith(tag):
+                continue
+            location = f"{file_name}\t" if args.file is None else ''
+            write(f"{note_id}\t{location}{'  ' * depth}{note_label(note_data)}")
+
+def cmd_show(store, args):
+    note_data = store.load_note(resolve_note(store, args.note))
+    if args.json:
+        write(json.dumps(note_data, indent=2))
+        return
+
+    write(note_label(note_data))
+    for field in ('description', 'instructions'):
+        if note_data.get(field):
+            write(f"{field.capitalize()}: {note_data[field]}")
+    write()
+    write(note_text(note_data))
+
+def read_argument(value):
+    # '-' reads the value from standard input
+    return sys.stdin.read() if value == '-' else value
+
+def cmd_create(store, args):
+    if args.json is not None:
+        try:
+            with (sys.stdin if args.json == '-' else open(args.json, 'r')) as f:
+                templates = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"can't read notes from '{args.json}': {e}")
+        if isinstance(templates, dict):
+            templates = [templates]
+        if not isinstance(templates, list):
+            raise CommandError("the JSON must be a note object or a list of them")
+        for (index, template) in enumerate(templates):
+            if not isinstance(template, dict):
+                raise CommandError(f"note {index + 1} in the JSON is not an object")
+    else:
+        template = {'title': args.title or '', 'text': read_argument(args.text or '')}
+        if args.tag:
+            template['id_tag'] = args.tag
+        if args.color:
+            template['color'] = args.color
+        if args.parent:
+            template['parent_id'] = args.parent
+        if args.code:
+            template['is_code_note'] = True
+            template['language'] = args.code
+        templates = [template]
+
+    if args.file not in store.note_files:
+        store.create_file(args.file)
+
+    for (index, template) in enumerate(templates):
+        note_data = {'x': 100 + index % 20 * 20, 'y': 100 + index % 20 * 20, 'color': 'yellow', 'title': '', 'text': ''}
+        note_data.update(template)
+        note_data['text'] = str(note_data.get('text') or '')
+        note_data.pop('id', None)
+        note_data['note_file'] = args.file
+        if note_data.get('parent_id'):
+            note_data['parent_id'] = resolve_note(store, note_data['parent_id'])
+        if not note_data.get('is_code_note', False):
+            # text notes are stored in the sticky markup, where a literal '#' is written '##'
+            note_data['text'] = note_data['text'].replace('#', '##')
+        write(store.save_note(note_data, args.file))
+
+def cmd_move(store, args):
+    note_id = resolve_note(store, args.note)
+    require_file(store, args.file)
+
+    if store.find_file(note_id) != args.file:
+        store.move_to_file(note_id, args.file)
+    if args.before is not None:
+        target_id = resolve_note(store, args.before)
+        if target_id not in store.notes_in(args.file):
+            raise CommandError(f"'{args.before}' is not in '{args.file}'")
+        store.move_before(args.file, note_id, target_id)
+
+def cmd_tag(store, args):
+    note_data = store.load_note(resolve_note(store, args.note))
+    note_data['id_tag'] = args.tag or ''
+    store.save_note(note_data)
+
+def cmd_export(store, args):
+    require_file(store, args.file)
+    metadata = store.file_metadata(args.file)
+    notes = {}
+    hierarchy = store.hierarchy(store.notes_in(args.file), notes)
+
+    if args.format == 'json':
+        # one JSON object per line: the Note File first, then every note in order
+        write(json.dumps({'note_file': args.file, 'description': metadata.get('description', ''),
+                          'instructions': metadata.get('instructions', '')}))
+        for (note_id, depth) in hierarchy:
+            write(json.dumps(dict(notes[note_id], depth=depth)))
+            sys.stdout.flush()
+        return
+
+    markdown = args.format == 'markdown'
+    write(f"# {args.file}" if markdown else args.file)
+    for field in ('description', 'instructions'):
+        if metadata.get(field):
+            write()
+            write(f"{field.capitalize()}: {metadata[field]}")
+
+    for (note_id, depth) in hierarchy:
+        note_data = notes[note_id]
+        write()
+        write(f"{'#' * min(depth + 2, 6)} {note_label(note_data)}" if markdown else
+              f"{'  ' * depth}== {note_label(note_data)} ==")
+        for field in ('description', 'instructions'):
+            if note_data.get(field):
+                write(f"{field.capitalize()}: {note_data[field]}")
+        text = note_text(note_data)
+        if markdown and note_data.get('is_code_note', False):
+            text = f"```{note_data.get('language', '')}\n{text}\n```"
+        write(text)
+        sys.stdout.flush()
+
+def cmd_search(store, args):
+    from utils.search_index import SearchIndex, MATCH_START, MATCH_END
+
+    # the index is shared with the Note Book window; bring it up to date with the notes on disk first
+    index = SearchIndex(os.path.join(store.data_dir, SEARCH_DB_FILE))
+    index.sync(store.index_entries(), store.load_note)
+
+    (start, end) = ('\033[1m', '\033[0m') if sys.stdout.isatty() else ('', '')
+    for result in index.search(' '.join(args.text), limit=args.limit):
+        tag = f"[{result['id_tag']}] " if result['id_tag'] else ''
+        snippet = result['snippet'].replace('\n', ' ').replace(MATCH_START, start).replace(MATCH_END, end)
+        write(f"{result['note_id']}\t{result['file_name']}\t{tag}{result['title'] or '(Untitled)'}")
+        write(f"    {snippet}")
+
+    index.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='notebook', description="Work with Note Book notes without the GUI")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Note Book data directory")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    commands.required = True
+
+    command = commands.add_parser('list', help="list Note Files, or the notes in one")
+    command.add_argument('file', nargs='?')
+    command.add_argument('--tag', help="only notes whose ID tag starts with this")
+    command.set_defaults(run=cmd_list)
+
+    command = commands.add_parser('show', help="print a note")
+    command.add_argument('note')
+    command.add_argument('--json', action='store_true', help="print the stored note data")
+    command.set_defaults(run=cmd_show)
+
+    command = commands.add_parser('create', help="create notes in a Note File")
+    command.add_argument('file')
+    command.add_argument('--title')
+    command.add_argument('--text', help="note text, or - to read it from standard input")
+    command.add_argument('--tag', help="ID tag")
+    command.add_argument('--color')
+    command.add_argument('--parent', help="make it a sub-note of this note")
+    command.add_argument('--code', metavar='LANGUAGE', help="create a code note")
+    command.add_argument('--json', metavar='PATH', help="create a note for every object in this JSON file (- for standard input)")
+    command.set_defaults(run=cmd_create)
+
+    command = commands.add_parser('move', help="move a note to a Note File")
+    command.add_argument('note')
+    command.add_argument('file')
+    command.add_argument('--before', metavar='NOTE', help="place it just before this note")
+    command.set_defaults(run=cmd_move)
+
+    command = commands.add_parser('tag', help="set a note's ID tag")
+    command.add_argument('note')
+    command.add_argument('tag', nargs='?')
+    command.set_defaults(run=cmd_tag)
+
+    command = commands.add_parser('export', help="print a whole Note File")
+    command.add_argument('file')
+    command.add_argument('--format', choices=('markdown', 'text', 'json'), default='markdown')
+    command.set_defaults(run=cmd_export)
+
+    command = commands.add_parser('search', help="full text search")
+    command.add_argument('text', nargs='+')
+    command.add_argument('--limit', type=int, default=20)
+    command.set_defaults(run=cmd_search)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    store = NoteStore(args.data_dir)
+    store.load()
+
+    try:
+        args.run(store, args)
+    except CommandError as e:
+        print(f"notebook: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # output piped into something like head that stopped reading
+        sys.stderr.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
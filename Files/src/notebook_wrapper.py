@@ -6,32 +6,83 @@ Note Book - Wrapper around Sticky Notes adding file organization
 import json
 import os
 import sys
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('Gdk', '3.0')
-gi.require_version('Pango', '1.0')
-from gi.repository import Gtk, Gio, Gdk, Pango, GdkPixbuf
 
-# Import extended Note class with Save/Minimize/Delete dropdown
 # Add parent directory (Files/) to path so src. imports work
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
-from src.note_extended import NoteExtended as Note
-from src.note_code import NoteCode
+from utils import startup_profile
 
-DATA_DIR = os.path.expanduser("~/.config/notebook")
+with startup_profile.span("import Gtk"):
+    import gi
+    gi.require_version('Gtk', '3.0')
+    gi.require_version('Gdk', '3.0')
+    gi.require_version('Pango', '1.0')
+    from gi.repository import Gtk, Gio, GLib, Gdk, Pango, GdkPixbuf
+
+# The note window classes pull in XApp, Gspell, GtkSource and the note buffer, so they are only imported when the
+# first note is opened (see note_class)
+with startup_profile.span("import manager modules"):
+    from utils.search_index import SearchIndex, snippet_to_markup
+    from utils.search_pipeline import SearchPipeline
+    from utils.trigram_index import TrigramIndex
+    from utils.facets import FacetIndex, NOTE_TYPES, note_type, popcount
+    from utils.note_store import NoteStore, DEFAULT_DATA_DIR
+    from src.note_colors import COLORS, COLOR_CODES
+    from src.quick_switcher import QuickSwitcher
+    from src.note_hibernation import NoteHibernator
+    from src.note_pool import NotePool, DEFAULT_POOL_SIZE
+
+DATA_DIR = DEFAULT_DATA_DIR
 os.makedirs(DATA_DIR, exist_ok=True)
+SEARCH_DB_PATH = os.path.join(DATA_DIR, "search.db")
+UI_SNAPSHOT_PATH = os.path.join(DATA_DIR, "ui_snapshot.json")
+UI_SNAPSHOT_VERSION = 2
+APPLICATION_ID = 'org.x.notebook'
+SEARCH_RESULT_LIMIT = 100
+QUICK_INDEX_CHUNK = 500  # notes added to the quick switcher index per idle callback
+
+def note_row_title(note_data):
+    """The text shown for a note in the Note File list: its title, or the start of its text"""
+    title = note_data.get('title', '')
+    text = note_data.get('text', '')
+    return title if title else (text[:50] + "..." if len(text) > 50 else text)
+
+def note_class(kind):
+    """Return the note window class for 'text', 'code' or 'picture' notes, importing it on first use"""
+    with startup_profile.span(f"import {kind} note window"):
+        if kind == 'picture':
+            from src.note_picture import NotePicture
+            return NotePicture
+        if kind == 'code':
+            from src.note_code import NoteCode
+            return NoteCode
+        from src.note_extended import NoteExtended
+        return NoteExtended
 
 class NoteFileManager(Gtk.Window):
     """Manager window for organizing notes into files/folders"""
     
+    @property
+    def note_files(self):
+        return self.store.note_files
+    
+    @property
+    def note_file_metadata(self):
+        return self.store.note_file_metadata
+    
+    @property
+    def preferences(self):
+        return self.store.preferences
+    
     def __init__(self):
         super().__init__(title="Note Book")
-        self.note_files = {}  # {file_name: [note_ids]}
-        self.note_file_metadata = {}  # {file_name: {description, instructions, color_config}}
+        # Note Files, saved notes and preferences; this window only shows and edits them
+        self.store = NoteStore(DATA_DIR, on_note_saved=self.index_note, on_note_removed=self.unindex_note)
         self.minimized_notes = []
         self.notes = []
+        self.profile_startup = '--profile-startup' in sys.argv
+        self.type_icons = {}  # icon file name -> scaled pixbuf (None if missing) for note list rows
         # Mock settings for Note class compatibility
         self.settings = Gio.Settings(schema_id='org.x.sticky')
         
@@ -49,7 +100,28 @@ class NoteFileManager(Gtk.Window):
         self.set_default_size(800, 600)
         self.set_position(Gtk.WindowPosition.CENTER)
         
-        self.load_data()
+        # The Note Files are loaded after the first frame (see finish_startup); until then the window shows what was
+        # visible when it was last closed
+        self.ui_snapshot = self.load_ui_snapshot()
+        self.startup_finished = False
+        self.pending_commands = []  # (callback, args) received from other launches before startup finished
+        self.hibernator = NoteHibernator(self, self.preferences)
+        self.note_pool = NotePool(self, ('text', 'code'), note_class,
+                                  self.preferences.get('note_pool_size', DEFAULT_POOL_SIZE))
+        
+        # Full text search index over all saved notes; it is brought up to date after the window is shown
+        self.search_index = SearchIndex(SEARCH_DB_PATH)
+        self.search_pipeline = SearchPipeline(self.run_search, self.on_search_started, self.on_search_results,
+                                              prepare=self.prepare_search)
+        
+        # Fuzzy title/ID tag index for the Ctrl+P quick switcher, filled in the background
+        self.quick_index = TrigramIndex()
+        self.quick_index_loader = 0
+        
+        # Color / ID tag / type / Note File / parent facets for the filter popover
+        self.facet_index = FacetIndex()
+        self.facet_query = {}
+        self.updating_filters = False
         
         # Main layout
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -132,7 +204,8 @@ class NoteFileManager(Gtk.Window):
             box.show_all()
             
             button.add(box)
-            button.connect("clicked", callback)
+            # clicks before the Note Files are loaded would change a store that is about to be replaced
+            button.connect("clicked", lambda widget: self.when_started(callback, widget))
             button.show()
             
             return button
@@ -153,6 +226,20 @@ class NoteFileManager(Gtk.Window):
         new_file_btn = create_toolbar_button("New File", os.path.join(icons_path, 'Folder Icon.png'), self.create_note_file, is_file=True, icon_size=32)
         toolbar_box.pack_start(new_file_btn, False, False, 0)
         
+        # === Search Entry ===
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Search all notes")
+        self.search_entry.set_size_request(250, -1)
+        self.search_entry.set_valign(Gtk.Align.CENTER)
+        self.search_entry.connect("search-changed", self.on_search_changed)
+        self.search_entry.connect("activate", self.on_search_activate)
+        self.search_entry.connect("stop-search", lambda entry: entry.set_text(''))
+        toolbar_box.pack_end(self.search_entry, False, False, 0)
+        
+        # === Filter Button ===
+        self.filter_button = self._build_filter_button()
+        toolbar_box.pack_end(self.filter_button, False, False, 0)
+        
         # Paned layout
         paned = Gtk.Paned(orientation=Gtk.Orientation.HORIZONTAL)
         vbox.pack_start(paned, True, True, 0)
@@ -171,16 +258,35 @@ class NoteFileManager(Gtk.Window):
         right_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         paned.add2(right_vbox)
         
+        # Right panel switches between the selected file's notes and search results
+        self.right_stack = Gtk.Stack()
+        right_vbox.pack_start(self.right_stack, True, True, 0)
+        
         # Right panel: Notes in selected file
         right_scroll = Gtk.ScrolledWindow()
         right_scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
-        right_vbox.pack_start(right_scroll, True, True, 0)
+        self.right_stack.add_named(right_scroll, "notes")
+        self.note_scroll = right_scroll
         
         self.note_listbox = Gtk.ListBox()
         self.note_listbox.set_selection_mode(Gtk.SelectionMode.SINGLE)
         self.note_listbox.connect('row-selected', self.on_note_row_selected)
         right_scroll.add(self.note_listbox)
         
+        # Right panel: Search results across all Note Files
+        search_scroll = Gtk.ScrolledWindow()
+        search_scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+        self.right_stack.add_named(search_scroll, "search")
+        
+        self.search_listbox = Gtk.ListBox()
+        self.search_listbox.set_selection_mode(Gtk.SelectionMode.SINGLE)
+        self.search_listbox.set_activate_on_single_click(True)
+        self.search_listbox.connect('row-activated', self.on_search_result_activated)
+        search_placeholder = Gtk.Label(label="No matching notes")
+        search_placeholder.show()
+        self.search_listbox.set_placeholder(search_placeholder)
+        search_scroll.add(self.search_listbox)
+        
         # Bottom action bar
         action_bar = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
         action_bar.set_margin_start(10)
@@ -221,23 +327,80 @@ class NoteFileManager(Gtk.Window):
         # Track current file for DND
         self.current_file_name = None
         
-        self.populate_file_list()
+        if self.ui_snapshot:
+            self.show_ui_snapshot(self.ui_snapshot)
         
-        # Select first file by default if not already set
-        if not self.current_file_name and self.note_files:
-            first_file = sorted(self.note_files.keys())[0]
-            self.current_file_name = first_file
-            # Trigger selection to display notes
-            for row in self.file_listbox.get_children():
-                if hasattr(row, 'file_name') and row.file_name == first_file:
-                    self.file_listbox.select_row(row)
-                    # Actually trigger the callback to populate notes
-                    self.on_file_selected(self.file_listbox, row)
-                    break
+        accel_group = Gtk.AccelGroup()
+        accel_group.connect(Gdk.KEY_p, Gdk.ModifierType.CONTROL_MASK, 0, self.open_quick_switcher)
+        self.add_accel_group(accel_group)
         
         self.connect("delete-event", self.on_close)
+        self.first_draw_id = self.connect_after("draw", self.on_first_draw)
         self.show_all()
     
+    def on_first_draw(self, widget, cr):
+        """Everything not needed for the first frame is loaded once it has been drawn"""
+        self.disconnect(self.first_draw_id)
+        startup_profile.mark("first paint")
+        if self.ui_snapshot:
+            # the snapshot holds only the rows that were in view, starting with the one at the top
+            self.note_scroll.get_vadjustment().set_value(self.ui_snapshot.get('row_offset', 0))
+        GLib.idle_add(self.finish_startup)
+        return False
+    
+    def finish_startup(self):
+        with startup_profile.span("load Note Files"):
+            self.store.load()
+            self.populate_file_list()
+        self.hibernator.configure(self.preferences)
+        self.note_pool.size = self.preferences.get('note_pool_size', DEFAULT_POOL_SIZE)
+        
+        # Replace the snapshot with the real contents of the file that was selected (or the first one)
+        snapshot = self.ui_snapshot or {}
+        selected_file = snapshot.get('selected_file')
+        if selected_file not in self.note_files:
+            selected_file = sorted(self.note_files.keys())[0] if self.note_files else None
+        
+        self.current_file_name = selected_file
+        for child in self.note_listbox.get_children():
+            self.note_listbox.remove(child)
+        for row in self.file_listbox.get_children():
+            if hasattr(row, 'file_name') and row.file_name == selected_file:
+                self.file_listbox.select_row(row)
+                with startup_profile.span("show first Note File"):
+                    self.on_file_selected(self.file_listbox, row)
+                break
+        
+        self.file_listbox.set_sensitive(True)
+        self.note_listbox.set_sensitive(True)
+        if selected_file and selected_file == snapshot.get('selected_file'):
+            # rows are laid out before idle callbacks run, so the old scroll position can be restored then
+            GLib.idle_add(self.note_scroll.get_vadjustment().set_value, snapshot.get('scroll', 0))
+        self.ui_snapshot = None
+        
+        with startup_profile.span("sync search index"):
+            self.sync_search_index()
+        
+        with startup_profile.span("load facets"):
+            self.facet_index.load(self.search_index.get_facets())
+        
+        self.quick_index_titles = iter(self.search_index.get_titles())
+        self.quick_index_loader = GLib.idle_add(self._load_quick_index)
+        self.note_pool.queue_fill()
+        
+        self.startup_finished = True
+        for (callback, args) in self.pending_commands:
+            callback(*args)
+        self.pending_commands = []
+        
+        startup_profile.mark("startup finished")
+        if self.profile_startup:
+            print(startup_profile.format_report())
+        else:
+            startup_profile.stop()
+        
+        return GLib.SOURCE_REMOVE
+    
     
     def create_new_note(self, widget):
         """Create a new note with Sticky GUI"""
@@ -247,10 +410,8 @@ class NoteFileManager(Gtk.Window):
         
         info = {'x': x, 'y': y}
         try:
-            note = Note(self, self, info)
-            self.notes.append(note)
-            # Connect to note's update signal to refresh list when title/color changes
-            note.connect('update', self.on_note_updated)
+            note = self.build_note('text', info)
+            self.track_note(note)
         except Exception as e:
             print(f"Error creating note: {e}")
             import traceback
@@ -262,9 +423,8 @@ class NoteFileManager(Gtk.Window):
         y = 100 + len(self.notes) * 20
         info = {'x': x, 'y': y}
         try:
-            note = NoteCode(self, self, info)
-            self.notes.append(note)
-            note.connect('update', self.on_note_updated)
+            note = self.build_note('code', info)
+            self.track_note(note)
         except Exception as e:
             print(f"Error creating code note: {e}")
             import traceback
@@ -353,18 +513,8 @@ class NoteFileManager(Gtk.Window):
                 'created': __import__('datetime').datetime.now().isoformat()
             }
             
-            # Save the picture data
-            note_path = os.path.join(DATA_DIR, f"{note_id}.json")
-            with open(note_path, 'w') as f:
-                __import__('json').dump(picture_data, f, indent=2)
-            
-            # Add to current file's note list
-            if self.current_file_name not in self.note_files:
-                self.note_files[self.current_file_name] = []
-            self.note_files[self.current_file_name].append(note_id)
-            
-            # Save the file organization
-            self.save_data()
+            # Save the picture data under the current Note File
+            self.store.save_note(picture_data, self.current_file_name)
             
             # Refresh the note list
             self.refresh_current_file_view()
@@ -401,18 +551,14 @@ class NoteFileManager(Gtk.Window):
             }
             
             # Create matching note type
-            if info.get('is_code_note'):
-                from src.note_code import NoteCode
-                note = NoteCode(self, self, info)
-            else:
-                note = Note(self, self, info)
+            kind = 'code' if info.get('is_code_note') else 'text'
+            note = note_class(kind)(self, self, info)
         else:
             # No parent - create default text note
             info = {'x': x, 'y': y}
-            note = Note(self, self, info)
+            note = note_class('text')(self, self, info)
         
-        self.notes.append(note)
-        note.connect('update', self.on_note_updated)
+        self.track_note(note)
         return note
     
     def duplicate_note(self, source_note):
@@ -423,49 +569,38 @@ class NoteFileManager(Gtk.Window):
         else:
             info = {}
         
+        # The copy is a new note and must not share the source's ID
+        info.pop('id', None)
+        
         # Offset position
         info['x'] = info.get('x', 100) + 50
         info['y'] = info.get('y', 100) + 50
         
         # Create matching note type
-        if info.get('is_code_note'):
-            from src.note_code import NoteCode
-            note = NoteCode(self, self, info)
-        else:
-            note = Note(self, self, info)
+        kind = 'code' if info.get('is_code_note') else 'text'
+        note = note_class(kind)(self, self, info)
         
-        self.notes.append(note)
-        note.connect('update', self.on_note_updated)
+        self.track_note(note)
         return note
     
     def save_note_to_file(self, note):
         """Save note data and index it under its Note File"""
-        import uuid
         note_data = note.get_note_data()
+        file_name = note_data.get('note_file')
+        if file_name not in self.note_files:
+            file_name = None
+        
+        is_new = file_name is not None and note_data.get('id') not in self.note_files[file_name]
+        note.note_id = self.store.save_note(note_data, file_name)
         
-        # Generate ID if missing
-        if not note_data.get('id'):
-            note_data['id'] = str(uuid.uuid4())
-            note.note_id = note_data['id']
-        
-        # Write note JSON
-        note_path = os.path.join(DATA_DIR, f"note_{note_data['id']}.json")
-        with open(note_path, 'w') as f:
-            json.dump(note_data, f, indent=2)
-        
-        # Index under Note File
-        if note_data.get('note_file'):
-            file_name = note_data['note_file']
-            if file_name in self.note_files:
-                if note_data['id'] not in self.note_files[file_name]:
-                    self.note_files[file_name].append(note_data['id'])
-                    self.save_data()
-                    self.populate_file_list()
-                # Always refresh to show changes
-                for row in self.file_listbox.get_children():
-                    if hasattr(row, 'file_name') and row.file_name == file_name:
-                        self.on_file_selected(self.file_listbox, row)
-                        break
+        if file_name is not None:
+            if is_new:
+                self.populate_file_list()
+            # Always refresh to show changes
+            for row in self.file_listbox.get_children():
+                if hasattr(row, 'file_name') and row.file_name == file_name:
+                    self.on_file_selected(self.file_listbox, row)
+                    break
     
     def prompt_save_note(self, note):
         """Prompt user to select a Note File for saving"""
@@ -557,33 +692,13 @@ class NoteFileManager(Gtk.Window):
         if dragged_id == target_id:
             return
         
-        # Reorder in the note_files list
-        note_ids = self.note_files[self.current_file_name]
-        
-        if dragged_id in note_ids and target_id in note_ids:
-            # Remove dragged item
-            note_ids.remove(dragged_id)
-            # Insert before target
-            target_index = note_ids.index(target_id)
-            note_ids.insert(target_index, dragged_id)
-            
-            # Save and auto-refresh
-            self.save_data()
+        # Move the dragged note before the target and auto-refresh
+        if self.store.move_before(self.current_file_name, dragged_id, target_id):
             self.refresh_current_file_view()
     
     def move_note_up(self, widget, file_name, note_id):
         """Move note up in the list"""
-        if file_name not in self.note_files:
-            return
-        
-        note_ids = self.note_files[file_name]
-        if note_id not in note_ids:
-            return
-        
-        index = note_ids.index(note_id)
-        if index > 0:  # Can move up
-            note_ids[index], note_ids[index - 1] = note_ids[index - 1], note_ids[index]
-            self.save_data()
+        if self.store.move_note(file_name, note_id, -1):
             self.populate_file_list()
             # Force refresh by calling on_file_selected directly
             for row in self.file_listbox.get_children():
@@ -595,17 +710,7 @@ class NoteFileManager(Gtk.Window):
     
     def move_note_down(self, widget, file_name, note_id):
         """Move note down in the list"""
-        if file_name not in self.note_files:
-            return
-        
-        note_ids = self.note_files[file_name]
-        if note_id not in note_ids:
-            return
-        
-        index = note_ids.index(note_id)
-        if index < len(note_ids) - 1:  # Can move down
-            note_ids[index], note_ids[index + 1] = note_ids[index + 1], note_ids[index]
-            self.save_data()
+        if self.store.move_note(file_name, note_id, 1):
             self.populate_file_list()
             # Force refresh by calling on_file_selected directly
             for row in self.file_listbox.get_children():
@@ -630,17 +735,9 @@ class NoteFileManager(Gtk.Window):
         dialog.destroy()
         
         if response == Gtk.ResponseType.YES:
-            # Remove from index
-            if file_name in self.note_files and note_id in self.note_files[file_name]:
-                self.note_files[file_name].remove(note_id)
-                self.save_data()
-                self.populate_file_list()
-            
-            # Delete note JSON file
-            import os
-            note_path = os.path.join(DATA_DIR, f"note_{note_id}.json")
-            if os.path.exists(note_path):
-                os.remove(note_path)
+            # Remove from its Note File and delete the note JSON file
+            self.store.delete_note(note_id)
+            self.populate_file_list()
             
             # Clear selection
             self.selected_note_id = None
@@ -682,22 +779,23 @@ class NoteFileManager(Gtk.Window):
         
         if response == Gtk.ResponseType.OK:
             name = entry.get_text().strip()
-            if name and name not in self.note_files:
-                self.note_files[name] = []
-                self.save_data()
+            if self.store.create_file(name):
                 self.populate_file_list()
         
         dialog.destroy()
     
-    def populate_file_list(self):
-        """Populate the note files list"""
+    def populate_file_list(self, file_counts=None):
+        """Populate the note files list, from [(file_name, note count)] if given"""
         for child in self.file_listbox.get_children():
             self.file_listbox.remove(child)
         
+        if file_counts is None:
+            file_counts = self.store.file_counts()
+        
         # Create radio button group (first will be the group leader)
         radio_group = None
         
-        for file_name in sorted(self.note_files.keys()):
+        for file_name, count in file_counts:
             row = Gtk.ListBoxRow()
             hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
             hbox.set_margin_start(10)
@@ -723,7 +821,6 @@ class NoteFileManager(Gtk.Window):
             label.set_xalign(0)
             hbox.pack_start(label, True, True, 0)
             
-            count = len(self.note_files[file_name])
             count_label = Gtk.Label(label=f"({count})")
             hbox.pack_start(count_label, False, False, 0)
             
@@ -760,9 +857,12 @@ class NoteFileManager(Gtk.Window):
         dialog.destroy()
         
         if response == Gtk.ResponseType.YES:
-            del self.note_files[file_name]
-            self.save_data()
+            for note_id in self.store.delete_file(file_name):
+                self.quick_index.remove(('note', note_id))
+                self.facet_index.remove(note_id)
             self.populate_file_list()
+            # Notes outside any Note File can't be reached from search results
+            self.sync_search_index()
             
             for child in self.note_listbox.get_children():
                 self.note_listbox.remove(child)
@@ -788,125 +888,102 @@ class NoteFileManager(Gtk.Window):
         for child in self.note_listbox.get_children():
             self.note_listbox.remove(child)
         
-        note_ids = self.note_files.get(file_name, [])
-        
-        # Build hierarchy for indentation
-        note_hierarchy = self.build_note_hierarchy(note_ids)
+        # Build hierarchy for indentation; it loads every note once and hands them back in notes
+        notes = {}
+        note_hierarchy = self.store.hierarchy(self.store.notes_in(file_name), notes)
         
         for seq_num, (note_id, depth) in enumerate(note_hierarchy, 1):
-            note_data = self.load_note_by_id(note_id)
-            if note_data:
-                row = Gtk.ListBoxRow()
-                row.note_id = note_id
-                
-                # Enable drag and drop for reordering
-                row.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, [], Gdk.DragAction.MOVE)
-                row.drag_source_add_text_targets()
-                row.drag_dest_set(Gtk.DestDefaults.ALL, [], Gdk.DragAction.MOVE)
-                row.drag_dest_add_text_targets()
-                row.connect('drag-data-get', self.on_drag_data_get)
-                row.connect('drag-data-received', self.on_drag_data_received)
-                
-                hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=13)
-                # Add indentation based on depth (25px per level, 25% larger)
-                indent = 13 + (depth * 25)
-                hbox.set_margin_start(indent)
-                hbox.set_margin_end(13)
-                hbox.set_margin_top(10)
-                hbox.set_margin_bottom(10)
-                
-                # Sequential note number (25% larger)
-                seq_label = Gtk.Label(label=f"{seq_num}.")
-                seq_label.set_xalign(0)
-                seq_label.set_size_request(38, -1)
-                font_desc = Pango.FontDescription("Sans Bold 14")
-                seq_label.override_font(font_desc)
-                hbox.pack_start(seq_label, False, False, 0)
-                
-                # Color indicator box (25% larger)
-                color = note_data.get('color', 'yellow')
-                from sticky_unmodified import COLOR_CODES
-                color_code = COLOR_CODES.get(color, '#f6f907')
-                color_box = Gtk.DrawingArea()
-                color_box.set_size_request(24, 24)
-                color_box.connect('draw', self.draw_color_indicator, color_code)
-                hbox.pack_start(color_box, False, False, 0)
-
-                # Note type indicator icon (25% larger)
-                icons_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Icons')
-                if note_data.get('is_picture_note', False):
-                    # Picture note indicator
-                    picture_icon_path = os.path.join(icons_path, 'Picture.png')
-                    picture_img = Gtk.Image()
-                    if os.path.exists(picture_icon_path):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file(picture_icon_path)
-                            scaled_pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
-                            picture_img.set_from_pixbuf(scaled_pixbuf)
-                        except:
-                            picture_img = Gtk.Image.new_from_file(picture_icon_path)
-                            picture_img.set_pixel_size(24)
-                    else:
-                        picture_img = Gtk.Image.new_from_icon_name('image-x-generic', Gtk.IconSize.BUTTON)
-                    hbox.pack_start(picture_img, False, False, 0)
-                elif note_data.get('is_code_note', False):
-                    # Code note indicator
-                    code_icon_path = os.path.join(icons_path, 'Code Template.png')
-                    code_img = Gtk.Image()
-                    if os.path.exists(code_icon_path):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file(code_icon_path)
-                            scaled_pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
-                            code_img.set_from_pixbuf(scaled_pixbuf)
-                        except:
-                            code_img = Gtk.Image.new_from_file(code_icon_path)
-                            code_img.set_pixel_size(24)
-                    else:
-                        code_img = Gtk.Image.new_from_icon_name('applications-development', Gtk.IconSize.BUTTON)
-                    hbox.pack_start(code_img, False, False, 0)
-                else:
-                    # Text note indicator
-                    text_icon_path = os.path.join(icons_path, 'Add Note.png')
-                    text_img = Gtk.Image()
-                    if os.path.exists(text_icon_path):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file(text_icon_path)
-                            scaled_pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
-                            text_img.set_from_pixbuf(scaled_pixbuf)
-                        except:
-                            text_img = Gtk.Image.new_from_file(text_icon_path)
-                            text_img.set_pixel_size(24)
-                    else:
-                        text_img = Gtk.Image.new_from_icon_name('document-properties', Gtk.IconSize.BUTTON)
-                    hbox.pack_start(text_img, False, False, 0)
-                
-                # ID Tag if assigned
-                id_tag = note_data.get('id_tag', '')
-                if id_tag:
-                    tag_label = Gtk.Label(label=f"[{id_tag}]")
-                    tag_label.set_xalign(0)
-                    font_desc = Pango.FontDescription("Sans Bold 12")
-                    tag_label.override_font(font_desc)
-                    hbox.pack_start(tag_label, False, False, 5)
-                
-                title = note_data.get('title', '')
-                text = note_data.get('text', '')
-                preview = title if title else (text[:50] + "..." if len(text) > 50 else text)
-                
-                label = Gtk.Label(label=preview or "(Empty note)")
-                label.set_xalign(0)
-                font_desc = Pango.FontDescription("Sans 12")
-                label.override_font(font_desc)
-                hbox.pack_start(label, True, True, 0)
-                
-                # Store note data in row for action bar
-                row.note_data = note_data
-                
-                row.add(hbox)
-                self.note_listbox.add(row)
+            self.note_listbox.add(self._build_note_row(seq_num, depth, note_id, notes[note_id]))
         
         self.note_listbox.show_all()
     
+    def _get_type_icon(self, icon_name, fallback_icon):
+        """Return a 24px image for a note type; the scaled pixbuf is loaded once and shared by all rows"""
+        if icon_name not in self.type_icons:
+            icon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Icons', icon_name)
+            pixbuf = None
+            if os.path.exists(icon_path):
+                try:
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_file(icon_path)
+                    pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
+                except Exception as e:
+                    print(f"Error loading icon {icon_name}: {e}")
+                    pixbuf = None
+            self.type_icons[icon_name] = pixbuf
+        
+        pixbuf = self.type_icons[icon_name]
+        if pixbuf is None:
+            return Gtk.Image.new_from_icon_name(fallback_icon, Gtk.IconSize.BUTTON)
+        return Gtk.Image.new_from_pixbuf(pixbuf)
+    
+    def _build_note_row(self, seq_num, depth, note_id, note_data):
+        """Build the list row of a note in the selected Note File"""
+        row = Gtk.ListBoxRow()
+        row.note_id = note_id
+        row.depth = depth
+        
+        # Enable drag and drop for reordering
+        row.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, [], Gdk.DragAction.MOVE)
+        row.drag_source_add_text_targets()
+        row.drag_dest_set(Gtk.DestDefaults.ALL, [], Gdk.DragAction.MOVE)
+        row.drag_dest_add_text_targets()
+        row.connect('drag-data-get', self.on_drag_data_get)
+        row.connect('drag-data-received', self.on_drag_data_received)
+        
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=13)
+        # Add indentation based on depth (25px per level, 25% larger)
+        indent = 13 + (depth * 25)
+        hbox.set_margin_start(indent)
+        hbox.set_margin_end(13)
+        hbox.set_margin_top(10)
+        hbox.set_margin_bottom(10)
+        
+        # Sequential note number (25% larger)
+        seq_label = Gtk.Label(label=f"{seq_num}.")
+        seq_label.set_xalign(0)
+        seq_label.set_size_request(38, -1)
+        font_desc = Pango.FontDescription("Sans Bold 14")
+        seq_label.override_font(font_desc)
+        hbox.pack_start(seq_label, False, False, 0)
+        
+        # Color indicator box (25% larger)
+        color = note_data.get('color', 'yellow')
+        color_code = COLOR_CODES.get(color, '#f6f907')
+        color_box = Gtk.DrawingArea()
+        color_box.set_size_request(24, 24)
+        color_box.connect('draw', self.draw_color_indicator, color_code)
+        hbox.pack_start(color_box, False, False, 0)
+        
+        # Note type indicator icon (25% larger)
+        if note_data.get('is_picture_note', False):
+            type_img = self._get_type_icon('Picture.png', 'image-x-generic')
+        elif note_data.get('is_code_note', False):
+            type_img = self._get_type_icon('Code Template.png', 'applications-development')
+        else:
+            type_img = self._get_type_icon('Add Note.png', 'document-properties')
+        hbox.pack_start(type_img, False, False, 0)
+        
+        # ID Tag if assigned
+        id_tag = note_data.get('id_tag', '')
+        if id_tag:
+            tag_label = Gtk.Label(label=f"[{id_tag}]")
+            tag_label.set_xalign(0)
+            font_desc = Pango.FontDescription("Sans Bold 12")
+            tag_label.override_font(font_desc)
+            hbox.pack_start(tag_label, False, False, 5)
+        
+        label = Gtk.Label(label=note_row_title(note_data) or "(Empty note)")
+        label.set_xalign(0)
+        font_desc = Pango.FontDescription("Sans 12")
+        label.override_font(font_desc)
+        hbox.pack_start(label, True, True, 0)
+        
+        # Store note data in row for action bar
+        row.note_data = note_data
+        
+        row.add(hbox)
+        return row
+    
     def refresh_current_file_view(self):
         """Refresh the currently selected file's note list"""
         if not self.current_file_name:
@@ -917,114 +994,11 @@ class NoteFileManager(Gtk.Window):
             self.note_listbox.remove(child)
         
         # Rebuild the note list for current file
-        note_ids = self.note_files.get(self.current_file_name, [])
-        note_hierarchy = self.build_note_hierarchy(note_ids)
+        notes = {}
+        note_hierarchy = self.store.hierarchy(self.store.notes_in(self.current_file_name), notes)
         
         for seq_num, (note_id, depth) in enumerate(note_hierarchy, 1):
-            note_data = self.load_note_by_id(note_id)
-            if note_data:
-                row = Gtk.ListBoxRow()
-                row.note_id = note_id
-                
-                # Enable drag and drop for reordering
-                row.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, [], Gdk.DragAction.MOVE)
-                row.drag_source_add_text_targets()
-                row.drag_dest_set(Gtk.DestDefaults.ALL, [], Gdk.DragAction.MOVE)
-                row.drag_dest_add_text_targets()
-                row.connect('drag-data-get', self.on_drag_data_get)
-                row.connect('drag-data-received', self.on_drag_data_received)
-                
-                hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=13)
-                indent = 13 + (depth * 25)
-                hbox.set_margin_start(indent)
-                hbox.set_margin_end(13)
-                hbox.set_margin_top(10)
-                hbox.set_margin_bottom(10)
-                
-                seq_label = Gtk.Label(label=f"{seq_num}.")
-                seq_label.set_xalign(0)
-                seq_label.set_size_request(38, -1)
-                font_desc = Pango.FontDescription("Sans Bold 14")
-                seq_label.override_font(font_desc)
-                hbox.pack_start(seq_label, False, False, 0)
-                
-                color = note_data.get('color', 'yellow')
-                from sticky_unmodified import COLOR_CODES
-                color_code = COLOR_CODES.get(color, '#f6f907')
-                color_box = Gtk.DrawingArea()
-                color_box.set_size_request(24, 24)
-                color_box.connect('draw', self.draw_color_indicator, color_code)
-                hbox.pack_start(color_box, False, False, 0)
-                
-                # Note type indicator icon
-                icons_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Icons')
-                if note_data.get('is_picture_note', False):
-                    # Picture note indicator
-                    picture_icon_path = os.path.join(icons_path, 'Picture.png')
-                    picture_img = Gtk.Image()
-                    if os.path.exists(picture_icon_path):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file(picture_icon_path)
-                            scaled_pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
-                            picture_img.set_from_pixbuf(scaled_pixbuf)
-                        except:
-                            picture_img = Gtk.Image.new_from_file(picture_icon_path)
-                            picture_img.set_pixel_size(24)
-                    else:
-                        picture_img = Gtk.Image.new_from_icon_name('image-x-generic', Gtk.IconSize.BUTTON)
-                    hbox.pack_start(picture_img, False, False, 0)
-                elif note_data.get('is_code_note', False):
-                    # Code note indicator
-                    code_icon_path = os.path.join(icons_path, 'Code Template.png')
-                    code_img = Gtk.Image()
-                    if os.path.exists(code_icon_path):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file(code_icon_path)
-                            scaled_pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
-                            code_img.set_from_pixbuf(scaled_pixbuf)
-                        except:
-                            code_img = Gtk.Image.new_from_file(code_icon_path)
-                            code_img.set_pixel_size(24)
-                    else:
-                        code_img = Gtk.Image.new_from_icon_name('applications-development', Gtk.IconSize.BUTTON)
-                    hbox.pack_start(code_img, False, False, 0)
-                else:
-                    # Text note indicator
-                    text_icon_path = os.path.join(icons_path, 'Add Note.png')
-                    text_img = Gtk.Image()
-                    if os.path.exists(text_icon_path):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file(text_icon_path)
-                            scaled_pixbuf = pixbuf.scale_simple(24, 24, GdkPixbuf.InterpType.HYPER)
-                            text_img.set_from_pixbuf(scaled_pixbuf)
-                        except:
-                            text_img = Gtk.Image.new_from_file(text_icon_path)
-                            text_img.set_pixel_size(24)
-                    else:
-                        text_img = Gtk.Image.new_from_icon_name('document-properties', Gtk.IconSize.BUTTON)
-                    hbox.pack_start(text_img, False, False, 0)
-                
-                id_tag = note_data.get('id_tag', '')
-                if id_tag:
-                    tag_label = Gtk.Label(label=f"[{id_tag}]")
-                    tag_label.set_xalign(0)
-                    font_desc = Pango.FontDescription("Sans Bold 12")
-                    tag_label.override_font(font_desc)
-                    hbox.pack_start(tag_label, False, False, 5)
-                
-                title = note_data.get('title', '')
-                text = note_data.get('text', '')
-                preview = title if title else (text[:50] + "..." if len(text) > 50 else text)
-                
-                label = Gtk.Label(label=preview or "(Empty note)")
-                label.set_xalign(0)
-                font_desc = Pango.FontDescription("Sans 12")
-                label.override_font(font_desc)
-                hbox.pack_start(label, True, True, 0)
-                
-                row.note_data = note_data
-                row.add(hbox)
-                self.note_listbox.add(row)
+            self.note_listbox.add(self._build_note_row(seq_num, depth, note_id, notes[note_id]))
         
         self.note_listbox.show_all()
     
@@ -1034,53 +1008,38 @@ class NoteFileManager(Gtk.Window):
         self.refresh_current_file_view()
         
         # Find and select the note with matching ID
+        self.select_note_row(note_id)
+    
+    def select_note_row(self, note_id):
+        """Select the row for note_id in the current file's list and scroll to it"""
         for row in self.note_listbox.get_children():
             if hasattr(row, 'note_id') and row.note_id == note_id:
                 self.note_listbox.select_row(row)
-                break
+                row.grab_focus()
+                # Row allocations are only valid after the next layout pass
+                GLib.idle_add(self._scroll_to_note_row, row)
+                return True
+        
+        return False
     
-    def build_note_hierarchy(self, note_ids):
-        """Build hierarchical list of (note_id, depth) tuples"""
-        # Load all note data
-        notes = {}
-        for note_id in note_ids:
-            note_data = self.load_note_by_id(note_id)
-            if note_data:
-                notes[note_id] = note_data
-        
-        # Build parent-child relationships
-        children = {}  # parent_id -> [child_ids]
-        for note_id, data in notes.items():
-            parent_id = data.get('parent_id')
-            if parent_id:
-                if parent_id not in children:
-                    children[parent_id] = []
-                children[parent_id].append(note_id)
-        
-        # Build hierarchical list
-        hierarchy = []
-        visited = set()
-        
-        def add_note_and_children(note_id, depth):
-            if note_id in visited:
-                return
-            visited.add(note_id)
-            hierarchy.append((note_id, depth))
-            
-            # Add children recursively
-            if note_id in children:
-                for child_id in children[note_id]:
-                    add_note_and_children(child_id, depth + 1)
+    def _scroll_to_note_row(self, row):
+        """Scroll the note list so that row is visible"""
+        allocation = row.get_allocation()
+        adjustment = self.note_scroll.get_vadjustment()
+        adjustment.clamp_page(allocation.y, allocation.y + allocation.height)
+        return False
+    
+    def jump_to_note(self, file_name, note_id):
+        """Show file_name in the right panel and select note_id in it"""
+        self.right_stack.set_visible_child_name("notes")
         
-        # Add all notes, starting with top-level (no parent)
-        for note_id in note_ids:
-            if note_id in notes:
-                parent_id = notes[note_id].get('parent_id')
-                # Only add top-level notes here, children will be added recursively
-                if not parent_id or parent_id not in notes:
-                    add_note_and_children(note_id, 0)
+        for row in self.file_listbox.get_children():
+            if hasattr(row, 'file_name') and row.file_name == file_name:
+                self.file_listbox.select_row(row)
+                self.on_file_selected(self.file_listbox, row)
+                return self.select_note_row(note_id)
         
-        return hierarchy
+        return False
     
     def on_note_row_selected(self, listbox, row):
         """Handle note selection - enable/disable action bar buttons"""
@@ -1104,11 +1063,9 @@ class NoteFileManager(Gtk.Window):
             
             # Enable/disable up/down based on position
             if self.current_file_name:
-                note_ids = self.note_files.get(self.current_file_name, [])
-                if self.selected_note_id in note_ids:
-                    index = note_ids.index(self.selected_note_id)
-                    self.up_btn.set_sensitive(index > 0)
-                    self.down_btn.set_sensitive(index < len(note_ids) - 1)
+                (can_move_up, can_move_down) = self.store.can_move(self.current_file_name, self.selected_note_id)
+                self.up_btn.set_sensitive(can_move_up)
+                self.down_btn.set_sensitive(can_move_down)
     
     def action_open_note(self, widget):
         """Open the selected note"""
@@ -1141,112 +1098,421 @@ class NoteFileManager(Gtk.Window):
         if hasattr(note, 'note_file') and note.note_file:
             # Also save the updated note data
             if hasattr(note, 'note_id') and note.note_id:
-                note_data = note.get_note_data()
-                note_path = os.path.join(DATA_DIR, f"note_{note.note_id}.json")
-                with open(note_path, 'w') as f:
-                    json.dump(note_data, f, indent=2)
+                self.store.save_note(note.get_note_data())
             
             # Refresh if viewing the note's file
             if note.note_file == self.current_file_name:
                 self.refresh_current_file_view()
     
+    def build_note(self, kind, info):
+        """Return a 'text' or 'code' note window for info, reusing a prebuilt one when the pool has it"""
+        note = self.note_pool.take(kind, info)
+        if note is None:
+            note = note_class(kind)(self, self, info)
+        else:
+            note.show()
+        
+        return note
+    
+    def track_note(self, note):
+        """Keep an open note in self.notes until its window is destroyed"""
+        self.notes.append(note)
+        # Connect to note's update signal to refresh list when title/color changes
+        note.connect('update', self.on_note_updated)
+        note.connect('destroy', self.on_note_destroyed)
+        self.hibernator.register(note)
+    
+    def on_note_destroyed(self, note):
+        if note in self.notes:
+            self.notes.remove(note)
+    
     def open_saved_note(self, widget, note_data):
         """Open a saved note"""
+        self.hibernator.forget(note_data.get('id'))
         try:
             # Check if this is a picture note
             if note_data.get('is_picture_note', False):
-                from src.note_picture import NotePicture
-                note = NotePicture(self, self, note_data)
+                note = note_class('picture')(self, self, note_data)
             # Check if this is a code note
             elif note_data.get('is_code_note', False):
-                note = NoteCode(self, self, note_data)
+                note = self.build_note('code', note_data)
             else:
-                note = Note(self, self, note_data)
-            self.notes.append(note)
-            # Connect to note's update signal to refresh list when title/color changes
-            note.connect('update', self.on_note_updated)
+                note = self.build_note('text', note_data)
+            self.track_note(note)
         except Exception as e:
             print(f"Error opening note: {e}")
             import traceback
             traceback.print_exc()
     
-    def load_note_by_id(self, note_id):
-        """Load note data by ID - handles both regular notes and picture notes"""
-        # Try regular note format first
-        file_path = os.path.join(DATA_DIR, f"note_{note_id}.json")
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                return json.load(f)
+    def find_note_file(self, note_id):
+        """Return the name of the Note File containing note_id, or None"""
+        return self.store.find_file(note_id)
+    
+    def index_note(self, note_data):
+        """Add or refresh a saved note in the search index"""
+        note_id = note_data.get('id')
+        if not note_id:
+            return
         
-        # Try picture note format
-        file_path = os.path.join(DATA_DIR, f"{note_id}.json")
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                return json.load(f)
+        file_name = self.find_note_file(note_id)
+        if file_name is None:
+            return
         
-        return None
+        note_path = self.store.note_path(note_id)
+        mtime = os.path.getmtime(note_path) if note_path else None
+        self.search_index.update_note(note_id, file_name, note_data, mtime)
+        self.add_quick_entry(note_id, file_name, note_data.get('title', ''), note_data.get('id_tag', ''))
+        self.facet_index.add(note_id, file_name, note_data.get('color', 'yellow'), note_data.get('id_tag', ''),
+                             note_type(note_data), note_data.get('parent_id'))
+    
+    def sync_search_index(self):
+        """Re-index notes that changed on disk since they were last indexed"""
+        self.search_index.sync(self.store.index_entries(), self.load_note_by_id)
+    
+    def unindex_note(self, note_id):
+        """Drop a deleted note from the search, quick switcher and facet indexes"""
+        self.search_index.remove_note(note_id)
+        self.quick_index.remove(('note', note_id))
+        self.facet_index.remove(note_id)
+    
+    def add_quick_entry(self, note_id, file_name, title, id_tag):
+        """Add or refresh a note in the quick switcher index"""
+        id_tag = str(id_tag or '')
+        self.quick_index.add(('note', note_id), (id_tag, title, file_name), (id_tag, title, file_name))
+    
+    def _load_quick_index(self):
+        """Idle callback filling the quick switcher index a chunk at a time"""
+        for i in range(QUICK_INDEX_CHUNK):
+            entry = next(self.quick_index_titles, None)
+            if entry is None:
+                self.quick_index_loader = 0
+                return False
+            
+            note_id, file_name, title, id_tag = entry
+            if ('note', note_id) not in self.quick_index:
+                self.add_quick_entry(note_id, file_name, title, id_tag)
+        
+        return True
+    
+    def open_quick_switcher(self, *args):
+        """Ctrl+P: fuzzy jump to a note or Note File"""
+        if self.quick_index_loader:
+            # Opened before the background load finished - finish it now
+            GLib.source_remove(self.quick_index_loader)
+            while self._load_quick_index():
+                pass
+        
+        # Note Files are few, so just bring them up to date on every open
+        for key in [key for key in self.quick_index.doc_ids if key[0] == 'file' and key[1] not in self.note_files]:
+            self.quick_index.remove(key)
+        for file_name in self.note_files:
+            if ('file', file_name) not in self.quick_index:
+                self.quick_index.add(('file', file_name), ('', file_name, ''))
+        
+        QuickSwitcher(self, self.quick_index, self.on_quick_switch)
+        return True
+    
+    def on_quick_switch(self, key):
+        """Show the chosen Note File, or select the chosen note in its file and open it"""
+        (kind, name) = key
+        self.present()
+        
+        if kind == 'file':
+            self.jump_to_note(name, None)
+            return
+        
+        file_name = self.find_note_file(name)
+        note_data = self.load_note_by_id(name)
+        if file_name is None or note_data is None:
+            self.quick_index.remove(key)
+            return
+        
+        self.jump_to_note(file_name, name)
+        self.open_saved_note(None, note_data)
+    
+    def when_started(self, callback, *args):
+        """Run callback now, or once the Note Files have been loaded if startup hasn't finished yet"""
+        if self.startup_finished:
+            callback(*args)
+        else:
+            self.pending_commands.append((callback, args))
+    
+    def open_note_by_tag(self, id_tag):
+        """Select and open the note with this ID tag (or the first one whose tag starts with it)"""
+        id_tag = id_tag.strip().upper()
+        note_ids = self.facet_index.note_ids_in(self.facet_index.tag_bitmap(id_tag)) if id_tag else []
+        if not note_ids:
+            print(f"Error opening note: no note has the ID tag {id_tag}")
+            self.present()
+            return False
+        
+        exact = [note_id for note_id in note_ids if self.facet_index.get(note_id)['id_tag'] == id_tag]
+        self.on_quick_switch(('note', (exact or note_ids)[0]))
+        return True
+    
+    def show_search(self, search_text):
+        """Present the window with search_text in the search entry, which starts the search"""
+        self.present()
+        self.search_entry.set_text(search_text)
+        self.search_entry.grab_focus()
+    
+    def on_search_changed(self, entry):
+        """Search all Note Files; results are streamed into the right panel"""
+        search_text = entry.get_text().strip()
+        
+        if search_text == '':
+            self.search_pipeline.cancel()
+            if self.facet_query and self.right_stack.get_visible_child_name() == "search":
+                # Back from a text search to the plain filtered list
+                self.show_filter_results()
+                return
+            
+            for child in self.search_listbox.get_children():
+                self.search_listbox.remove(child)
+            self.right_stack.set_visible_child_name("notes")
+            return
+        
+        self.search_pipeline.request(search_text)
+    
+    def prepare_search(self, search_text):
+        """Runs on the main thread before a search: snapshot the filters"""
+        return (search_text, dict(self.facet_query) if self.facet_query else None)
+    
+    def run_search(self, query, is_cancelled):
+        """Runs on the search worker thread; the filters are applied by the search query itself"""
+        search_text, filters = query
+        return self.search_index.search(search_text, SEARCH_RESULT_LIMIT, is_cancelled, filters)
+    
+    def _build_filter_button(self):
+        """Build the toolbar button with a popover for filtering notes by metadata"""
+        button = Gtk.MenuButton(label="Filter")
+        button.set_valign(Gtk.Align.CENTER)
+        
+        popover = Gtk.Popover()
+        popover.connect("show", lambda widget: self.update_filter_counts())
+        button.set_popover(popover)
+        
+        grid = Gtk.Grid(column_spacing=8, row_spacing=6)
+        grid.set_margin_start(10)
+        grid.set_margin_end(10)
+        grid.set_margin_top(10)
+        grid.set_margin_bottom(10)
+        popover.add(grid)
+        
+        self.filter_combos = {}
+        for row, (facet, label_text) in enumerate((('color', "Color:"), ('type', "Type:"), ('file', "Note File:"))):
+            label = Gtk.Label(label=label_text)
+            label.set_xalign(0)
+            grid.attach(label, 0, row, 1, 1)
+            
+            combo = Gtk.ComboBoxText()
+            combo.connect("changed", self.on_filter_changed)
+            grid.attach(combo, 1, row, 1, 1)
+            self.filter_combos[facet] = combo
+        
+        label = Gtk.Label(label="ID Tag starts with:")
+        label.set_xalign(0)
+        grid.attach(label, 0, 3, 1, 1)
+        
+        self.filter_tag_entry = Gtk.Entry()
+        self.filter_tag_entry.set_placeholder_text("e.g. 1447")
+        self.filter_tag_entry.connect("changed", self.on_filter_changed)
+        grid.attach(self.filter_tag_entry, 1, 3, 1, 1)
+        
+        # the parent facet: the note selected when this is checked stays the parent until it is unchecked
+        self.filter_parent_id = None
+        self.filter_parent_check = Gtk.CheckButton(label="Only sub-notes of the selected note")
+        self.filter_parent_check.connect("toggled", self.on_filter_parent_toggled)
+        grid.attach(self.filter_parent_check, 0, 4, 2, 1)
+        
+        self.filter_subsets_check = Gtk.CheckButton(label="Include sub-notes filed elsewhere")
+        self.filter_subsets_check.connect("toggled", self.on_filter_changed)
+        grid.attach(self.filter_subsets_check, 0, 5, 2, 1)
+        
+        clear_btn = Gtk.Button(label="Clear Filters")
+        clear_btn.connect("clicked", self.clear_filters)
+        grid.attach(clear_btn, 0, 6, 2, 1)
+        
+        grid.show_all()
+        return button
+    
+    def get_facet_query(self):
+        """Read the filter popover into FacetIndex.query() arguments ({} if nothing is filtered)"""
+        query = {}
+        for facet, key in (('color', 'color'), ('type', 'note_type'), ('file', 'file')):
+            value = self.filter_combos[facet].get_active_id()
+            if value:
+                query[key] = value
+        
+        tag_prefix = self.filter_tag_entry.get_text().strip()
+        if tag_prefix:
+            query['tag_prefix'] = tag_prefix
+        
+        if self.filter_parent_id:
+            query['parent'] = self.filter_parent_id
+        
+        if query and self.filter_subsets_check.get_active():
+            query['include_subsets'] = True
+        
+        return query
+    
+    def update_filter_counts(self):
+        """Refill the filter combos with the number of matching notes for each value"""
+        
+        value_names = {
+            'color': [(color, display_name) for color, display_name in COLORS.items()],
+            'type': [(kind, kind.capitalize()) for kind in NOTE_TYPES],
+            'file': [(file_name, file_name) for file_name in sorted(self.note_files.keys())]
+        }
+        
+        self.updating_filters = True
+        for facet, combo in self.filter_combos.items():
+            active_id = combo.get_active_id() or ''
+            counts = self.facet_index.counts(facet, **self.facet_query)
+            
+            combo.remove_all()
+            combo.append('', f"Any ({sum(counts.values())})")
+            for value, display_name in value_names[facet]:
+                if counts.get(value) or value == active_id:
+                    combo.append(value, f"{display_name} ({counts.get(value, 0)})")
+            combo.set_active_id(active_id)
+        self.updating_filters = False
+    
+    def on_filter_changed(self, widget):
+        """Re-run the current search (or list the filtered notes) with the new filters"""
+        if self.updating_filters:
+            return
+        
+        self.facet_query = self.get_facet_query()
+        self.update_filter_counts()
+        
+        if self.facet_query:
+            count = popcount(self.facet_index.query(**self.facet_query))
+            self.filter_button.set_label(f"Filter ({count})")
+        else:
+            self.filter_button.set_label("Filter")
+        
+        if self.facet_query and self.search_entry.get_text().strip() == '':
+            self.show_filter_results()
+        else:
+            self.on_search_changed(self.search_entry)
+    
+    def on_filter_parent_toggled(self, check):
+        """Filter by the selected note as parent, showing its title on the check button"""
+        label = "Only sub-notes of the selected note"
+        self.filter_parent_id = None
+        if check.get_active():
+            note_data = self.load_note_by_id(self.selected_note_id) if self.selected_note_id else None
+            if note_data is None:
+                self.updating_filters = True
+                check.set_active(False)
+                self.updating_filters = False
+            else:
+                self.filter_parent_id = self.selected_note_id
+                label = f"Only sub-notes of \"{note_row_title(note_data) or '(Empty note)'}\""
+        check.set_label(label)
+        
+        self.on_filter_changed(check)
+    
+    def clear_filters(self, widget):
+        self.updating_filters = True
+        for combo in self.filter_combos.values():
+            combo.set_active_id('')
+        self.filter_tag_entry.set_text('')
+        self.filter_parent_check.set_active(False)
+        self.filter_subsets_check.set_active(False)
+        self.updating_filters = False
+        
+        self.on_filter_changed(widget)
+    
+    def show_filter_results(self):
+        """List the notes matching the filters, in Note File order"""
+        note_ids = self.facet_index.note_ids_in(self.facet_index.query(**self.facet_query))
+        
+        positions = self.store.positions()
+        note_ids.sort(key=lambda note_id: positions.get(note_id, ('', 0)))
+        
+        self.on_search_started()
+        self.on_search_results(self.search_index.get_summaries(note_ids[:SEARCH_RESULT_LIMIT]))
+    
+    def on_search_started(self):
+        """First batch of a new query arrived - replace the previous results"""
+        for child in self.search_listbox.get_children():
+            self.search_listbox.remove(child)
+        
+        self.right_stack.set_visible_child_name("search")
+    
+    def on_search_results(self, results):
+        """Append a ranked batch of results to the search list"""
+        for result in results:
+            row = self._build_search_row(result)
+            row.show_all()
+            self.search_listbox.add(row)
+    
+    def on_search_activate(self, entry):
+        """Enter in the search entry jumps to the best match"""
+        row = self.search_listbox.get_row_at_index(0)
+        if row is not None:
+            self.on_search_result_activated(self.search_listbox, row)
+    
+    def on_search_result_activated(self, listbox, row):
+        """Jump to the note's row in its Note File"""
+        self.search_pipeline.cancel()
+        self.jump_to_note(row.file_name, row.note_id)
+        self.search_entry.set_text('')
+    
+    def _build_search_row(self, result):
+        """Build a search result row with the note's location and a highlighted snippet"""
+        row = Gtk.ListBoxRow()
+        row.note_id = result['note_id']
+        row.file_name = result['file_name']
+        
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        vbox.set_margin_start(13)
+        vbox.set_margin_end(13)
+        vbox.set_margin_top(8)
+        vbox.set_margin_bottom(8)
+        
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        vbox.pack_start(hbox, False, False, 0)
+        
+        file_label = Gtk.Label(label=f"📁 {result['file_name']}")
+        file_label.set_xalign(0)
+        hbox.pack_start(file_label, False, False, 0)
+        
+        if result['id_tag']:
+            tag_label = Gtk.Label(label=f"[{result['id_tag']}]")
+            tag_label.override_font(Pango.FontDescription("Sans Bold 12"))
+            hbox.pack_start(tag_label, False, False, 0)
+        
+        title_label = Gtk.Label(label=result['title'] or "(Untitled)")
+        title_label.set_xalign(0)
+        title_label.set_ellipsize(Pango.EllipsizeMode.END)
+        title_label.override_font(Pango.FontDescription("Sans 12"))
+        hbox.pack_start(title_label, True, True, 0)
+        
+        snippet_label = Gtk.Label()
+        snippet_label.set_markup(snippet_to_markup(result['snippet'].replace('\n', ' ')))
+        snippet_label.set_xalign(0)
+        snippet_label.set_line_wrap(True)
+        snippet_label.set_lines(2)
+        snippet_label.set_ellipsize(Pango.EllipsizeMode.END)
+        vbox.pack_start(snippet_label, False, False, 0)
+        
+        row.add(vbox)
+        return row
+    
+    def load_note_by_id(self, note_id):
+        """Load note data by ID - handles both regular notes and picture notes"""
+        return self.store.load_note(note_id)
     
     def save_data(self):
         """Save note files organization and metadata"""
-        data = {
-            'note_files': self.note_files,
-            'note_file_metadata': self.note_file_metadata
-        }
-        file_path = os.path.join(DATA_DIR, "notebook.json")
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
-    
-    def load_data(self):
-        """Load note files organization"""
-        file_path = os.path.join(DATA_DIR, "notebook.json")
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                note_files_raw = data.get('note_files', {})
-                
-                # Handle both old and new formats
-                # New format: {"file": {"notes": [ids], "description": "...", "instructions": "..."}}
-                # Old format: {"file": [ids]}
-                self.note_files = {}
-                self.note_file_metadata = {}
-                for file_name, file_data in note_files_raw.items():
-                    if isinstance(file_data, dict) and 'notes' in file_data:
-                        # New format with nested "notes"
-                        self.note_files[file_name] = file_data['notes']
-                    elif isinstance(file_data, list):
-                        # Old format, direct list
-                        self.note_files[file_name] = file_data
-                    else:
-                        # Unknown format, initialize empty
-                        self.note_files[file_name] = []
-                
-                # Load separate metadata structures
-                raw_file_metadata = data.get('note_file_metadata', {})
-                for file_name in self.note_files.keys():
-                    if file_name in raw_file_metadata:
-                        metadata = raw_file_metadata[file_name]
-                        # Ensure color_config and number_config exist
-                        if 'color_config' not in metadata:
-                            metadata['color_config'] = {}
-                        if 'number_config' not in metadata:
-                            metadata['number_config'] = {}
-                        self.note_file_metadata[file_name] = metadata
-                    else:
-                        self.note_file_metadata[file_name] = {
-                            'description': '',
-                            'instructions': '',
-                            'color_config': {},
-                            'number_config': {}
-                        }
+        self.store.save()
     
     def edit_file_metadata(self, widget, file_name):
         """Edit Description, Instructions, and Color Configuration for a Note File"""
-        if file_name not in self.note_file_metadata:
-            self.note_file_metadata[file_name] = {'description': '', 'instructions': '', 'color_config': {}}
-        
-        metadata = self.note_file_metadata[file_name]
-        if 'color_config' not in metadata:
-            metadata['color_config'] = {}
+        metadata = self.store.file_metadata(file_name)
         
         dialog = Gtk.Dialog(
             title="Note File Settings",
@@ -1326,7 +1592,6 @@ class NoteFileManager(Gtk.Window):
         color_grid.set_margin_bottom(10)
         color_tab_scroll.add(color_grid)
         
-        from sticky_unmodified import COLORS
         color_entries = {}
         
         row = 0
@@ -1377,21 +1642,9 @@ class NoteFileManager(Gtk.Window):
         number_grid.set_margin_bottom(10)
         number_tab_scroll.add(number_grid)
         
-        # Get existing number config or initialize
-        if 'number_config' not in metadata:
-            metadata['number_config'] = {}
-        
-        # Find all unique ID tags used in this file's notes
-        used_tags = set()
-        tag_note_data = {}  # Map tag to note data for auto-population
-        for note_id in self.note_files.get(file_name, []):
-            note_data = self.load_note_by_id(note_id)
-            if note_data and 'id_tag' in note_data and note_data['id_tag']:
-                tag = str(note_data['id_tag'])
-                used_tags.add(tag)
-                # Store first occurrence of each tag's note data for propagation
-                if tag not in tag_note_data:
-                    tag_note_data[tag] = note_data
+        # Find all unique ID tags used in this file's notes, with the first note of each for auto-population
+        tag_note_data = self.store.tag_notes(file_name)
+        used_tags = set(tag_note_data)
         
         # Auto-populate folder's tag config from notes if not already set
         for tag, note_data in tag_note_data.items():
@@ -1470,13 +1723,12 @@ class NoteFileManager(Gtk.Window):
                     'instructions': inst_buf.get_text(inst_buf.get_start_iter(), inst_buf.get_end_iter(), True)
                 }
             
-            self.note_file_metadata[file_name] = {
+            self.store.set_file_metadata(file_name, {
                 'description': file_desc_buffer.get_text(file_desc_buffer.get_start_iter(), file_desc_buffer.get_end_iter(), True),
                 'instructions': file_inst_buffer.get_text(file_inst_buffer.get_start_iter(), file_inst_buffer.get_end_iter(), True),
                 'color_config': color_config,
                 'number_config': tag_config
-            }
-            self.save_data()
+            })
         
         dialog.destroy()
     
@@ -1511,7 +1763,6 @@ class NoteFileManager(Gtk.Window):
         color_hbox.pack_start(color_label, False, False, 0)
         
         # Import color names and codes
-        from sticky_unmodified import COLORS, COLOR_CODES
         color_combo = Gtk.ComboBoxText()
         current_color = note_data.get('color', 'yellow')
         color_index = 0
@@ -1603,9 +1854,7 @@ class NoteFileManager(Gtk.Window):
             note_data['color'] = new_color
             note_data['description'] = desc_buffer.get_text(desc_buffer.get_start_iter(), desc_buffer.get_end_iter(), True)
             note_data['instructions'] = inst_buffer.get_text(inst_buffer.get_start_iter(), inst_buffer.get_end_iter(), True)
-            note_path = os.path.join(DATA_DIR, f"note_{note_id}.json")
-            with open(note_path, 'w') as f:
-                json.dump(note_data, f, indent=2)
+            self.store.save_note(note_data)
             
             # Update any open notes with this ID and apply color change immediately
             for note in self.notes:
@@ -1619,19 +1868,184 @@ class NoteFileManager(Gtk.Window):
         
         dialog.destroy()
     
+    def load_ui_snapshot(self):
+        """Return the UI snapshot saved when the window was last closed, or None"""
+        try:
+            with open(UI_SNAPSHOT_PATH, 'r') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error loading UI snapshot: {e}")
+            return None
+        
+        if snapshot.get('version') != UI_SNAPSHOT_VERSION:
+            return None
+        return snapshot
+    
+    def show_ui_snapshot(self, snapshot):
+        """Fill the file and note lists from a snapshot; they stay insensitive until the real data is loaded"""
+        self.populate_file_list(snapshot.get('files', []))
+        selected_file = snapshot.get('selected_file')
+        for row in self.file_listbox.get_children():
+            if row.file_name == selected_file:
+                self.file_listbox.select_row(row)
+                break
+        
+        for seq_num, entry in enumerate(snapshot.get('rows', []), snapshot.get('first_row', 1)):
+            note_data = {
+                'color': entry.get('color', 'yellow'),
+                'is_code_note': entry.get('type') == 'code',
+                'is_picture_note': entry.get('type') == 'picture',
+                'id_tag': entry.get('id_tag', ''),
+                'title': entry.get('title', '')
+            }
+            self.note_listbox.add(self._build_note_row(seq_num, entry.get('depth', 0), entry.get('id'), note_data))
+        
+        self.file_listbox.set_sensitive(False)
+        self.note_listbox.set_sensitive(False)
+    
+    def save_ui_snapshot(self):
+        """Save what the Note File and note lists show, to be drawn right away on the next start"""
+        if self.ui_snapshot is not None:
+            # still showing the last snapshot, there is nothing newer to save
+            return
+        
+        # only the rows in view are saved, so a large Note File doesn't slow down the first frame
+        adjustment = self.note_scroll.get_vadjustment()
+        (top, bottom) = (adjustment.get_value(), adjustment.get_value() + adjustment.get_page_size())
+        rows = []
+        first_row = 1
+        row_offset = 0
+        for row in self.note_listbox.get_children():
+            note_data = getattr(row, 'note_data', None)
+            if note_data is None:
+                continue
+            allocation = row.get_allocation()
+            if allocation.y + allocation.height <= top:
+                first_row += 1
+                continue
+            if allocation.y >= bottom:
+                break
+            if not rows:
+                row_offset = top - allocation.y
+            rows.append({
+                'id': row.note_id,
+                'depth': row.depth,
+                'color': note_data.get('color', 'yellow'),
+                'type': note_type(note_data),
+                'id_tag': note_data.get('id_tag', ''),
+                'title': note_row_title(note_data)
+            })
+        
+        snapshot = {
+            'version': UI_SNAPSHOT_VERSION,
+            'files': self.store.file_counts(),
+            'selected_file': self.current_file_name,
+            'rows': rows,
+            'first_row': first_row,
+            'row_offset': row_offset,
+            'scroll': top
+        }
+        
+        try:
+            temp_path = UI_SNAPSHOT_PATH + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, UI_SNAPSHOT_PATH)
+        except OSError as e:
+            print(f"Error saving UI snapshot: {e}")
+    
     def on_close(self, widget, event):
         """Handle window close: save data and hide the manager."""
         self.save_data()
+        self.save_ui_snapshot()
         # Don't quit, just hide
         self.hide()
         return True
 
-def main():
-    # Create and show only our manager window (Note Files UI)
-    manager = NoteFileManager()
+class NotebookApplication(Gtk.Application):
+    """Single instance Note Book process.
+
+    The first launch builds the manager window and keeps running after it is
+    closed (closing only hides it). Later launches, and D-Bus activation
+    through org.x.notebook.service, hand their command line or action to this
+    process instead of starting again, so they only have to present the window
+    or run the command.
+    """
+
+    def __init__(self):
+        super().__init__(application_id=APPLICATION_ID, flags=Gio.ApplicationFlags.HANDLES_COMMAND_LINE)
+        self.manager = None
+
+        self.add_main_option('new', ord('n'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             'Create a new note', None)
+        self.add_main_option('new-code', ord('c'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             'Create a new code note', None)
+        self.add_main_option('open', ord('o'), GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+                             'Open the note with this ID tag', 'TAG')
+        self.add_main_option('search', ord('s'), GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+                             'Search all Note Files', 'TEXT')
+        self.add_main_option('quick-switch', ord('p'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             'Open the quick switcher', None)
+        self.add_main_option('profile-startup', 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             'Print a startup profile once the Note Files are loaded', None)
+
+    def do_startup(self):
+        Gtk.Application.do_startup(self)
+
+        # Exported on D-Bus as org.gtk.Actions, e.g. gapplication action org.x.notebook open-tag "'A1'"
+        actions = [
+            ('new-note', None, lambda: self.manager.create_new_note(None)),
+            ('new-code-note', None, lambda: self.manager.create_new_code_note(None)),
+            ('open-tag', GLib.VariantType.new('s'), lambda id_tag: self.manager.open_note_by_tag(id_tag)),
+            ('search', GLib.VariantType.new('s'), lambda text: self.manager.show_search(text)),
+            ('quick-switch', None, lambda: self.manager.open_quick_switcher()),
+        ]
+        for (name, parameter_type, callback) in actions:
+            action = Gio.SimpleAction.new(name, parameter_type)
+            action.connect('activate', self.on_action, callback)
+            self.add_action(action)
+
+    def on_action(self, action, parameter, callback):
+        self.activate()
+        if parameter is None:
+            self.manager.when_started(callback)
+        else:
+            self.manager.when_started(callback, parameter.unpack())
+
+    def do_activate(self):
+        if self.manager is not None:
+            self.manager.present()
+            return
+
+        with startup_profile.span("build manager window"):
+            self.manager = NoteFileManager()
+        self.add_window(self.manager)
+        # the window is only ever hidden, but hold anyway so the process outlives it
+        self.hold()
+
+    def do_command_line(self, command_line):
+        options = command_line.get_options_dict().end().unpack()
+
+        self.activate()
 
-    # Run the main loop
-    Gtk.main()
+        if 'new' in options:
+            self.activate_action('new-note', None)
+        if 'new-code' in options:
+            self.activate_action('new-code-note', None)
+        if 'open' in options:
+            self.activate_action('open-tag', GLib.Variant('s', options['open']))
+        if 'search' in options:
+            self.activate_action('search', GLib.Variant('s', options['search']))
+        if 'quick-switch' in options:
+            self.activate_action('quick-switch', None)
+
+        return 0
+
+def main():
+    app = NotebookApplication()
+    app.run(sys.argv)
 
 if __name__ == "__main__":
     main()
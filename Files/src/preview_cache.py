@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+"""
+Preview Cache - note preview tiles for the manager, rendered once to cairo surfaces
+
+A tile is drawn with Pango straight onto an image surface, so showing a note
+in the manager costs one Gtk.Image instead of a widget tree per note. Tiles
+are kept in a small in-memory LRU and as PNG files under the user cache
+directory, keyed by a hash of everything that affects how they look (title,
+snippet, color, font and scale), so an unchanged note is never drawn twice.
+
+Notes with the same look share a tile, so a note that changes only lets go
+of its tile in memory (see use and invalidate). The PNG files are left for
+prune, which deletes the least recently used ones once the directory grows
+past MAX_DISK_BYTES; tiles of an old font or scale age out the same way.
+"""
+
+import hashlib
+import os
+from collections import Counter, OrderedDict
+from xml.sax.saxutils import escape
+
+import cairo
+import gi
+gi.require_version('Gdk', '3.0')
+gi.require_version('PangoCairo', '1.0')
+from gi.repository import Gdk, GLib, Pango, PangoCairo
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(GLib.get_user_cache_dir(), 'sticky', 'previews')
+
+PREVIEW_SIZE = 150
+TITLE_PADDING = 5
+TEXT_PADDING = 10
+MAX_MEMORY_PREVIEWS = 256
+MAX_DISK_BYTES = 32 * 1024 * 1024
+PRUNE_INTERVAL = 200  # PNG files written between checks of the cache size
+
+TEXT_COLOR = (0x30 / 255, 0x30 / 255, 0x30 / 255)
+FALLBACK_COLORS = ('#feff9f', '#f6f907')  # yellow main and title
+
+def snippet_markup(snippet, match):
+    if match is None:
+        return escape(snippet)
+
+    (start, end) = match
+    return escape(snippet[:start]) + '<b>' + escape(snippet[start:end]) + '</b>' + escape(snippet[end:])
+
+class PreviewCache(object):
+    def __init__(self, style_widget, cache_dir=CACHE_DIR):
+        # style_widget is only used to look up the note colors defined in the theme (@red1, @red2...)
+        self.style_widget = style_widget
+        self.cache_dir = cache_dir
+        self.memory = OrderedDict()
+        self.colors = {}
+        self.note_keys = {}  # note -> key of the preview it shows
+        self.key_users = Counter()  # key -> number of notes showing it
+        self.writes = 0
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Error creating preview cache directory: {e}")
+
+        GLib.idle_add(self.prune, priority=GLib.PRIORITY_LOW)
+
+    def get_key(self, item, font):
+        scale = self.style_widget.get_scale_factor()
+        data = '\0'.join([str(CACHE_VERSION), item.info.get('color', 'yellow'), font, str(scale),
+                          item.title, item.snippet, repr(item.match)])
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.png')
+
+    def get_surface(self, item, font):
+        """Return the preview surface for a manager Note item, rendering it if it isn't cached"""
+        scale = self.style_widget.get_scale_factor()
+        key = self.get_key(item, font)
+
+        surface = self.memory.get(key)
+        if surface is not None:
+            self.memory.move_to_end(key)
+            return surface
+
+        path = self.get_path(key)
+        surface = None
+        if os.path.exists(path):
+            try:
+                surface = cairo.ImageSurface.create_from_png(path)
+                surface.set_device_scale(scale, scale)
+                # prune goes by modification time, so a used preview counts as new
+                os.utime(path)
+            except Exception as e:
+                print(f"Error loading cached preview: {e}")
+
+        if surface is None:
+            surface = self.render(item, font, scale)
+            # search hits are centred on the match and rarely shown twice, so only plain previews go to disk
+            if item.match is None:
+                try:
+                    surface.write_to_png(path)
+                except Exception as e:
+                    print(f"Error saving preview: {e}")
+
+                self.writes += 1
+                if self.writes % PRUNE_INTERVAL == 0:
+                    self.prune()
+
+        self.memory[key] = surface
+        if len(self.memory) > MAX_MEMORY_PREVIEWS:
+            self.memory.popitem(last=False)
+
+        return surface
+
+    def use(self, note, key):
+        """Record that note (any hashable that identifies it) shows the preview key, letting go of its old one"""
+        old_key = self.note_keys.get(note)
+        if old_key == key:
+            return
+
+        self.note_keys[note] = key
+        self.key_users[key] += 1
+        if old_key is not None:
+            self.release(old_key)
+
+    def invalidate(self, note):
+        """Forget the preview of a note that is gone; other notes that look the same keep it"""
+        key = self.note_keys.pop(note, None)
+        if key is not None:
+            self.release(key)
+
+    def release(self, key):
+        self.key_users[key] -= 1
+        if self.key_users[key] <= 0:
+            del self.key_users[key]
+            # the PNG stays until prune, in case the note is changed back or another note ends up looking the same
+            self.memory.pop(key, None)
+
+    def prune(self, max_bytes=MAX_DISK_BYTES):
+        """Delete the least recently used PNG files until the cache directory is well under max_bytes"""
+        try:
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(self.cache_dir) if entry.name.endswith('.png')]
+        except OSError as e:
+            print(f"Error reading preview cache: {e}")
+            return GLib.SOURCE_REMOVE
+
+        total = sum(size for (mtime, size, path) in entries)
+        if total > max_bytes:
+            # prune down to three quarters so the next prune isn't right after the next few writes
+            for (mtime, size, path) in sorted(entries):
+                if total <= max_bytes * 3 // 4:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    print(f"Error removing cached preview: {e}")
+
+        return GLib.SOURCE_REMOVE
+
+    def clear_memory(self):
+        self.memory.clear()
+        self.colors.clear()
+        self.note_keys.clear()
+        self.key_users.clear()
+
+    def get_colors(self, color):
+        """Return the (main, title) RGB colors of a note color from the theme"""
+        if color not in self.colors:
+            context = self.style_widget.get_style_context()
+            rgb = []
+            for (suffix, fallback) in zip(('1', '2'), FALLBACK_COLORS):
+                (found, rgba) = context.lookup_color(color + suffix)
+                if not found:
+                    rgba = Gdk.RGBA()
+                    rgba.parse(fallback)
+                rgb.append((rgba.red, rgba.green, rgba.blue))
+
+            self.colors[color] = tuple(rgb)
+
+        return self.colors[color]
+
+    def render(self, item, font, scale):
+        size = PREVIEW_SIZE
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size * scale, size * scale)
+        surface.set_device_scale(scale, scale)
+        cr = cairo.Context(surface)
+
+        (main_color, title_color) = self.get_colors(item.info.get('color', 'yellow'))
+        font_description = Pango.FontDescription.from_string(font)
+
+        cr.set_source_rgb(*main_color)
+        cr.paint()
+
+        title_layout = PangoCairo.create_layout(cr)
+        title_layout.set_font_description(font_description)
+        title_layout.set_text(item.title, -1)
+        title_layout.set_width((size - 2 * TITLE_PADDING) * Pango.SCALE)
+        title_layout.set_ellipsize(Pango.EllipsizeMode.END)
+        title_layout.set_alignment(Pango.Alignment.CENTER)
+        title_height = title_layout.get_pixel_size()[1] + 2 * TITLE_PADDING
+
+        cr.set_source_rgb(*title_color)
+        cr.rectangle(0, 0, size, title_height)
+        cr.fill()
+
+        cr.set_source_rgb(*TEXT_COLOR)
+        cr.move_to(TITLE_PADDING, TITLE_PADDING)
+        PangoCairo.show_layout(cr, title_layout)
+
+        text_layout = PangoCairo.create_layout(cr)
+        text_layout.set_font_description(font_description)
+        text_layout.set_markup(snippet_markup(item.snippet, item.match), -1)
+        text_layout.set_width((size - 2 * TEXT_PADDING) * Pango.SCALE)
+        text_layout.set_height((size - title_height - 2 * TEXT_PADDING) * Pango.SCALE)
+        text_layout.set_wrap(Pango.WrapMode.WORD_CHAR)
+        text_layout.set_ellipsize(Pango.EllipsizeMode.END)
+
+        cr.move_to(TEXT_PADDING, title_height + TEXT_PADDING)
+        PangoCairo.show_layout(cr, text_layout)
+
+        surface.flush()
+        return surface
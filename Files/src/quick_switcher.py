@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""
+Quick Switcher - Ctrl+P popup for jumping to any note by title, ID tag or Note File
+"""
+
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('Gdk', '3.0')
+from gi.repository import Gtk, Gdk, Pango
+
+QUICK_SWITCHER_LIMIT = 20
+
+
+class QuickSwitcher(Gtk.Window):
+    """Small undecorated popup with a search entry and a list of fuzzy matches"""
+
+    def __init__(self, parent, index, on_activate):
+        super().__init__(title="Quick Switcher")
+        self.index = index
+        self.on_activate = on_activate
+
+        self.set_transient_for(parent)
+        self.set_modal(True)
+        self.set_decorated(False)
+        self.set_position(Gtk.WindowPosition.CENTER_ON_PARENT)
+        self.set_default_size(500, -1)
+        self.set_skip_taskbar_hint(True)
+
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        vbox.set_margin_start(6)
+        vbox.set_margin_end(6)
+        vbox.set_margin_top(6)
+        vbox.set_margin_bottom(6)
+        self.add(vbox)
+
+        self.entry = Gtk.SearchEntry()
+        self.entry.set_placeholder_text("Go to note or Note File...")
+        self.entry.connect("changed", self.on_changed)
+        self.entry.connect("activate", self.on_entry_activate)
+        vbox.pack_start(self.entry, False, False, 0)
+
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scroll.set_min_content_height(300)
+        vbox.pack_start(scroll, True, True, 0)
+
+        self.listbox = Gtk.ListBox()
+        self.listbox.set_selection_mode(Gtk.SelectionMode.BROWSE)
+        self.listbox.set_activate_on_single_click(True)
+        self.listbox.connect("row-activated", self.on_row_activated)
+        scroll.add(self.listbox)
+
+        self.connect("key-press-event", self.on_key_press)
+        self.connect("focus-out-event", lambda *args: self.destroy())
+
+        self.show_all()
+        self.entry.grab_focus()
+
+    def on_changed(self, entry):
+        """Matching is fast enough to run on every keystroke"""
+        for child in self.listbox.get_children():
+            self.listbox.remove(child)
+
+        for score, key, value in self.index.search(entry.get_text(), QUICK_SWITCHER_LIMIT):
+            row = self._build_row(key, value)
+            row.show_all()
+            self.listbox.add(row)
+
+        first_row = self.listbox.get_row_at_index(0)
+        if first_row is not None:
+            self.listbox.select_row(first_row)
+
+    def _build_row(self, key, value):
+        """One line per result: ID tag, title and the Note File it lives in"""
+        row = Gtk.ListBoxRow()
+        row.key = key
+
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        hbox.set_margin_start(8)
+        hbox.set_margin_end(8)
+        hbox.set_margin_top(4)
+        hbox.set_margin_bottom(4)
+        row.add(hbox)
+
+        (kind, name) = key
+        if kind == 'file':
+            label = Gtk.Label(label=f"📁 {name}")
+            label.set_xalign(0)
+            hbox.pack_start(label, True, True, 0)
+            return row
+
+        (id_tag, title, file_name) = value
+        if id_tag:
+            tag_label = Gtk.Label(label=f"[{id_tag}]")
+            tag_label.override_font(Pango.FontDescription("Sans Bold 10"))
+            hbox.pack_start(tag_label, False, False, 0)
+
+        title_label = Gtk.Label(label=title or "(Untitled)")
+        title_label.set_xalign(0)
+        title_label.set_ellipsize(Pango.EllipsizeMode.END)
+        hbox.pack_start(title_label, True, True, 0)
+
+        file_label = Gtk.Label(label=file_name or "")
+        file_label.get_style_context().add_class("dim-label")
+        hbox.pack_end(file_label, False, False, 0)
+        return row
+
+    def on_key_press(self, widget, event):
+        """Escape closes, Up/Down move the selection while typing"""
+        if event.keyval == Gdk.KEY_Escape:
+            self.destroy()
+            return True
+
+        if event.keyval in (Gdk.KEY_Up, Gdk.KEY_Down):
+            rows = self.listbox.get_children()
+            if not rows:
+                return True
+
+            selected = self.listbox.get_selected_row()
+            index = selected.get_index() if selected is not None else -1
+            index += 1 if event.keyval == Gdk.KEY_Down else -1
+            index = max(0, min(index, len(rows) - 1))
+            self.listbox.select_row(rows[index])
+            rows[index].grab_focus()
+            self.entry.grab_focus_without_selecting()
+            return True
+
+        return False
+
+    def on_entry_activate(self, entry):
+        row = self.listbox.get_selected_row()
+        if row is not None:
+            self.on_row_activated(self.listbox, row)
+
+    def on_row_activated(self, listbox, row):
+        key = row.key
+        self.destroy()
+        self.on_activate(key)
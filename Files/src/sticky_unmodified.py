@@ -3,6 +3,7 @@
 import json
 import os
 import sys
+import uuid
 
 # Add parent directory (Files/) to path so src. and utils. imports work
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -19,6 +20,7 @@ from gi.repository import Gdk, Gio, GObject, Gspell, Gtk, Pango, XApp
 from xapp.GSettingsWidgets import *
 
 from src.note_buffer import NoteBuffer
+from src.note_colors import COLORS, COLOR_CODES
 from src.manager import NotesManager
 from utils.common import FileHandler, HoverBox, prompt, confirm
 from utils.util import gnote_to_internal_format
@@ -42,14 +44,77 @@ DBUS_INTERFACE_XML = '''
     </method>
     <method name='ReloadNotesFromFile'>
     </method>
+    <method name='GetGroups'>
+      <arg type='as' name='groups' direction='out'/>
+    </method>
+    <method name='ListNotes'>
+      <arg type='s' name='group' direction='in'/>
+      <arg type='aa{sv}' name='notes' direction='out'/>
+    </method>
+    <method name='GetNotes'>
+      <arg type='s' name='group' direction='in'/>
+      <arg type='as' name='ids' direction='in'/>
+      <arg type='aa{sv}' name='notes' direction='out'/>
+    </method>
+    <method name='CreateNotes'>
+      <arg type='s' name='group' direction='in'/>
+      <arg type='aa{sv}' name='notes' direction='in'/>
+      <arg type='as' name='ids' direction='out'/>
+    </method>
+    <method name='UpdateNotes'>
+      <arg type='s' name='group' direction='in'/>
+      <arg type='aa{sv}' name='notes' direction='in'/>
+      <arg type='as' name='ids' direction='out'/>
+    </method>
+    <method name='DeleteNotes'>
+      <arg type='s' name='group' direction='in'/>
+      <arg type='as' name='ids' direction='in'/>
+      <arg type='as' name='ids' direction='out'/>
+    </method>
     <signal name='NotesChanged'>
+      <arg type='a(sssas)' name='changes'/>
     </signal>
   </interface>
 </node>
 '''
 
+DBUS_ERROR_INVALID_GROUP = 'org.x.sticky.Error.InvalidGroup'
+
 UPDATE_DELAY = 1
 
+NOTE_TEXT_FIELDS = ('id', 'color', 'title', 'text')
+
+def note_info_to_variant(info):
+    # note info as a{sv}; values of types D-Bus has no direct match for are sent as JSON text
+    values = {}
+    for (key, value) in info.items():
+        if isinstance(value, bool):
+            values[key] = GLib.Variant('b', value)
+        elif isinstance(value, int):
+            values[key] = GLib.Variant('x', value)
+        elif isinstance(value, float):
+            values[key] = GLib.Variant('d', value)
+        elif isinstance(value, str):
+            values[key] = GLib.Variant('s', value)
+        elif value is not None:
+            values[key] = GLib.Variant('s', json.dumps(value))
+
+    return values
+
+def note_info_from_variant(values):
+    # the reverse of note_info_to_variant: a string holding a JSON array or object is decoded, except in the fields
+    # that are always text, so clients can send back what they were given
+    info = {}
+    for (key, value) in values.items():
+        if isinstance(value, str) and key not in NOTE_TEXT_FIELDS and value[:1] in ('[', '{'):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        info[key] = value
+
+    return info
+
 FONT_SCALES = [
     ('small', _("Small Text"), 'small'),
     ('normal', _("Normal Text"), 'medium'),
@@ -57,34 +122,6 @@ FONT_SCALES = [
     ('larger', _("Larger Text"), 'x-large')
 ]
 
-COLORS = {
-    'red': _("Red"),
-    'green': _("Green"),
-    'blue': _("Blue"),
-    'yellow': _("Yellow"),
-    'purple': _("Purple"),
-    'teal': _("Teal"),
-    'orange': _("Orange"),
-    'magenta': _("Magenta"),
-    'white': _("White"),
-    'grey': _("Grey"),
-    'black': _("Black")
-}
-
-COLOR_CODES = {
-    'red': "#ff5561",
-    'green': "#67ff67",
-    'blue': "#3d9bff",
-    'yellow': "#f6f907",
-    'purple': "#a553ff",
-    'teal': "#41ffed",
-    'orange': "#ffa939",
-    'magenta': "#ff7ff7",
-    'white': "#f0f0f0",
-    'grey': "#a9a9a9",
-    'black': "#bbbbbb"  # Light grey titlebar for icon visibility
-}
-
 SHORTCUTS = {
     _("Operations"): [
         (_("Move selection up"), '<ctrl><shift>Up'),
@@ -128,14 +165,21 @@ class Note(Gtk.Window):
     def removed(self):
         pass
 
-    def __init__(self, app, parent, info={}):
+    def __init__(self, app, parent, info={}, visible=True):
         self.app = app
 
         self.showing = False
         self.is_pinned = False
+        # menus are only built the first time the note is focused or one of its menu buttons is pressed; most notes
+        # never open a menu
+        self.pending_menus = []
         self.changed_timer_id = 0
         self.invalid_cache = False
+        # set whenever the note's info may have changed since the app last saved it; notes that were never saved
+        # (no id yet) start out dirty
+        self.dirty = not info.get('id')
 
+        self.id = info.get('id') or str(uuid.uuid4())
         self.x = info.get('x', 0)
         self.y = info.get('y', 0)
         self.height = info.get('height', self.app.settings.get_uint('default-height'))
@@ -217,18 +261,7 @@ class Note(Gtk.Window):
         add_button.set_size_request(24, 24)
         add_button.set_tooltip_text(_("Add Note"))
         
-        # Create add menu with duplicate and new options
-        add_menu = Gtk.Menu()
-        
-        duplicate_item = Gtk.MenuItem(label=_("Duplicate Note"), visible=True)
-        duplicate_item.connect('activate', lambda w: self.duplicate())
-        add_menu.append(duplicate_item)
-        
-        new_item = Gtk.MenuItem(label=_("New Note"), visible=True)
-        new_item.connect('activate', lambda w: self.app.new_note(w, self))
-        add_menu.append(new_item)
-        
-        add_button.set_popup(add_menu)
+        self.add_lazy_menu(lambda: add_button.set_popup(self.create_add_menu()), add_button)
         self.title_bar.pack_end(add_button, False, False, 5)
 
         text_icon = Gtk.Image.new_from_file(os.path.join(icon_dir, 'Text editing.png')) if os.path.exists(os.path.join(icon_dir, 'Text editing.png')) else Gtk.Image.new_from_icon_name('sticky-text', Gtk.IconSize.BUTTON)
@@ -239,15 +272,39 @@ class Note(Gtk.Window):
 
         self.set_titlebar(self.title_bar)
 
-        # buffer
+        self.create_editor()
+
+        scroll = Gtk.ScrolledWindow()
+        self.add(scroll)
+        scroll.add(self.view)
+
+        self.app.settings.connect('changed::font', self.set_font)
+        self.set_font()
+
+        self.add_lazy_menu(lambda: self.create_format_menu(color_button, text_button), color_button, text_button)
+        self.menu_focus_id = self.connect('focus-in-event', self.on_first_focus)
+
+        self.connect('configure-event', self.on_size_position_changed)
+        self.connect('show', self.on_show)
+        self.connect('window-state-event', self.update_window_state)
+
+        self.move(self.x, self.y)
+
+        if visible:
+            self.show_all()
+        else:
+            # built ahead of time (see note_pool.py): the contents are ready but the window isn't mapped yet
+            self.get_child().show_all()
+            self.title_bar.show_all()
+
+    def create_editor(self):
+        # build self.view and self.buffer holding the note's text and connect self.changed_id; subclasses that edit
+        # something other than rich text (code notes) build their own editor here instead
         self.buffer = NoteBuffer()
 
-        # text view
         self.view = Gtk.TextView(wrap_mode=Gtk.WrapMode.WORD_CHAR, populate_all=True, buffer=self.buffer)
         self.buffer.set_view(self.view)
-        spell_checker = Gspell.TextView.get_from_gtk_text_view(self.view)
-        spell_checker.basic_setup()
-        self.app.settings.bind('inline-spell-check', spell_checker, 'inline-spell-checking', Gio.SettingsBindFlags.GET)
+        self.spell_focus_id = self.view.connect('focus-in-event', self.setup_spell_checker)
         self.view.set_left_margin(10)
         self.view.set_right_margin(10)
         self.view.set_top_margin(10)
@@ -256,25 +313,38 @@ class Note(Gtk.Window):
         self.view.connect('key-press-event', self.on_key_press)
         self.view_style_manager = XApp.StyleManager(widget=self.view)
 
-        scroll = Gtk.ScrolledWindow()
-        self.add(scroll)
-        scroll.add(self.view)
-
         self.buffer.set_from_internal_markup(self.cached_text)
         self.changed_id = self.buffer.connect('content-changed', self.queue_update, True)
 
-        self.app.settings.connect('changed::font', self.set_font)
-        self.set_font()
+    def get_text(self):
+        # the note text as it is saved, in the internal markup format
+        return self.buffer.get_internal_markup()
 
-        self.create_format_menu(color_button, text_button)
+    def add_lazy_menu(self, build, *buttons):
+        # build sets the popup of the buttons; it runs the first time any of them is pressed or the note is focused
+        self.pending_menus.append(build)
+        for button in buttons:
+            button.connect('button-press-event', self.build_menus)
 
-        self.connect('configure-event', self.on_size_position_changed)
-        self.connect('show', self.on_show)
-        self.connect('window-state-event', self.update_window_state)
+    def build_menus(self, *args):
+        while self.pending_menus:
+            self.pending_menus.pop(0)()
 
-        self.move(self.x, self.y)
+        return False
 
-        self.show_all()
+    def on_first_focus(self, *args):
+        self.disconnect(self.menu_focus_id)
+        GLib.idle_add(self.build_menus)
+        return False
+
+    def setup_spell_checker(self, view, event):
+        # Gspell loads its dictionaries per view, so only views that are actually typed in get a checker
+        if view.handler_is_connected(self.spell_focus_id):
+            view.disconnect(self.spell_focus_id)
+        spell_checker = Gspell.TextView.get_from_gtk_text_view(view)
+        spell_checker.basic_setup()
+        self.app.settings.bind('inline-spell-check', spell_checker, 'inline-spell-checking', Gio.SettingsBindFlags.GET)
+        return False
 
     def test(self, *args):
         self.buffer.test()
@@ -399,7 +469,9 @@ class Note(Gtk.Window):
         self.move(self.x, self.y)
 
     def queue_update(self, b=None, invalidate_cache=False):
-        self.invalid_cache = invalidate_cache
+        # a position change right after an edit must not cancel the pending text refresh
+        self.invalid_cache = self.invalid_cache or invalidate_cache
+        self.dirty = True
 
         if self.changed_timer_id:
             GLib.source_remove(self.changed_timer_id)
@@ -413,11 +485,12 @@ class Note(Gtk.Window):
 
     def get_info(self):
         if self.invalid_cache:
-            self.cached_text = self.buffer.get_internal_markup()
+            self.cached_text = self.get_text()
             self.invalid_cache = False
 
         (width, height) = self.get_size()
         info = {
+            'id': self.id,
             'x': self.x,
             'y': self.y,
             'height': self.height,
@@ -429,6 +502,46 @@ class Note(Gtk.Window):
 
         return info
 
+    def apply_info(self, info):
+        # bring an existing window in line with info that changed elsewhere (manager, import, restore) without
+        # rebuilding it; only the parts that actually differ are touched
+        if (info.get('x', self.x), info.get('y', self.y)) != (self.x, self.y):
+            self.x = info.get('x', self.x)
+            self.y = info.get('y', self.y)
+            self.move(self.x, self.y)
+
+        if (info.get('width', self.width), info.get('height', self.height)) != (self.width, self.height):
+            self.width = info.get('width', self.width)
+            self.height = info.get('height', self.height)
+            self.resize(self.width, self.height)
+
+        color = info.get('color', self.color)
+        if color != self.color:
+            self.get_style_context().remove_class(self.color)
+            self.get_style_context().add_class(color)
+            self.color = color
+
+        # a title that is being edited is left alone
+        title = info.get('title', '')
+        if isinstance(self.title, Gtk.Label) and title != self.title.get_text():
+            self.title.set_text(title)
+
+        text = info.get('text', '')
+        if self.invalid_cache or text != self.cached_text:
+            self.load_text(text)
+            self.cached_text = text
+            self.invalid_cache = False
+
+        # the window now matches what is saved, unless an edit is still waiting to be saved
+        if not self.changed_timer_id:
+            self.dirty = False
+
+    def load_text(self, text):
+        # replace the contents of the buffer without it counting as an edit
+        self.buffer.handler_block(self.changed_id)
+        self.buffer.set_from_internal_markup(text)
+        self.buffer.handler_unblock(self.changed_id)
+
     def add_context_menu_items(self, popup, is_title=False):
         if not is_title:
             popup.append(Gtk.SeparatorMenuItem(visible=True))
@@ -480,6 +593,20 @@ class Note(Gtk.Window):
             pin_menu_item.connect('activate', on_activate)
             popup.append(pin_menu_item)
 
+    def create_add_menu(self):
+        # add menu with duplicate and new options
+        add_menu = Gtk.Menu()
+
+        duplicate_item = Gtk.MenuItem(label=_("Duplicate Note"), visible=True)
+        duplicate_item.connect('activate', lambda w: self.duplicate())
+        add_menu.append(duplicate_item)
+
+        new_item = Gtk.MenuItem(label=_("New Note"), visible=True)
+        new_item.connect('activate', lambda w: self.app.new_note(w, self))
+        add_menu.append(new_item)
+
+        return add_menu
+
     def create_format_menu(self, color_button, text_button):
 
         menu = Gtk.Menu()
@@ -557,6 +684,7 @@ class Note(Gtk.Window):
         self.get_style_context().remove_class(self.color)
         self.get_style_context().add_class(color)
         self.color = color
+        self.dirty = True
 
         self.emit('update')
 
@@ -621,6 +749,7 @@ class Note(Gtk.Window):
         self.title_hover.enable()
 
         if save:
+            self.dirty = True
             self.emit('update')
 
         return Gdk.EVENT_STOP
@@ -708,7 +837,7 @@ class Application(Gtk.Application):
 
         self.status_icon = None
         self.has_activated = False
-        self.notes = []
+        self.notes = {}  # note id -> Note window, in group order
         self.settings_window = None
         self.keyboard_shortcuts = None
         # There's no use creating the manager if a user is never going to use it, so we don't until it's asked for.
@@ -769,7 +898,7 @@ class Application(Gtk.Application):
 
     def do_activate(self):
         if self.has_activated:
-            for note in self.notes:
+            for note in self.notes.values():
                 note.restore()
             self.open_manager()
             return
@@ -863,6 +992,85 @@ class Application(Gtk.Application):
         elif method_name == 'ReloadNotesFromFile':
             self.reload_notes_from_file()
 
+        elif method_name in ('GetGroups', 'ListNotes', 'GetNotes', 'CreateNotes', 'UpdateNotes', 'DeleteNotes'):
+            self.dbus_batch_method(method_name, params.unpack(), invocation)
+            return
+
+        invocation.return_value(None)
+
+    def dbus_batch_method(self, method_name, args, invocation):
+        # the batch methods work on any group, not just the visible one, so a panel applet or script can read or
+        # change many notes with one call. An empty group name means the visible group.
+        if method_name == 'GetGroups':
+            invocation.return_value(GLib.Variant('(as)', (self.file_handler.get_note_group_names(),)))
+            return
+
+        group_name = args[0] or self.note_group
+        new_group = group_name not in self.file_handler.get_note_group_names()
+        if new_group:
+            if method_name != 'CreateNotes':
+                invocation.return_dbus_error(DBUS_ERROR_INVALID_GROUP, "No group named '%s'" % group_name)
+                return
+            self.file_handler.add_group(group_name)
+
+        notes = self.file_handler.get_note_list(group_name)
+
+        if method_name == 'ListNotes':
+            result = GLib.Variant('(aa{sv})', ([note_info_to_variant(note_info) for note_info in notes],))
+
+        elif method_name == 'GetNotes':
+            wanted = set(args[1])
+            result = GLib.Variant('(aa{sv})', ([note_info_to_variant(note_info) for note_info in notes
+                                                if note_info.get('id') in wanted],))
+
+        elif method_name == 'CreateNotes':
+            changed = self.batch_new_notes(group_name, [note_info_from_variant(info) for info in args[1]])
+            self.file_handler.apply_changes(group_name, changed)
+            if new_group:
+                # so the manager and the group menus pick up the new group
+                self.file_handler.emit('lists-changed')
+            result = GLib.Variant('(as)', (list(changed.keys()),))
+
+        elif method_name == 'UpdateNotes':
+            # only the fields given change; the other fields of the note stay as they are
+            existing = {note_info.get('id'): note_info for note_info in notes}
+            changed = {}
+            for update in args[1]:
+                update = note_info_from_variant(update)
+                note_id = update.get('id')
+                if note_id in existing:
+                    changed[note_id] = dict(existing[note_id], **update)
+            self.file_handler.apply_changes(group_name, changed)
+            result = GLib.Variant('(as)', (list(changed.keys()),))
+
+        else:
+            existing = {note_info.get('id') for note_info in notes}
+            removed = [note_id for note_id in args[1] if note_id in existing]
+            self.file_handler.apply_changes(group_name, {}, removed)
+            result = GLib.Variant('(as)', (removed,))
+
+        invocation.return_value(result)
+
+    def batch_new_notes(self, group_name, new_notes):
+        # notes without a position are laid out the way new notes are, each one clear of the others
+        (x, y, direction) = self.get_direction()
+        taken = {(note_info.get('x'), note_info.get('y')) for note_info in self.file_handler.get_note_list(group_name)}
+
+        changed = {}
+        for info in new_notes:
+            info = dict(info)
+            info['id'] = str(uuid.uuid4())
+            info.setdefault('text', '')
+            if 'x' not in info or 'y' not in info:
+                while (x, y) in taken:
+                    x += 20 * direction[0]
+                    y += 60 * direction[1]
+                (info['x'], info['y']) = (x, y)
+            taken.add((info['x'], info['y']))
+            changed[info['id']] = info
+
+        return changed
+
     def first_run(self):
         gnote_dir = os.path.join(GLib.get_user_data_dir(), 'gnote')
 
@@ -986,14 +1194,14 @@ class Application(Gtk.Application):
             self.dummy_window.stick()
 
     def activate_notes(self, time):
-        for note in self.notes:
+        for note in self.notes.values():
             if note.is_active():
                 self.hide_notes()
                 return
 
         self.dummy_window.present_with_time(time)
 
-        for note in self.notes:
+        for note in self.notes.values():
             note.restore(time)
 
         if len(self.notes) == 0:
@@ -1003,7 +1211,7 @@ class Application(Gtk.Application):
         self.update_dummy_window()
 
     def hide_notes(self):
-        for note in self.notes:
+        for note in self.notes.values():
             note.hide()
         
         self.notes_hidden = True
@@ -1090,18 +1298,29 @@ class Application(Gtk.Application):
         note.connect('update', self.on_update)
         note.connect('removed', self.on_removed)
 
-        self.notes.append(note)
+        self.notes[note.id] = note
 
         return note
 
     def load_notes(self):
-        for note in self.notes:
-            note.destroy()
+        # reuse the open windows of notes that are still there, matched by id, and only create or destroy the
+        # windows of notes that were added or removed. Edits that are still waiting for the update timer are saved
+        # first, otherwise apply_info would put the text from the file back over them
+        self.on_update()
 
-        self.notes = []
+        existing = self.notes
 
+        self.notes = {}
         for note_info in self.file_handler.get_note_list(self.note_group):
-            self.generate_note(note_info)
+            note = existing.pop(note_info.get('id'), None)
+            if note is None:
+                self.generate_note(note_info)
+            else:
+                note.apply_info(note_info)
+                self.notes[note.id] = note
+
+        for note in existing.values():
+            note.destroy()
 
     def reload_notes_from_file(self):
         self.file_handler.load_notes()
@@ -1109,15 +1328,16 @@ class Application(Gtk.Application):
 
     def duplicate_note(self, new_note):
         new_note_info = new_note.get_info()
+        del new_note_info['id']
         new_note_info['x'] += 50
         new_note_info['y'] += 50
 
         self.add_note(new_note_info)
 
     def focus_note(self, note_info):
-        for note in self.notes:
-            if note.get_info() == note_info:
-                note.present_with_time(0)
+        note = self.notes.get(note_info.get('id'))
+        if note is not None:
+            note.present_with_time(0)
 
     def on_lists_changed(self, *args):
         if not self.note_group in self.file_handler.get_note_group_names():
@@ -1131,15 +1351,29 @@ class Application(Gtk.Application):
 
     def on_group_name_changed(self, f, old_name, new_name):
         if self.note_group == old_name:
+            # the shown notes moved along with the group, and so do their unsaved edits
+            self.note_group = new_name
             self.change_visible_note_group(new_name)
 
         if self.settings.get_string('active-group') == old_name:
             self.settings.set_string('active-group', new_name)
 
     def on_save(self, *args):
-        self.get_dbus_connection().emit_signal(None, DBUS_PATH, APPLICATION_ID, 'NotesChanged', None)
+        # listeners get what changed since the last save, so they only need to fetch those notes (GetNotes)
+        changes = self.file_handler.take_changes()
+        if changes:
+            self.get_dbus_connection().emit_signal(None, DBUS_PATH, APPLICATION_ID, 'NotesChanged',
+                                                   GLib.Variant('(a(sssas))', (changes,)))
 
     def change_visible_note_group(self, group=None):
+        # edits still waiting to be saved belong to the group that is shown now; if that group is gone they go
+        # with it
+        if self.note_group in self.file_handler.get_note_group_names():
+            self.on_update()
+        else:
+            for note in self.notes.values():
+                note.dirty = False
+
         default = self.settings.get_string('active-group')
         if group is None:
             self.note_group = default
@@ -1234,22 +1468,31 @@ class Application(Gtk.Application):
         self.keyboard_shortcuts = None
 
     def on_update(self, *args):
-        info = []
-        for note in self.notes:
-            info.append(note.get_info())
+        # only notes that changed since the last save are serialized; the others keep their info in the file handler
+        changed = {}
+        for note in self.notes.values():
+            if note.dirty:
+                note.dirty = False
+                changed[note.id] = note.get_info()
 
-        self.file_handler.handler_block(self.group_update_id)
-        self.file_handler.update_note_list(info, self.note_group)
-        self.file_handler.handler_unblock(self.group_update_id)
+        self.apply_changes(changed)
 
     def on_removed(self, note):
-        self.notes.remove(note)
-        self.on_update()
+        self.notes.pop(note.id, None)
+        self.apply_changes({}, [note.id])
+
+    def apply_changes(self, changed, removed=()):
+        if not changed and not removed:
+            return
+
+        self.file_handler.handler_block(self.group_update_id)
+        self.file_handler.apply_changes(self.note_group, changed, removed)
+        self.file_handler.handler_unblock(self.group_update_id)
 
     def quit_app(self, *args):
         self.file_handler.flush()
 
-        for note in self.notes:
+        for note in self.notes.values():
             note.destroy()
 
         self.quit()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.facets import FacetIndex, bit_positions, note_type, popcount
+
+NOTES = [
+    # note_id, file_name, color, id_tag, note_type, parent_id
+    ('n1', 'Project', 'red', '1447Z148', 'code', None),
+    ('n2', 'Project', 'red', '1451AB', 'code', 'n1'),
+    ('n3', 'Other', 'red', '1499', 'code', 'n2'),
+    ('n4', 'Project', 'blue', '115ZPQ4', 'text', None),
+    ('n5', 'Other', 'red', '2200', 'code', None),
+    ('n6', 'Project', 'red', '', 'picture', 'n4'),
+]
+
+class TestFacetIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FacetIndex()
+        for row in NOTES:
+            self.index.add(*row)
+
+    def ids(self, **query):
+        return sorted(self.index.note_ids_in(self.index.query(**query)))
+
+    def test_bit_positions(self):
+        self.assertEqual(bit_positions(0), [])
+        self.assertEqual(bit_positions(0b101001), [0, 3, 5])
+        self.assertEqual(popcount(0), 0)
+        self.assertEqual(popcount(0b101001 | 1 << 200), 4)
+
+    def test_note_type(self):
+        self.assertEqual(note_type({'is_code_note': True}), 'code')
+        self.assertEqual(note_type({'is_picture_note': True}), 'picture')
+        self.assertEqual(note_type({}), 'text')
+
+    def test_composed_query(self):
+        self.assertEqual(self.ids(color='red', note_type='code', tag_prefix='14', file='Project'), ['n1', 'n2'])
+        self.assertEqual(self.ids(color='red', note_type='code', tag_prefix='14', file='Project', include_subsets=True),
+                         ['n1', 'n2', 'n3'])
+
+    def test_multiple_values_and_no_filters(self):
+        self.assertEqual(self.ids(color=('red', 'blue'), note_type='text'), ['n4'])
+        self.assertEqual(self.ids(), ['n1', 'n2', 'n3', 'n4', 'n5', 'n6'])
+        self.assertEqual(self.ids(color='green'), [])
+
+    def test_tag_prefix_is_case_insensitive(self):
+        self.assertEqual(self.ids(tag_prefix='115zp'), ['n4'])
+        self.assertEqual(self.ids(tag_prefix='1'), ['n1', 'n2', 'n3', 'n4'])
+
+    def test_parent(self):
+        self.assertEqual(self.ids(parent='n1'), ['n2'])
+        self.assertEqual(self.ids(parent='n1', include_subsets=True), ['n2', 'n3'])
+
+    def test_counts_ignore_own_facet(self):
+        counts = self.index.counts('color', note_type='code', file='Project')
+        self.assertEqual(counts, {'red': 2})
+        self.assertEqual(self.index.counts('type', color='red'), {'code': 4, 'picture': 1})
+        self.assertEqual(self.index.counts('file', color='red', file='Other'), {'Project': 3, 'Other': 2})
+
+    def test_update_and_remove(self):
+        self.index.add('n1', 'Other', 'blue', '9999', 'text', None)
+        self.assertEqual(self.ids(tag_prefix='1447'), [])
+        self.assertEqual(self.ids(color='blue', file='Other'), ['n1'])
+
+        self.assertTrue(self.index.remove('n2'))
+        self.assertFalse(self.index.remove('n2'))
+        self.assertEqual(self.ids(tag_prefix='14'), ['n3'])
+        self.assertEqual(self.ids(parent='n1'), [])
+        self.assertNotIn('code', self.index.counts('type', file='Project'))
+
+    def test_load_matches_incremental_adds(self):
+        loaded = FacetIndex()
+        loaded.load(NOTES)
+
+        self.assertEqual(loaded.bitmaps, self.index.bitmaps)
+        self.assertEqual(loaded.tags, self.index.tags)
+        self.assertEqual(loaded.children, self.index.children)
+        self.assertEqual(loaded.all_notes, self.index.all_notes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.note_store import NoteStore
+
+class TestNoteStore(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.saved = []
+        self.removed = []
+        self.store = NoteStore(self.data_dir, on_note_saved=self.saved.append, on_note_removed=self.removed.append)
+        self.store.load()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def reopen(self):
+        store = NoteStore(self.data_dir)
+        store.load()
+        return store
+
+    def test_save_before_load_writes_nothing(self):
+        store = NoteStore(self.data_dir)
+        store.save()
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, 'notebook.json')))
+
+    def test_files_round_trip(self):
+        self.assertTrue(self.store.create_file('Project'))
+        self.assertFalse(self.store.create_file('Project'))
+        self.assertFalse(self.store.create_file(''))
+        note_id = self.store.save_note({'title': 'First', 'text': 'hello'}, 'Project')
+
+        store = self.reopen()
+        self.assertEqual(store.file_counts(), [('Project', 1)])
+        self.assertEqual(store.load_note(note_id)['title'], 'First')
+        self.assertEqual(store.find_file(note_id), 'Project')
+        self.assertEqual(store.file_metadata('Project')['number_config'], {})
+
+    def test_old_format(self):
+        with open(os.path.join(self.data_dir, 'notebook.json'), 'w') as f:
+            json.dump({'note_files': {'Old': ['a', 'b'], 'New': {'notes': ['c']}}}, f)
+
+        store = self.reopen()
+        self.assertEqual(store.note_files, {'Old': ['a', 'b'], 'New': ['c']})
+        self.assertEqual(store.file_metadata('Old')['description'], '')
+
+    def test_picture_notes_keep_their_file_name(self):
+        note_id = self.store.save_note({'title': 'Photo', 'is_picture_note': True}, 'Pictures')
+        self.assertEqual(os.path.basename(self.store.note_path(note_id)), f"{note_id}.json")
+
+        note_data = self.store.load_note(note_id)
+        note_data['color'] = 'blue'
+        self.store.save_note(note_data)
+        self.assertEqual(sorted(os.listdir(self.data_dir)), sorted(['notebook.json', f"{note_id}.json"]))
+
+    def test_hooks(self):
+        note_id = self.store.save_note({'title': 'x'}, 'Project')
+        self.assertEqual([note_data['id'] for note_data in self.saved], [note_id])
+
+        self.store.delete_note(note_id)
+        self.assertEqual(self.removed, [note_id])
+        self.assertIsNone(self.store.note_path(note_id))
+        self.assertEqual(self.store.notes_in('Project'), [])
+
+    def test_reorder(self):
+        ids = [self.store.save_note({'title': str(i)}, 'Project') for i in range(4)]
+
+        self.assertTrue(self.store.move_note('Project', ids[1], -1))
+        self.assertFalse(self.store.move_note('Project', ids[1], -1))
+        self.assertEqual(self.store.notes_in('Project'), [ids[1], ids[0], ids[2], ids[3]])
+
+        self.assertTrue(self.store.move_before('Project', ids[3], ids[0]))
+        self.assertEqual(self.store.notes_in('Project'), [ids[1], ids[3], ids[0], ids[2]])
+        self.assertEqual(self.store.can_move('Project', ids[1]), (False, True))
+        self.assertEqual(self.reopen().notes_in('Project'), [ids[1], ids[3], ids[0], ids[2]])
+
+    def test_hierarchy(self):
+        parent = self.store.save_note({'title': 'parent'}, 'Project')
+        other = self.store.save_note({'title': 'other'}, 'Project')
+        child = self.store.save_note({'title': 'child', 'parent_id': parent}, 'Project')
+        grandchild = self.store.save_note({'title': 'grandchild', 'parent_id': child}, 'Project')
+        orphan = self.store.save_note({'title': 'orphan', 'parent_id': 'gone'}, 'Project')
+
+        notes = {}
+        hierarchy = self.store.hierarchy(self.store.notes_in('Project') + ['missing'], notes)
+        self.assertEqual(hierarchy, [(parent, 0), (child, 1), (grandchild, 2), (other, 0), (orphan, 0)])
+        self.assertEqual(notes[child]['title'], 'child')
+
+    def test_delete_file_keeps_notes(self):
+        note_id = self.store.save_note({'title': 'x'}, 'Project')
+        self.assertEqual(self.store.delete_file('Project'), [note_id])
+        self.assertEqual(self.store.file_names(), [])
+        self.assertIsNotNone(self.store.load_note(note_id))
+
+    def test_tag_notes_and_index_entries(self):
+        first = self.store.save_note({'title': 'a', 'id_tag': 1447}, 'Project')
+        self.store.save_note({'title': 'b', 'id_tag': 1447}, 'Project')
+        self.store.save_note({'title': 'c'}, 'Project')
+
+        self.assertEqual(list(self.store.tag_notes('Project')), ['1447'])
+        self.assertEqual(self.store.tag_notes('Project')['1447']['id'], first)
+        self.assertEqual(len(self.store.index_entries()), 3)
+        self.assertEqual(self.store.positions()[first], ('Project', 0))
+
+    def test_save_keeps_changes_from_other_processes(self):
+        # self.store plays the long-running Note Book window, other a command line run against the same directory
+        kept = self.store.save_note({'title': 'kept'}, 'Project')
+        dropped = self.store.save_note({'title': 'dropped'}, 'Project')
+        self.store.set_file_metadata('Project', dict(self.store.file_metadata('Project'), description='mine'))
+
+        other = self.reopen()
+        work_note = other.save_note({'title': 'x'}, 'Work')
+        other.move_to_file(dropped, 'Work')
+        other.set_file_metadata('Project', dict(other.file_metadata('Project'), description='theirs'))
+        other.preferences['sort'] = 'title'
+        other.save()
+
+        mine = self.store.save_note({'title': 'mine'}, 'Project')
+        self.store.create_file('Mine')
+
+        store = self.reopen()
+        self.assertEqual(store.notes_in('Work'), [work_note, dropped])
+        self.assertEqual(store.notes_in('Project'), [kept, mine])
+        self.assertEqual(store.file_names(), ['Mine', 'Project', 'Work'])
+        # changed there after this store last saved it
+        self.assertEqual(store.file_metadata('Project')['description'], 'theirs')
+        self.assertEqual(store.preferences, {'sort': 'title'})
+        self.assertEqual(self.store.notes_in('Work'), [work_note, dropped])
+
+    def test_other_process_removing_a_file(self):
+        self.store.save_note({'title': 'x'}, 'Old')
+        self.store.create_file('Kept')
+
+        other = self.reopen()
+        other.delete_file('Old')
+
+        self.store.create_file('New')
+        self.assertEqual(self.reopen().file_names(), ['Kept', 'New'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import notebook_cli
+from utils.note_store import NoteStore
+
+FILES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+class TestNotebookCli(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def run_cli(self, *args):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = notebook_cli.main(['--data-dir', self.data_dir] + list(args))
+        return (status, output.getvalue())
+
+    def store(self):
+        store = NoteStore(self.data_dir)
+        store.load()
+        return store
+
+    def test_create_and_list(self):
+        (status, output) = self.run_cli('create', 'Project', '--title', 'Hello', '--text', 'a #1 thing', '--tag', '1447')
+        self.assertEqual(status, 0)
+        parent_id = output.strip()
+        self.run_cli('create', 'Project', '--title', 'Child', '--parent', '1447', '--code', 'python', '--text', 'x = 1')
+
+        self.assertEqual(self.run_cli('list')[1], "     2  Project\n")
+        lines = self.run_cli('list', 'Project')[1].splitlines()
+        self.assertEqual(lines[0], f"{parent_id}\t[1447] Hello")
+        self.assertTrue(lines[1].endswith("\t  Child"))
+
+        # a literal '#' survives the round trip through the sticky markup
+        self.assertTrue(self.run_cli('show', '1447')[1].endswith("a #1 thing\n"))
+        child = self.store().load_note(self.store().notes_in('Project')[1])
+        self.assertEqual((child['parent_id'], child['language'], child['text']), (parent_id, 'python', 'x = 1'))
+
+    def test_create_from_json(self):
+        templates = os.path.join(self.data_dir, 'templates.json')
+        with open(templates, 'w') as f:
+            json.dump([{'title': 'One', 'id_tag': 'A1'}, {'title': 'Two', 'id_tag': 'B1'}], f)
+
+        self.run_cli('create', 'Project', '--json', templates)
+        self.assertEqual(len(self.store().notes_in('Project')), 2)
+        self.assertIn('[A1] One', self.run_cli('list', '--tag', 'a')[1])
+        self.assertNotIn('Two', self.run_cli('list', '--tag', 'a')[1])
+
+    def test_create_from_bad_json(self):
+        templates = os.path.join(self.data_dir, 'templates.json')
+        with open(templates, 'w') as f:
+            json.dump([{'title': 'Empty', 'text': None}], f)
+        self.assertEqual(self.run_cli('create', 'Project', '--json', templates)[0], 0)
+        self.assertEqual(self.store().load_note(self.store().notes_in('Project')[0])['text'], '')
+
+        for bad in ([{'title': 'ok'}, 'not a note'], 'text'):
+            with open(templates, 'w') as f:
+                json.dump(bad, f)
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(self.run_cli('create', 'Other', '--json', templates)[0], 1)
+        # nothing is created when any template is bad
+        self.assertNotIn('Other', self.store().note_files)
+
+    def test_move_and_tag(self):
+        first = self.run_cli('create', 'Project', '--title', 'First')[1].strip()
+        second = self.run_cli('create', 'Project', '--title', 'Second')[1].strip()
+        self.run_cli('create', 'Other', '--title', 'Third')
+
+        self.run_cli('move', second[:8], 'Project', '--before', first)
+        self.assertEqual(self.store().notes_in('Project'), [second, first])
+
+        self.run_cli('move', first, 'Other')
+        self.assertEqual(self.store().find_file(first), 'Other')
+        self.assertEqual(self.store().load_note(first)['note_file'], 'Other')
+
+        self.run_cli('tag', first, 'Z9')
+        self.assertEqual(self.store().load_note(first)['id_tag'], 'Z9')
+
+    def test_errors(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(self.run_cli('show', 'nothing')[0], 1)
+            self.assertEqual(self.run_cli('export', 'Missing')[0], 1)
+
+    def test_export_and_search(self):
+        self.run_cli('create', 'Project', '--title', 'Setup', '--text', 'install the widgets', '--tag', '7')
+        self.run_cli('create', 'Project', '--title', 'Script', '--code', 'sh', '--text', 'make all')
+
+        markdown = self.run_cli('export', 'Project')[1]
+        self.assertTrue(markdown.startswith("# Project\n"))
+        self.assertIn("## [7] Setup\ninstall the widgets\n", markdown)
+        self.assertIn("```sh\nmake all\n```", markdown)
+
+        lines = self.run_cli('export', 'Project', '--format', 'json')[1].splitlines()
+        self.assertEqual(json.loads(lines[0])['note_file'], 'Project')
+        self.assertEqual([json.loads(line)['title'] for line in lines[1:]], ['Setup', 'Script'])
+
+        output = self.run_cli('search', 'widget')[1]
+        self.assertIn('[7] Setup', output)
+        self.assertNotIn('Script', output)
+
+    def test_no_gtk_import(self):
+        # run in a fresh interpreter, other tests may have imported gi into this one
+        code = ("import sys; sys.path.insert(0, %r); from src import notebook_cli; "
+                "notebook_cli.main(['--data-dir', %r, 'list']); assert 'gi' not in sys.modules") % (FILES_DIR, self.data_dir)
+        subprocess.run([sys.executable, '-c', code], check=True, capture_output=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.search_index import SearchIndex, build_match_query, snippet_to_markup, MATCH_START, MATCH_END
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex(':memory:')
+        self.index.update_note('n1', 'Project', {
+            'title': 'Gutter color',
+            'text': '#tag:bold:Fix#tag:bold: the gutter ## bug in the red editor',
+            'id_tag': '1447Z148',
+            'description': 'Red code editor'
+        }, 1.0)
+        self.index.update_note('n2', 'Progress', {
+            'title': 'Progress notes',
+            'text': 'import os  # gutter',
+            'is_code_note': True,
+            'language': 'python',
+            'id_tag': '115ZPQ4'
+        }, 1.0)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_title_match_outranks_body_match(self):
+        results = self.index.search('gutter')
+        self.assertEqual([r['note_id'] for r in results], ['n1', 'n2'])
+        self.assertEqual(results[0]['file_name'], 'Project')
+
+    def test_prefix_and_tag_search(self):
+        results = self.index.search('115z')
+        self.assertEqual([r['note_id'] for r in results], ['n2'])
+
+        results = self.index.search('pyth')
+        self.assertEqual([r['note_id'] for r in results], ['n2'])
+
+    def test_markup_is_not_indexed(self):
+        self.assertEqual(self.index.search('tag'), [])
+        results = self.index.search('fix')
+        self.assertIn(MATCH_START + 'Fix' + MATCH_END, results[0]['snippet'])
+
+    def test_update_replaces_previous_content(self):
+        self.index.update_note('n1', 'Project', {'title': 'Renamed', 'text': ''}, 2.0)
+        self.assertEqual([r['note_id'] for r in self.index.search('gutter')], ['n2'])
+        self.assertEqual([r['note_id'] for r in self.index.search('renamed')], ['n1'])
+
+    def test_remove(self):
+        self.assertTrue(self.index.remove_note('n1'))
+        self.assertFalse(self.index.remove_note('n1'))
+        self.assertEqual([r['note_id'] for r in self.index.search('gutter')], ['n2'])
+
+    def test_sync_only_loads_changed_notes(self):
+        loaded = []
+        notes = {'n1': {'title': 'Changed'}, 'n3': {'title': 'New note'}}
+
+        def load_note(note_id):
+            loaded.append(note_id)
+            return notes.get(note_id)
+
+        count = self.index.sync([('n1', 'Project', 5.0), ('n3', 'Project', 1.0)], load_note)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(sorted(loaded), ['n1', 'n3'])
+        self.assertEqual(sorted(self.index.get_state()), ['n1', 'n3'])
+
+        loaded.clear()
+        self.assertEqual(self.index.sync([('n1', 'Project', 5.0), ('n3', 'Project', 1.0)], load_note), 0)
+        self.assertEqual(loaded, [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(build_match_query('a "b" OR'), '"a"* """b"""* "OR"*')
+        self.assertEqual(self.index.search('gutter OR ('), [])
+        self.assertEqual(self.index.search('   '), [])
+
+    def test_facets_and_summaries(self):
+        facets = sorted(self.index.get_facets())
+        self.assertEqual(facets, [
+            ('n1', 'Project', 'yellow', '1447Z148', 'text', None),
+            ('n2', 'Progress', 'yellow', '115ZPQ4', 'code', None),
+        ])
+
+        summaries = self.index.get_summaries(['n2', 'missing', 'n1'])
+        self.assertEqual([s['note_id'] for s in summaries], ['n2', 'n1'])
+        self.assertEqual(summaries[0]['snippet'], 'import os  # gutter')
+
+    def test_search_filters(self):
+        self.index.update_note('n3', 'Other', {'title': 'Gutter child', 'color': 'red', 'parent_id': 'n1'}, 1.0)
+        for number in range(20):
+            self.index.update_note('x%d' % number, 'Project', {'title': 'Gutter gutter', 'color': 'blue'}, 1.0)
+
+        def ids(**filters):
+            return sorted(r['note_id'] for r in self.index.search('gutter', limit=2, filters=filters))
+
+        # better ranked notes that don't pass the filters don't use up the limit
+        self.assertEqual(ids(note_type='code'), ['n2'])
+        self.assertEqual(ids(color='yellow', file='Project'), ['n1'])
+        self.assertEqual(ids(file='Project', tag_prefix='1447', include_subsets=True), ['n1'])
+        self.assertEqual(ids(color='red', file='Project', include_subsets=True), ['n3'])
+        self.assertEqual(ids(parent='n1'), ['n3'])
+        self.assertEqual(ids(tag_prefix='115z'), ['n2'])
+        self.assertEqual(ids(tag_prefix='1_'), [])
+
+    def test_snippet_markup(self):
+        snippet = 'a < b ' + MATCH_START + 'c&d' + MATCH_END
+        self.assertEqual(snippet_to_markup(snippet), 'a &lt; b <b>c&amp;d</b>')
+
+class TestSearchIndexThreads(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.tmp_dir.name, 'search.db'))
+        for i in range(500):
+            self.index.update_note('n%d' % i, 'File', {'title': 'note %d' % i, 'text': 'shared words here'}, 1.0)
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def test_search_from_worker_thread(self):
+        results = []
+        worker = threading.Thread(target=lambda: results.extend(self.index.search('shared', 10)))
+        worker.start()
+        worker.join()
+
+        self.assertEqual(len(results), 10)
+
+    def test_cancelled_search_returns_nothing(self):
+        self.assertEqual(self.index.search('shared', 500, lambda: True), [])
+        self.assertEqual(len(self.index.search('shared', 500, lambda: False)), 500)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import startup_profile
+
+class TestStartupProfile(unittest.TestCase):
+    def setUp(self):
+        startup_profile.spans.clear()
+        startup_profile.recording = True
+
+    def test_spans_nest(self):
+        with startup_profile.span("outer"):
+            with startup_profile.span("inner"):
+                pass
+
+        spans = {name: (start, end, depth) for (name, start, end, depth) in startup_profile.spans}
+        self.assertEqual(spans["outer"][2], 0)
+        self.assertEqual(spans["inner"][2], 1)
+        self.assertLessEqual(spans["outer"][0], spans["inner"][0])
+        self.assertGreaterEqual(spans["outer"][1], spans["inner"][1])
+
+    def test_report_checks_first_paint_budget(self):
+        startup_profile.spans.append(("first paint", 120.0, 120.0, 0))
+        self.assertEqual(startup_profile.get_mark("first paint"), 120.0)
+        self.assertIn("within the 400ms budget", startup_profile.format_report(400))
+        self.assertIn("OVER the 100ms budget", startup_profile.format_report(100))
+
+    def test_report_without_first_paint(self):
+        with startup_profile.span("import Gtk"):
+            pass
+
+        report = startup_profile.format_report()
+        self.assertIn("import Gtk", report)
+        self.assertNotIn("first paint", report)
+
+    def test_stop(self):
+        startup_profile.mark("startup finished")
+        startup_profile.stop()
+        with startup_profile.span("open note"):
+            startup_profile.mark("later")
+
+        self.assertEqual([name for (name, start, end, depth) in startup_profile.spans], ["startup finished"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.trigram_index import TrigramIndex, trigrams, CANDIDATES_PER_RESULT
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex()
+        self.index.add(('note', 'n1'), ('1447Z148', 'Gutter color', 'Project'), 'n1')
+        self.index.add(('note', 'n2'), ('115ZPQ4', 'Progress notes', 'Progress'), 'n2')
+        self.index.add(('note', 'n3'), ('PIC145U8', 'Screenshot of the editor', 'Project'), 'n3')
+        self.index.add(('file', 'Project'), ('', 'Project', ''))
+
+    def keys(self, query, limit=20):
+        return [key for (score, key, value) in self.index.search(query, limit)]
+
+    def test_word_starts_get_short_trigrams(self):
+        self.assertIn('  g', trigrams('gutter color'))
+        self.assertIn(' co', trigrams('gutter color'))
+
+    def test_exact_id_tag_ranks_first(self):
+        self.assertEqual(self.keys('115zpq4')[0], ('note', 'n2'))
+        self.assertEqual(self.keys('PIC145')[0], ('note', 'n3'))
+
+    def test_typo_still_matches(self):
+        self.assertEqual(self.keys('guter colr')[0], ('note', 'n1'))
+        self.assertIn(('note', 'n2'), self.keys('progres notse'))
+
+    def test_short_query_matches_word_prefixes(self):
+        self.assertEqual(set(self.keys('pr')), {('note', 'n1'), ('note', 'n2'), ('note', 'n3'), ('file', 'Project')})
+        self.assertEqual(self.keys('sc'), [('note', 'n3')])
+        self.assertEqual(self.keys('e'), [('note', 'n3')])
+        self.assertEqual(self.keys('  '), [])
+
+    def test_file_entry_outranks_notes_in_it(self):
+        self.assertEqual(self.keys('project')[0], ('file', 'Project'))
+
+    def test_update_and_remove(self):
+        self.index.add(('note', 'n1'), ('1447Z148', 'Renamed', 'Project'), 'n1')
+        self.assertNotIn(('note', 'n1'), self.keys('gutter'))
+        self.assertEqual(self.keys('renamed'), [('note', 'n1')])
+
+        self.assertTrue(self.index.remove(('note', 'n1')))
+        self.assertFalse(self.index.remove(('note', 'n1')))
+        self.assertEqual(self.keys('renamed'), [])
+        self.assertEqual(len(self.index), 3)
+
+        # freed slots are reused
+        self.index.add(('note', 'n4'), ('', 'Another note', ''), 'n4')
+        self.assertEqual(len(self.index.docs), 4)
+        self.assertEqual(self.keys('another'), [('note', 'n4')])
+
+    def test_limit(self):
+        self.assertEqual(len(self.keys('pr', limit=1)), 1)
+
+class TestLargeTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex()
+        for number in range(50000):
+            self.index.add(('note', number), (f"N{number}", f"Draft about arches {number}", f"File {number % 40}"),
+                           number)
+        self.index.add(('file', 'Archive'), ('', 'Archive', ''))
+
+    def test_short_query_scores_a_capped_number_of_candidates(self):
+        scored = []
+        score = self.index._score
+        self.index._score = lambda doc_id, query, overlap: scored.append(doc_id) or score(doc_id, query, overlap)
+
+        results = self.index.search('ar', limit=20)
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(len(scored), 20 * CANDIDATES_PER_RESULT)
+        # a title starting with the query is still found among 50000 notes with a word starting with it
+        self.assertEqual(results[0][1], ('file', 'Archive'))
+
+    def test_short_query_speed(self):
+        start = time.perf_counter()
+        for query in ('a', 'ar', 'd', 'fi', 'n'):
+            self.index.search(query)
+
+        # every note has words starting with these, so scoring them all took around 40 ms per query
+        self.assertLess((time.perf_counter() - start) / 5, 0.01)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+import unittest
+
+# Add the Files directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.util import SNIPPET_ELLIPSIS, clean_text, code_to_markup, find_match, list_diff, make_snippet, markup_to_code, plain_text, preview_text
+
+class TestPlainText(unittest.TestCase):
+    def test_markup_is_stripped(self):
+        text = '#check:1done #bullet:item ##1 #tag:bold:Bold#tag:bold: #x'
+        self.assertEqual(plain_text(text), 'done item #1 Bold #x')
+        self.assertEqual(clean_text(text), 'done item #1 bold #x')
+
+    def test_preview_keeps_checks_and_bullets(self):
+        self.assertEqual(preview_text('#check:0a\n#check:1b\n#bullet:c'), '☐ a\n☑ b\n• c')
+
+class TestCodeConversion(unittest.TestCase):
+    def test_text_to_code(self):
+        self.assertEqual(markup_to_code('#check:1done\n#bullet:item\n#tag:bold:x = 1#tag:bold: ## y'),
+                         '☑ done\n• item\nx = 1 # y')
+
+    def test_code_round_trip(self):
+        code = 'x = 1  # comment\n#!/bin/sh ## #tag'
+        self.assertEqual(code_to_markup(code), 'x = 1  ## comment\n##!/bin/sh #### ##tag')
+        self.assertEqual(plain_text(code_to_markup(code)), code)
+
+class TestMakeSnippet(unittest.TestCase):
+    def test_without_match(self):
+        self.assertEqual(make_snippet('short'), ('short', None))
+        (snippet, match) = make_snippet('x' * 20, length=10)
+        self.assertEqual(snippet, 'x' * 10 + SNIPPET_ELLIPSIS)
+        self.assertIsNone(match)
+
+    def test_match_offsets_point_at_match(self):
+        text = 'word ' * 100 + 'needle ' + 'tail ' * 100
+        start = text.find('needle')
+        (snippet, (match_start, match_end)) = make_snippet(text, (start, start + 6), length=50)
+
+        self.assertEqual(snippet[match_start:match_end], 'needle')
+        self.assertTrue(snippet.startswith(SNIPPET_ELLIPSIS + 'word'))
+        self.assertTrue(snippet.endswith(SNIPPET_ELLIPSIS))
+
+    def test_match_offsets_survive_lowercase_length_changes(self):
+        # 'İ'.lower() is two characters, which used to shift every match after it
+        text = 'İİİ ' * 30 + 'Needle in text'
+        match = find_match(text, 'needle')
+        (snippet, (match_start, match_end)) = make_snippet(text, match, length=50)
+        self.assertEqual(snippet[match_start:match_end], 'Needle')
+        self.assertIsNone(find_match(text, 'missing'))
+        self.assertEqual(find_match('a.b', '.'), (1, 2))
+
+    def test_match_at_start(self):
+        (snippet, match) = make_snippet('needle in text', (0, 6))
+        self.assertEqual(snippet, 'needle in text')
+        self.assertEqual(match, (0, 6))
+
+class TestListDiff(unittest.TestCase):
+    def apply(self, old, new):
+        result = list(old)
+        for (position, removed, start, end) in list_diff(old, new):
+            result[position:position + removed] = new[start:end]
+        return result
+
+    def test_single_edit_is_a_single_splice(self):
+        self.assertEqual(list_diff(['a', 'b', 'c'], ['a', 'b', 'c']), [])
+        self.assertEqual(list_diff(['a', 'b', 'c'], ['a', 'c']), [(1, 1, 1, 1)])
+        self.assertEqual(list_diff(['a', 'b'], ['a', 'b', 'c']), [(2, 0, 2, 3)])
+
+    def test_splices_apply_in_order(self):
+        rng = random.Random(4)
+        for i in range(200):
+            old = rng.sample(range(20), rng.randint(0, 12))
+            new = rng.sample(range(20), rng.randint(0, 12))
+            self.assertEqual(self.apply(old, new), new)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,13 +4,21 @@ import os
 import json
 import time
 import re
+import uuid
 
 from gi.repository import Gio, GLib, GObject, Gtk
 
 CONFIG_DIR = os.path.join(GLib.get_user_config_dir(), 'sticky')
-CONFIG_PATH = os.path.join(CONFIG_DIR, 'notes.json')
+CONFIG_PATH = os.path.join(CONFIG_DIR, 'notes.json')  # single file format used before groups were split up
+GROUPS_DIR = os.path.join(CONFIG_DIR, 'groups')
+MANIFEST_PATH = os.path.join(GROUPS_DIR, 'manifest.json')
+MANIFEST_VERSION = 1
 SAVE_DELAY = 3
 
+def changed_fields(old_info, new_info):
+    # names of the fields that differ between two versions of a note, including ones only one of them has
+    return sorted(key for key in set(old_info) | set(new_info) if old_info.get(key) != new_info.get(key))
+
 backup_file_name = re.compile(r"\Abackup-[0-9]{10,}\.json$", re.IGNORECASE)
 
 class FileHandler(GObject.Object):
@@ -43,9 +51,24 @@ class FileHandler(GObject.Object):
         self.window = window
         self.save_timer_id = 0
         self.backup_timer_id = 0
-        self.notes_lists = {}
 
-        if os.path.exists(CONFIG_PATH):
+        # every group is stored in its own file under GROUPS_DIR, listed in order in the manifest. Only the groups
+        # someone asked for are loaded (notes_lists), and only the ones that changed are written back.
+        self.group_names = []
+        self.group_files = {}
+        self.notes_lists = {}
+        self.note_positions = {}  # group -> {note id: position in its list}, built on first lookup
+        self.dirty_groups = set()
+        self.removed_files = set()
+        self.manifest_dirty = False
+
+        # what changed since the last save, for the NotesChanged D-Bus signal: (group, note id) -> (kind, fields)
+        # with kind 'added', 'changed' or 'removed'. Changes to a whole group use an empty note id and the kinds
+        # 'group-added', 'group-removed', 'group-renamed' (fields holds the new name), 'reordered' and 'reloaded'
+        # (re-read the whole group, or everything when the group is empty too).
+        self.changes = {}
+
+        if os.path.exists(MANIFEST_PATH) or os.path.exists(CONFIG_PATH):
             self.load_notes()
 
         self.settings.connect('changed::automatic-backups', self.check_backup)
@@ -53,24 +76,233 @@ class FileHandler(GObject.Object):
         self.check_backup()
 
     def load_notes(self, *args):
+        if not os.path.exists(MANIFEST_PATH):
+            if os.path.exists(CONFIG_PATH):
+                self.migrate_notes_file()
+            return
+
+        with open(MANIFEST_PATH, 'r') as file:
+            manifest = json.loads(file.read())
+
+        self.group_names = [group['name'] for group in manifest['groups']]
+        self.group_files = {group['name']: group['file'] for group in manifest['groups']}
+        self.notes_lists = {}
+        self.note_positions = {}
+        self.dirty_groups = set()
+        self.manifest_dirty = False
+
+        # the active group is shown right away, the others are loaded when first needed
+        active_group = self.settings.get_string('active-group')
+        if active_group in self.group_files:
+            self.get_note_list(active_group)
+
+    def migrate_notes_file(self):
+        # split the old all-in-one notes.json up into per group files
         with open(CONFIG_PATH, 'r') as file:
             info = json.loads(file.read())
 
-        self.notes_lists = info
+        self.set_all_lists(info)
+        self.save_note_list()
+
+        os.replace(CONFIG_PATH, CONFIG_PATH + '.old')
+
+    def set_all_lists(self, notes_lists):
+        for group_name in self.group_names:
+            if group_name not in notes_lists:
+                self.removed_files.add(self.group_files.pop(group_name))
+
+        self.group_names = list(notes_lists.keys())
+        self.notes_lists = dict(notes_lists)
+        self.note_positions = {}
+        for group_name in self.group_names:
+            if group_name not in self.group_files:
+                self.group_files[group_name] = self.new_group_file()
+
+        self.assign_note_ids()
+        self.dirty_groups = set(self.group_names)
+        self.manifest_dirty = True
+
+        self.changes = {}
+        self.record_change('', '', 'reloaded')
+
+    def new_group_file(self):
+        # group names can contain anything, so files are named independently of them
+        return '%s.json' % uuid.uuid4().hex
+
+    def load_group(self, group_name):
+        path = os.path.join(GROUPS_DIR, self.group_files[group_name])
+        try:
+            with open(path, 'r') as file:
+                notes = json.loads(file.read())
+        except FileNotFoundError:
+            notes = []
+
+        self.notes_lists[group_name] = notes
+        self.note_positions.pop(group_name, None)
+        if self.assign_note_ids():
+            # notes saved before notes had ids
+            self.dirty_groups.add(group_name)
+            self.queue_save()
+
+        return notes
+
+    def assign_note_ids(self):
+        # every note gets a stable id so views can tell an edited note from a new one
+        assigned = False
+        for notes in self.notes_lists.values():
+            for note_info in notes:
+                if not note_info.get('id'):
+                    note_info['id'] = str(uuid.uuid4())
+                    assigned = True
+
+        return assigned
 
     def get_note_list(self, group_name):
-        return self.notes_lists[group_name]
+        if group_name in self.notes_lists:
+            return self.notes_lists[group_name]
+
+        if group_name not in self.group_files:
+            raise KeyError(group_name)
+
+        return self.load_group(group_name)
+
+    def note_position(self, group_name, note_id):
+        # the position of a note in its group's list, or None. The id index is kept up to date by apply_changes and
+        # rebuilt when the list was replaced or edited from outside since it was built.
+        notes = self.get_note_list(group_name)
+        positions = self.note_positions.get(group_name)
+        position = positions.get(note_id) if positions is not None else None
+        if position is None and positions is not None and len(positions) == len(notes):
+            return None
+        if position is None or position >= len(notes) or notes[position].get('id') != note_id:
+            positions = {note_info.get('id'): position for (position, note_info) in enumerate(notes)}
+            self.note_positions[group_name] = positions
+            position = positions.get(note_id)
+
+        return position
 
     def get_note_group_names(self):
-        return list(self.notes_lists.keys())
+        return list(self.group_names)
+
+    def get_all_lists(self):
+        return {group_name: self.get_note_list(group_name) for group_name in self.group_names}
+
+    def add_group(self, group_name):
+        if group_name not in self.group_files:
+            self.group_names.append(group_name)
+            self.group_files[group_name] = self.new_group_file()
+            self.manifest_dirty = True
+            self.record_change(group_name, '', 'group-added')
+
+    def record_change(self, group_name, note_id, kind, fields=()):
+        # fold a change into the ones not yet reported, so a note edited several times between saves shows up once
+        key = (group_name, note_id)
+        (old_kind, old_fields) = self.changes.get(key, (None, ()))
+        fields = set(old_fields) | set(fields)
+
+        if old_kind == 'added' and kind == 'removed':
+            del self.changes[key]
+            return
+        if kind == 'removed':
+            fields = set()
+        elif old_kind == 'added':
+            kind = 'added'
+        elif old_kind == 'removed' and kind == 'added':
+            kind = 'changed'
+
+        self.changes[key] = (kind, fields)
+
+    def record_list_changes(self, group_name, old_list, new_list):
+        old_notes = {note_info.get('id'): note_info for note_info in old_list}
+        new_ids = set()
+        for note_info in new_list:
+            note_id = note_info.get('id')
+            new_ids.add(note_id)
+            if note_id not in old_notes:
+                self.record_change(group_name, note_id, 'added', note_info.keys())
+            else:
+                fields = changed_fields(old_notes[note_id], note_info)
+                if fields:
+                    self.record_change(group_name, note_id, 'changed', fields)
+
+        for note_id in old_notes:
+            if note_id not in new_ids:
+                self.record_change(group_name, note_id, 'removed')
+
+        kept_order = [note_id for note_id in old_notes if note_id in new_ids]
+        if kept_order != [note_info.get('id') for note_info in new_list if note_info.get('id') in old_notes]:
+            self.record_change(group_name, '', 'reordered')
+
+    def take_changes(self):
+        # the changes since the last call as (group, note id, kind, fields) tuples
+        changes = [(group_name, note_id, kind, sorted(fields))
+                   for ((group_name, note_id), (kind, fields)) in self.changes.items()]
+        self.changes = {}
+        return changes
 
     def update_note_list(self, notes_list, group_name):
+        for note_info in notes_list:
+            if not note_info.get('id'):
+                note_info['id'] = str(uuid.uuid4())
+
+        old_list = self.get_note_list(group_name) if group_name in self.group_files else []
+        self.add_group(group_name)
+        if old_list is notes_list:
+            # changed in place, so there is nothing left to compare against
+            self.record_change(group_name, '', 'reloaded')
+        else:
+            self.record_list_changes(group_name, old_list, notes_list)
         self.notes_lists[group_name] = notes_list
+        self.note_positions.pop(group_name, None)
+        self.dirty_groups.add(group_name)
+
+        self.queue_save()
+
+        self.emit('group-changed', group_name)
 
+    def apply_changes(self, group_name, changed, removed=()):
+        # update just the given notes of a group instead of replacing the whole list: changed maps note ids to
+        # their new info (notes that aren't in the group yet are appended) and removed lists ids to drop
+        self.add_group(group_name)
+        notes = self.get_note_list(group_name)
+
+        for (note_id, note_info) in changed.items():
+            position = self.note_position(group_name, note_id)
+            if position is not None:
+                fields = changed_fields(notes[position], note_info)
+                if fields:
+                    self.record_change(group_name, note_id, 'changed', fields)
+                notes[position] = note_info
+            else:
+                self.record_change(group_name, note_id, 'added', note_info.keys())
+                self.note_positions[group_name][note_id] = len(notes)
+                notes.append(note_info)
+
+        if removed:
+            removed = set(removed)
+            for note_id in removed:
+                if self.note_position(group_name, note_id) is not None:
+                    self.record_change(group_name, note_id, 'removed')
+            notes[:] = [note_info for note_info in notes if note_info.get('id') not in removed]
+            # everything after a removed note moved up
+            self.note_positions.pop(group_name, None)
+
+        self.dirty_groups.add(group_name)
         self.queue_save()
 
         self.emit('group-changed', group_name)
 
+    def move_note(self, note_id, old_group, new_group):
+        # move a note to another group by id; it is appended at the end of the new group. The note is found through
+        # the id index of note_position, so only taking it out of the old group's list depends on the group size.
+        position = self.note_position(old_group, note_id)
+        if position is None:
+            raise ValueError('no note with id %s in group %s' % (note_id, old_group))
+        note_info = self.get_note_list(old_group)[position]
+
+        self.apply_changes(new_group, {note_id: note_info})
+        self.apply_changes(old_group, {}, [note_id])
+
     def queue_save(self):
         if self.save_timer_id > 0:
             GLib.source_remove(self.save_timer_id)
@@ -78,16 +310,40 @@ class FileHandler(GObject.Object):
         self.save_timer_id = GLib.timeout_add_seconds(SAVE_DELAY, self.save_note_list)
 
     def save_to_file(self, file_path):
+        # exports and backups are still a single file with every group
         with open(file_path, 'w+') as file:
-            file.write(json.dumps(self.notes_lists, indent=4))
+            file.write(json.dumps(self.get_all_lists(), indent=4))
+
+    def write_file(self, path, data):
+        # write to a temporary file first so a crash never leaves a half written group behind
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(json.dumps(data))
+        os.replace(temp_path, path)
 
     def save_note_list(self):
         self.save_timer_id = 0
 
-        if not os.path.exists(CONFIG_DIR):
-            os.makedirs(CONFIG_DIR)
+        if not os.path.exists(GROUPS_DIR):
+            os.makedirs(GROUPS_DIR)
+
+        for group_name in self.dirty_groups:
+            if group_name in self.group_files:
+                self.write_file(os.path.join(GROUPS_DIR, self.group_files[group_name]), self.notes_lists[group_name])
+        self.dirty_groups = set()
+
+        if self.manifest_dirty:
+            groups = [{'name': group_name, 'file': self.group_files[group_name]} for group_name in self.group_names]
+            self.write_file(MANIFEST_PATH, {'version': MANIFEST_VERSION, 'groups': groups})
+            self.manifest_dirty = False
+
+        for file_name in self.removed_files:
+            try:
+                os.remove(os.path.join(GROUPS_DIR, file_name))
+            except FileNotFoundError:
+                pass
+        self.removed_files = set()
 
-        self.save_to_file(CONFIG_PATH)
         self.emit('saved')
 
     def check_backup(self, *args):
@@ -247,7 +503,7 @@ class FileHandler(GObject.Object):
             # todo: needs validation here to ensure the file type is correct, and while we're at it, the validation
             # should really be added to load_notes() as well
 
-            self.notes_lists = info
+            self.set_all_lists(info)
             self.save_note_list()
 
             self.emit('lists-changed')
@@ -264,11 +520,16 @@ class FileHandler(GObject.Object):
         self.save_note_list()
 
     def new_group(self, group_name):
-        if group_name in self.notes_lists:
+        if group_name in self.group_files:
             if not confirm(_("Overwrite Existing Group"), _("There is already a group named '%s'. This action will overwrite it. Continue anyway?") % group_name, self.window):
                 return False
 
+        if group_name in self.group_files:
+            self.record_list_changes(group_name, self.get_note_list(group_name), [])
+        self.add_group(group_name)
         self.notes_lists[group_name] = []
+        self.note_positions.pop(group_name, None)
+        self.dirty_groups.add(group_name)
 
         self.save_note_list()
         self.emit('lists-changed')
@@ -279,15 +540,44 @@ class FileHandler(GObject.Object):
         if not confirm(_("Remove Group"), _("Are you sure you want to remove the group %s?") % group_name, self.window):
             return
 
-        if group_name not in self.notes_lists:
+        if group_name not in self.group_files:
             raise ValueError('invalid group name %s' % group_name)
-        del self.notes_lists[group_name]
+        self.group_names.remove(group_name)
+        self.removed_files.add(self.group_files.pop(group_name))
+        self.notes_lists.pop(group_name, None)
+        self.note_positions.pop(group_name, None)
+        self.dirty_groups.discard(group_name)
+        self.manifest_dirty = True
+
+        self.changes = {key: change for (key, change) in self.changes.items() if key[0] != group_name}
+        self.record_change(group_name, '', 'group-removed')
 
         self.save_note_list()
         self.emit('lists-changed')
 
     def change_group_name(self, old_group, new_group):
-        self.notes_lists[new_group] = self.notes_lists.pop(old_group)
+        # the group keeps its file, only the manifest changes
+        if new_group in self.group_files:
+            self.group_names.remove(new_group)
+            self.removed_files.add(self.group_files.pop(new_group))
+            self.notes_lists.pop(new_group, None)
+            self.note_positions.pop(new_group, None)
+            self.dirty_groups.discard(new_group)
+
+        self.group_names[self.group_names.index(old_group)] = new_group
+        self.group_files[new_group] = self.group_files.pop(old_group)
+        if old_group in self.notes_lists:
+            self.notes_lists[new_group] = self.notes_lists.pop(old_group)
+        if old_group in self.note_positions:
+            self.note_positions[new_group] = self.note_positions.pop(old_group)
+        if old_group in self.dirty_groups:
+            self.dirty_groups.remove(old_group)
+            self.dirty_groups.add(new_group)
+        self.manifest_dirty = True
+
+        self.changes = {((new_group if key[0] == old_group else key[0]), key[1]): change
+                        for (key, change) in self.changes.items() if key[0] != new_group}
+        self.record_change(old_group, '', 'group-renamed', [new_group])
 
         self.save_note_list()
         self.emit('group-name-changed', old_group, new_group)
@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+"""
+Faceted metadata queries over Note Book notes.
+
+Every note gets a bit position. For each facet value (a color, a note type,
+a Note File) the index keeps a Python int used as a bitmap of the notes that
+have it, so combining facets is a handful of big-int AND/OR operations and
+per-value counts are popcounts. ID tags are kept in a sorted list so a tag
+prefix is a bisect range, and parent links are followed to expand a
+selection to all of its sub-notes.
+"""
+
+from bisect import bisect_left, insort
+
+NOTE_TYPES = ('text', 'code', 'picture')
+
+# Facets with one bitmap per value; id_tag and parent are handled separately
+BITMAP_FACETS = ('color', 'type', 'file')
+
+def note_type(note_data):
+    """Return 'text', 'code' or 'picture' for a note"""
+    if note_data.get('is_picture_note', False):
+        return 'picture'
+    if note_data.get('is_code_note', False):
+        return 'code'
+    return 'text'
+
+def popcount(bitmap):
+    """Number of set bits of bitmap (int.bit_count() needs Python 3.10)"""
+    return bin(bitmap).count('1')
+
+def bit_positions(bitmap):
+    """Return the indices of the set bits of bitmap, lowest first"""
+    bits = bin(bitmap)[:1:-1]
+    positions = []
+    position = bits.find('1')
+    while position != -1:
+        positions.append(position)
+        position = bits.find('1', position + 1)
+
+    return positions
+
+class FacetIndex(object):
+    def __init__(self):
+        self.slots = {}         # note_id -> bit position
+        self.note_ids = []      # bit position -> note_id, None once removed
+        self.free_slots = []
+        self.notes = {}         # note_id -> {facet: value}
+        self.bitmaps = {facet: {} for facet in BITMAP_FACETS}
+        self.tags = []          # sorted (upper-cased id_tag, note_id)
+        self.children = {}      # parent note_id -> set of child note_ids
+        self.all_notes = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, note_id):
+        return note_id in self.slots
+
+    def load(self, rows):
+        """Replace the whole index with rows of (note_id, file_name, color, id_tag, note_type, parent_id).
+
+        Setting bits one note at a time copies the growing bitmaps over and
+        over, so a full load sets the bits in byte arrays and converts each
+        to an int once.
+        """
+        self.__init__()
+        bits = {facet: {} for facet in BITMAP_FACETS}
+
+        for note_id, file_name, color, id_tag, note_type, parent_id in rows:
+            if note_id in self.slots:
+                continue
+
+            slot = len(self.note_ids)
+            self.note_ids.append(note_id)
+            self.slots[note_id] = slot
+
+            values = self._values(file_name, color, id_tag, note_type, parent_id)
+            self.notes[note_id] = values
+
+            for facet in BITMAP_FACETS:
+                slots = bits[facet].get(values[facet])
+                if slots is None:
+                    bits[facet][values[facet]] = [slot]
+                else:
+                    slots.append(slot)
+
+            if values['id_tag']:
+                self.tags.append((values['id_tag'], note_id))
+
+            if values['parent']:
+                self.children.setdefault(values['parent'], set()).add(note_id)
+
+        size = (len(self.note_ids) + 7) // 8
+        for facet in BITMAP_FACETS:
+            for value, slots in bits[facet].items():
+                self.bitmaps[facet][value] = self._bitmap_from_slots(slots, size)
+
+        self.all_notes = (1 << len(self.note_ids)) - 1
+        self.tags.sort()
+
+    def _bitmap_from_slots(self, slots, size):
+        data = bytearray(size)
+        for slot in slots:
+            data[slot >> 3] |= 1 << (slot & 7)
+
+        return int.from_bytes(data, 'little')
+
+    def _values(self, file_name, color, id_tag, note_type, parent_id):
+        return {'color': color or 'yellow', 'type': note_type or 'text', 'file': file_name,
+                'id_tag': str(id_tag or '').upper(), 'parent': parent_id or None}
+
+    def add(self, note_id, file_name, color='', id_tag='', note_type='text', parent_id=None):
+        """Add or replace the facet values of a note"""
+        self.remove(note_id)
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.note_ids[slot] = note_id
+        else:
+            slot = len(self.note_ids)
+            self.note_ids.append(note_id)
+
+        bit = 1 << slot
+        self.slots[note_id] = slot
+        self.all_notes |= bit
+
+        values = self._values(file_name, color, id_tag, note_type, parent_id)
+        self.notes[note_id] = values
+
+        for facet in BITMAP_FACETS:
+            bitmaps = self.bitmaps[facet]
+            bitmaps[values[facet]] = bitmaps.get(values[facet], 0) | bit
+
+        if values['id_tag']:
+            insort(self.tags, (values['id_tag'], note_id))
+
+        if values['parent']:
+            self.children.setdefault(values['parent'], set()).add(note_id)
+
+    def remove(self, note_id):
+        slot = self.slots.pop(note_id, None)
+        if slot is None:
+            return False
+
+        bit = 1 << slot
+        values = self.notes.pop(note_id)
+        self.all_notes &= ~bit
+
+        for facet in BITMAP_FACETS:
+            bitmaps = self.bitmaps[facet]
+            bitmap = bitmaps[values[facet]] & ~bit
+            if bitmap:
+                bitmaps[values[facet]] = bitmap
+            else:
+                del bitmaps[values[facet]]
+
+        if values['id_tag']:
+            del self.tags[bisect_left(self.tags, (values['id_tag'], note_id))]
+
+        if values['parent']:
+            siblings = self.children[values['parent']]
+            siblings.discard(note_id)
+            if not siblings:
+                del self.children[values['parent']]
+
+        self.note_ids[slot] = None
+        self.free_slots.append(slot)
+        return True
+
+    def bitmap_of(self, note_ids):
+        bitmap = 0
+        for note_id in note_ids:
+            slot = self.slots.get(note_id)
+            if slot is not None:
+                bitmap |= 1 << slot
+
+        return bitmap
+
+    def tag_bitmap(self, prefix):
+        """Bitmap of notes whose ID tag starts with prefix (case-insensitive)"""
+        prefix = prefix.upper()
+        start = bisect_left(self.tags, (prefix,))
+        bitmap = 0
+        for tag, note_id in self.tags[start:]:
+            if not tag.startswith(prefix):
+                break
+            bitmap |= 1 << self.slots[note_id]
+
+        return bitmap
+
+    def with_descendants(self, bitmap):
+        """Expand bitmap with every sub-note (at any depth) of the notes in it"""
+        pending = [self.note_ids[slot] for slot in bit_positions(bitmap)]
+        while pending:
+            for child_id in self.children.get(pending.pop(), ()):
+                bit = 1 << self.slots[child_id]
+                if not bitmap & bit:
+                    bitmap |= bit
+                    pending.append(child_id)
+
+        return bitmap
+
+    def _value_bitmap(self, facet, values):
+        """Bitmap of notes having any of values (a single value or a collection) for facet"""
+        if isinstance(values, str):
+            values = (values,)
+
+        bitmaps = self.bitmaps[facet]
+        bitmap = 0
+        for value in values:
+            bitmap |= bitmaps.get(value, 0)
+
+        return bitmap
+
+    def query(self, color=None, note_type=None, file=None, tag_prefix=None, parent=None, include_subsets=False, exclude=None):
+        """Return the bitmap of notes matching every given facet.
+
+        color, note_type and file take a value or a collection of values (any of
+        them matches). tag_prefix matches the start of the ID tag and parent
+        selects the sub-notes of a note. With include_subsets, the notes
+        selected by file and parent are extended with all of their sub-notes,
+        wherever those are filed. exclude names one facet to leave out, which
+        is how per-facet counts are computed.
+        """
+        bitmap = self.all_notes
+
+        for facet, values in (('color', color), ('type', note_type)):
+            if values is not None and facet != exclude:
+                bitmap &= self._value_bitmap(facet, values)
+
+        if tag_prefix and exclude != 'id_tag':
+            bitmap &= self.tag_bitmap(tag_prefix)
+
+        if file is not None and exclude != 'file':
+            selection = self._value_bitmap('file', file)
+            if include_subsets:
+                selection = self.with_descendants(selection)
+            bitmap &= selection
+
+        if parent is not None and exclude != 'parent':
+            selection = self.bitmap_of(self.children.get(parent, ()))
+            if include_subsets:
+                selection = self.with_descendants(selection)
+            bitmap &= selection
+
+        return bitmap
+
+    def counts(self, facet, **filters):
+        """Return {value: count} for a bitmap facet under the other filters"""
+        bitmap = self.query(exclude=facet, **filters)
+        counts = {}
+        for value, value_bitmap in self.bitmaps[facet].items():
+            count = popcount(bitmap & value_bitmap)
+            if count:
+                counts[value] = count
+
+        return counts
+
+    def note_ids_in(self, bitmap):
+        """Return the note IDs of the notes in bitmap"""
+        return [self.note_ids[slot] for slot in bit_positions(bitmap)]
+
+    def get(self, note_id):
+        """Return the facet values stored for note_id, or None"""
+        return self.notes.get(note_id)
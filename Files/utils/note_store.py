@@ -0,0 +1,425 @@
+#!/usr/bin/python3
+"""
+Note Book data: Note Files, saved notes, their order, hierarchy and metadata.
+
+This is everything the Note Book keeps on disk, without any GTK. The
+manager window is a view over a NoteStore, and scripts and tests can use one
+directly on a data directory.
+
+notebook.json holds the Note Files (an ordered list of note IDs each), the
+per-file metadata (description, instructions, color and ID tag configs) and
+the user preferences. Every saved note is its own JSON file in the same
+directory: note_<id>.json, or <id>.json for picture notes.
+
+Several processes can share a data directory: the Note Book window keeps
+its store open for as long as it runs while the command line interface
+changes the same files. save() notices when notebook.json was written by
+someone else since this store last read or wrote it, and merges those
+changes with its own instead of overwriting them.
+
+Search indexes are not part of the store. on_note_saved(note_data) and
+on_note_removed(note_id) are called whenever a note is written or deleted
+so the owner can keep its indexes up to date.
+"""
+
+import copy
+import json
+import os
+
+DEFAULT_DATA_DIR = os.path.expanduser("~/.config/notebook")
+NOTEBOOK_FILE = 'notebook.json'
+
+def default_file_metadata():
+    return {'description': '', 'instructions': '', 'color_config': {}, 'number_config': {}}
+
+class NoteStore(object):
+    def __init__(self, data_dir, on_note_saved=None, on_note_removed=None):
+        self.data_dir = data_dir
+        self.on_note_saved = on_note_saved
+        self.on_note_removed = on_note_removed
+
+        self.note_files = {}  # {file_name: [note_ids]}
+        self.note_file_metadata = {}  # {file_name: {description, instructions, color_config, number_config}}
+        self.preferences = {}
+        # nothing is written before load() so a failed or skipped load never overwrites notebook.json
+        self.loaded = False
+        # notebook.json as this store last read or wrote it, to tell its own changes from other processes'
+        self.base = self.snapshot()
+        self.file_stamp = None
+
+    # --- notebook.json ---
+
+    def snapshot(self):
+        return copy.deepcopy({'note_files': self.note_files, 'note_file_metadata': self.note_file_metadata,
+                              'preferences': self.preferences})
+
+    def notebook_path(self):
+        return os.path.join(self.data_dir, NOTEBOOK_FILE)
+
+    def notebook_stamp(self):
+        # notebook.json is always replaced as a whole, so a new inode tells a write apart even within the mtime
+        # granularity of the file system
+        try:
+            stat = os.stat(self.notebook_path())
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """Load the Note Files, their metadata and the preferences"""
+        (self.note_files, self.note_file_metadata, self.preferences) = self.read()
+        self.base = self.snapshot()
+        self.loaded = True
+
+    def read(self):
+        """Return (note_files, note_file_metadata, preferences) from notebook.json"""
+        note_files = {}
+        note_file_metadata = {}
+        preferences = {}
+
+        file_path = self.notebook_path()
+        self.file_stamp = self.notebook_stamp()
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+
+            preferences = data.get('preferences', {})
+
+            # Handle both old and new formats
+            # New format: {"file": {"notes": [ids], "description": "...", "instructions": "..."}}
+            # Old format: {"file": [ids]}
+            for file_name, file_data in data.get('note_files', {}).items():
+                if isinstance(file_data, dict) and 'notes' in file_data:
+                    note_files[file_name] = file_data['notes']
+                elif isinstance(file_data, list):
+                    note_files[file_name] = file_data
+                else:
+                    note_files[file_name] = []
+
+            raw_file_metadata = data.get('note_file_metadata', {})
+            for file_name in note_files:
+                metadata = raw_file_metadata.get(file_name)
+                if metadata is None:
+                    metadata = default_file_metadata()
+                metadata.setdefault('color_config', {})
+                metadata.setdefault('number_config', {})
+                note_file_metadata[file_name] = metadata
+
+        return (note_files, note_file_metadata, preferences)
+
+    def save(self):
+        """Write notebook.json, first merging in what other processes wrote to it since this store read it"""
+        if not self.loaded:
+            return
+
+        if self.notebook_stamp() != self.file_stamp:
+            self.merge(*self.read())
+
+        data = {
+            'note_files': self.note_files,
+            'note_file_metadata': self.note_file_metadata,
+            'preferences': self.preferences
+        }
+        file_path = self.notebook_path()
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, file_path)
+
+        self.file_stamp = self.notebook_stamp()
+        self.base = self.snapshot()
+
+    def merge(self, note_files, note_file_metadata, preferences):
+        """Fold the changes another process made to notebook.json (relative to self.base) into this store.
+
+        Note Files and notes someone else added are kept and the ones they
+        removed are dropped, unless this store added them itself; metadata and
+        preferences this store didn't change take the other process's values.
+        """
+        base_files = self.base['note_files']
+        merged = {}
+        for file_name in list(self.note_files) + [name for name in note_files if name not in self.note_files]:
+            ours = self.note_files.get(file_name)
+            theirs = note_files.get(file_name)
+            base = base_files.get(file_name)
+            if ours is None:
+                # removed here, or added there
+                if base is None:
+                    merged[file_name] = list(theirs)
+                continue
+            if theirs is None and base is not None:
+                # removed there; kept only if it changed here since
+                if ours == base:
+                    continue
+                theirs = []
+
+            base_ids = set(base or ())
+            their_ids = set(theirs or ())
+            # in place, so lists handed out by notes_in() stay current
+            ours[:] = ([note_id for note_id in ours if note_id in their_ids or note_id not in base_ids] +
+                       [note_id for note_id in theirs or () if note_id not in base_ids and note_id not in ours])
+            merged[file_name] = ours
+        self.note_files = merged
+
+        base_metadata = self.base['note_file_metadata']
+        for file_name in merged:
+            if file_name in note_file_metadata and self.note_file_metadata.get(file_name) == base_metadata.get(file_name):
+                self.note_file_metadata[file_name] = note_file_metadata[file_name]
+            self.note_file_metadata.setdefault(file_name, default_file_metadata())
+        for file_name in list(self.note_file_metadata):
+            if file_name not in merged:
+                del self.note_file_metadata[file_name]
+
+        base_preferences = self.base['preferences']
+        for key in set(preferences) | set(base_preferences):
+            if self.preferences.get(key) == base_preferences.get(key):
+                if key in preferences:
+                    self.preferences[key] = preferences[key]
+                else:
+                    self.preferences.pop(key, None)
+
+    # --- notes ---
+
+    def note_path(self, note_id):
+        """Return the JSON path of a saved note (regular or picture), or None"""
+        for file_name in (f"note_{note_id}.json", f"{note_id}.json"):
+            file_path = os.path.join(self.data_dir, file_name)
+            if os.path.exists(file_path):
+                return file_path
+
+        return None
+
+    def load_note(self, note_id):
+        """Return the data of a saved note, or None"""
+        file_path = self.note_path(note_id)
+        if file_path is None:
+            return None
+
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    def save_note(self, note_data, file_name=None):
+        """Write a note, giving it an ID if it has none, and add it to file_name if given. Returns the note ID."""
+        if not note_data.get('id'):
+            # uuid is imported here since the command line interface loads this module and rarely creates notes
+            import uuid
+            note_data['id'] = str(uuid.uuid4())
+        note_id = note_data['id']
+
+        note_path = self.note_path(note_id)
+        if note_path is None:
+            name = f"{note_id}.json" if note_data.get('is_picture_note', False) else f"note_{note_id}.json"
+            note_path = os.path.join(self.data_dir, name)
+        with open(note_path, 'w') as f:
+            json.dump(note_data, f, indent=2)
+
+        if file_name is not None:
+            self.add_to_file(file_name, note_id)
+        if self.on_note_saved:
+            self.on_note_saved(note_data)
+
+        return note_id
+
+    def delete_note(self, note_id):
+        """Remove a note from every Note File and delete its JSON file"""
+        changed = False
+        for note_ids in self.note_files.values():
+            if note_id in note_ids:
+                note_ids.remove(note_id)
+                changed = True
+        if changed:
+            self.save()
+
+        note_path = self.note_path(note_id)
+        if note_path is not None:
+            os.remove(note_path)
+        if self.on_note_removed:
+            self.on_note_removed(note_id)
+
+    # --- Note Files ---
+
+    def file_names(self):
+        return sorted(self.note_files.keys())
+
+    def file_counts(self):
+        """[(file_name, number of notes)] in display order"""
+        return [(file_name, len(self.note_files[file_name])) for file_name in self.file_names()]
+
+    def notes_in(self, file_name):
+        return self.note_files.get(file_name, [])
+
+    def find_file(self, note_id):
+        """Return the name of the Note File containing note_id, or None"""
+        for file_name, note_ids in self.note_files.items():
+            if note_id in note_ids:
+                return file_name
+
+        return None
+
+    def create_file(self, file_name):
+        """Add an empty Note File; returns False if the name is empty or taken"""
+        if not file_name or file_name in self.note_files:
+            return False
+
+        self.note_files[file_name] = []
+        self.note_file_metadata[file_name] = default_file_metadata()
+        self.save()
+        return True
+
+    def delete_file(self, file_name):
+        """Remove a Note File (its notes stay on disk) and return the IDs of the notes it listed"""
+        note_ids = self.note_files.pop(file_name, [])
+        self.note_file_metadata.pop(file_name, None)
+        self.save()
+        return note_ids
+
+    def add_to_file(self, file_name, note_id):
+        """Append note_id to a Note File (creating the file if needed); returns False if it was already there"""
+        note_ids = self.note_files.setdefault(file_name, [])
+        if note_id in note_ids:
+            return False
+
+        note_ids.append(note_id)
+        self.note_file_metadata.setdefault(file_name, default_file_metadata())
+        self.save()
+        return True
+
+    def move_to_file(self, note_id, file_name):
+        """Move a note from its Note File to the end of another one"""
+        for note_ids in self.note_files.values():
+            if note_id in note_ids:
+                note_ids.remove(note_id)
+
+        self.add_to_file(file_name, note_id)
+
+        # rewritten even if it has no note_file of its own, so indexes pick up the new Note File
+        note_data = self.load_note(note_id)
+        if note_data is not None:
+            if note_data.get('note_file'):
+                note_data['note_file'] = file_name
+            self.save_note(note_data)
+
+    # --- order ---
+
+    def move_note(self, file_name, note_id, offset):
+        """Swap a note with its neighbour offset places away (-1 up, 1 down); returns False if it can't move"""
+        note_ids = self.note_files.get(file_name)
+        if note_ids is None or note_id not in note_ids:
+            return False
+
+        index = note_ids.index(note_id)
+        other = index + offset
+        if other < 0 or other >= len(note_ids):
+            return False
+
+        note_ids[index], note_ids[other] = note_ids[other], note_ids[index]
+        self.save()
+        return True
+
+    def move_before(self, file_name, note_id, target_id):
+        """Move a note to just before target_id in the same Note File"""
+        note_ids = self.note_files.get(file_name)
+        if note_ids is None or note_id == target_id or note_id not in note_ids or target_id not in note_ids:
+            return False
+
+        note_ids.remove(note_id)
+        note_ids.insert(note_ids.index(target_id), note_id)
+        self.save()
+        return True
+
+    def can_move(self, file_name, note_id):
+        """(can move up, can move down) for a note in a Note File"""
+        note_ids = self.note_files.get(file_name, [])
+        if note_id not in note_ids:
+            return (False, False)
+
+        index = note_ids.index(note_id)
+        return (index > 0, index < len(note_ids) - 1)
+
+    # --- hierarchy ---
+
+    def hierarchy(self, note_ids, notes=None):
+        """Return [(note_id, depth)] with every sub-note right after its parent.
+
+        notes maps note IDs to their data; notes that are missing from it are
+        loaded, and notes that don't exist are left out. A note whose parent
+        is not among note_ids is shown at the top level.
+        """
+        if notes is None:
+            notes = {}
+        for note_id in note_ids:
+            if note_id not in notes:
+                note_data = self.load_note(note_id)
+                if note_data:
+                    notes[note_id] = note_data
+        listed = [note_id for note_id in note_ids if note_id in notes]
+
+        children = {}  # parent_id -> [child_ids]
+        for note_id in listed:
+            parent_id = notes[note_id].get('parent_id')
+            if parent_id:
+                children.setdefault(parent_id, []).append(note_id)
+
+        hierarchy = []
+        visited = set()
+
+        def add_note_and_children(note_id, depth):
+            if note_id in visited:
+                return
+            visited.add(note_id)
+            hierarchy.append((note_id, depth))
+
+            for child_id in children.get(note_id, []):
+                add_note_and_children(child_id, depth + 1)
+
+        for note_id in listed:
+            parent_id = notes[note_id].get('parent_id')
+            if not parent_id or parent_id not in notes:
+                add_note_and_children(note_id, 0)
+
+        return hierarchy
+
+    # --- metadata ---
+
+    def file_metadata(self, file_name):
+        """The metadata of a Note File, created with empty values if it has none yet"""
+        metadata = self.note_file_metadata.setdefault(file_name, default_file_metadata())
+        metadata.setdefault('color_config', {})
+        metadata.setdefault('number_config', {})
+        return metadata
+
+    def set_file_metadata(self, file_name, metadata):
+        self.note_file_metadata[file_name] = metadata
+        self.save()
+
+    def tag_notes(self, file_name):
+        """{ID tag: data of the first note with it} for the notes of a Note File"""
+        tags = {}
+        for note_id in self.notes_in(file_name):
+            note_data = self.load_note(note_id)
+            if note_data and note_data.get('id_tag'):
+                tags.setdefault(str(note_data['id_tag']), note_data)
+
+        return tags
+
+    # --- search hooks ---
+
+    def index_entries(self):
+        """[(note_id, file_name, mtime)] of every saved note in a Note File, for SearchIndex.sync"""
+        entries = []
+        for file_name, note_ids in self.note_files.items():
+            for note_id in note_ids:
+                note_path = self.note_path(note_id)
+                if note_path:
+                    entries.append((note_id, file_name, os.path.getmtime(note_path)))
+
+        return entries
+
+    def positions(self):
+        """{note_id: (file_name, index)} for sorting notes in Note File order"""
+        positions = {}
+        for file_name, note_ids in self.note_files.items():
+            for index, note_id in enumerate(note_ids):
+                positions[note_id] = (file_name, index)
+
+        return positions
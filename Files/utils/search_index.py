@@ -0,0 +1,319 @@
+#!/usr/bin/python3
+"""
+Full text search index for Note Book notes, backed by SQLite FTS5.
+
+The index lives next to the note JSON files and is kept up to date
+incrementally: every time a note is written, its row is replaced. On startup
+`sync` compares note file modification times with the ones recorded in the
+index, so only notes that changed while the app was closed are re-indexed.
+"""
+
+import sqlite3
+import threading
+from xml.sax.saxutils import escape
+
+from utils.util import plain_text
+from utils.facets import note_type
+
+SCHEMA_VERSION = 2
+
+# Markers placed around matches in snippets. They are control characters so
+# they can never collide with note text, and are turned into markup (or
+# stripped) by the caller.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_ELLIPSIS = '…'
+SNIPPET_TOKENS = 12
+
+# how many SQLite VM instructions run between checks for a cancelled search
+CANCEL_CHECK_INTERVAL = 1000
+
+INDEXED_COLUMNS = ('title', 'text', 'description', 'instructions', 'id_tag', 'language')
+
+# bm25() weights, in the same order as INDEXED_COLUMNS. Titles and ID tags are
+# what people remember notes by, so a hit there outranks one in the body.
+COLUMN_WEIGHTS = (10.0, 1.0, 2.0, 2.0, 8.0, 1.0)
+
+def note_document(note_data):
+    """Return the column values the index stores for a note"""
+    text = note_data.get('text', '') or ''
+    if not note_data.get('is_code_note', False):
+        # text notes are stored in the sticky internal markup format
+        text = plain_text(text)
+
+    return {
+        'title': note_data.get('title', '') or '',
+        'text': text,
+        'description': note_data.get('description', '') or '',
+        'instructions': note_data.get('instructions', '') or '',
+        'id_tag': str(note_data.get('id_tag', '') or ''),
+        'language': note_data.get('language', '') if note_data.get('is_code_note', False) else '',
+    }
+
+def build_match_query(search_text):
+    """Turn free text typed by the user into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so partial words match while
+    typing and FTS5 operators in the input are treated as plain text.
+    """
+    terms = []
+    for word in search_text.split():
+        word = word.replace('"', '""')
+        terms.append('"%s"*' % word)
+
+    return ' '.join(terms)
+
+def snippet_to_markup(snippet):
+    """Convert a snippet with match markers into Pango markup"""
+    return escape(snippet).replace(MATCH_START, '<b>').replace(MATCH_END, '</b>')
+
+def as_tuple(values):
+    return (values,) if isinstance(values, str) else tuple(values)
+
+def facet_conditions(color=None, note_type=None, file=None, tag_prefix=None, parent=None, include_subsets=False):
+    """Return (SQL condition, parameters) selecting the notes FacetIndex.query() would for the same arguments.
+
+    The condition refers to note_state as s and notes_fts as f. Sub-notes are
+    followed with a recursive query when include_subsets is set.
+    """
+    conditions = []
+    params = []
+
+    def values_in(column, values):
+        values = as_tuple(values)
+        conditions.append('%s IN (%s)' % (column, ', '.join('?' * len(values))))
+        params.extend(values)
+
+    def selection(base, base_params):
+        if include_subsets:
+            base = ('WITH RECURSIVE selected(note_id) AS (%s UNION '
+                    'SELECT c.note_id FROM note_state c JOIN selected ON c.parent_id = selected.note_id) '
+                    'SELECT note_id FROM selected') % base
+        conditions.append('s.note_id IN (%s)' % base)
+        params.extend(base_params)
+
+    if color is not None:
+        values_in("coalesce(nullif(s.color, ''), 'yellow')", color)
+    if note_type is not None:
+        values_in('s.note_type', note_type)
+    if tag_prefix:
+        escaped = tag_prefix.upper().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("upper(f.id_tag) LIKE ? ESCAPE '\\'")
+        params.append(escaped + '%')
+    if file is not None:
+        file_names = as_tuple(file)
+        selection('SELECT note_id FROM note_state WHERE file_name IN (%s)' % ', '.join('?' * len(file_names)), file_names)
+    if parent is not None:
+        selection('SELECT note_id FROM note_state WHERE parent_id = ?', (parent,))
+
+    return (' AND '.join(conditions), params)
+
+class SearchIndex(object):
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.owner_thread = threading.get_ident()
+        self.readers = threading.local()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        self._create_tables()
+
+    def _create_tables(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.connection:
+                self.connection.execute('DROP TABLE IF EXISTS notes_fts')
+                self.connection.execute('DROP TABLE IF EXISTS note_state')
+
+        with self.connection:
+            self.connection.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5('
+                'title, text, description, instructions, id_tag, language, '
+                'note_id UNINDEXED, file_name UNINDEXED, '
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS note_state ('
+                'note_id TEXT PRIMARY KEY, doc_id INTEGER NOT NULL, file_name TEXT, mtime REAL, '
+                'color TEXT, note_type TEXT, parent_id TEXT)'
+            )
+            self.connection.execute('PRAGMA user_version=%d' % SCHEMA_VERSION)
+
+    def close(self):
+        self.connection.close()
+
+    def get_reader(self):
+        """Return a connection usable for searching from the calling thread.
+
+        Writes always happen on the thread that created the index; search
+        workers get their own connection, which WAL mode lets read while the
+        main thread writes.
+        """
+        if threading.get_ident() == self.owner_thread:
+            return self.connection
+
+        connection = getattr(self.readers, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            self.readers.connection = connection
+
+        return connection
+
+    def _remove(self, note_id):
+        row = self.connection.execute('SELECT doc_id FROM note_state WHERE note_id=?', (note_id,)).fetchone()
+        if row is None:
+            return False
+
+        self.connection.execute('DELETE FROM notes_fts WHERE rowid=?', (row[0],))
+        self.connection.execute('DELETE FROM note_state WHERE note_id=?', (note_id,))
+        return True
+
+    def _insert(self, note_id, file_name, note_data, mtime):
+        document = note_document(note_data)
+        values = [document[column] for column in INDEXED_COLUMNS]
+        cursor = self.connection.execute(
+            'INSERT INTO notes_fts(%s, note_id, file_name) VALUES (%s)' % (
+                ', '.join(INDEXED_COLUMNS), ', '.join('?' * (len(INDEXED_COLUMNS) + 2))),
+            values + [note_id, file_name]
+        )
+        self.connection.execute(
+            'INSERT INTO note_state(note_id, doc_id, file_name, mtime, color, note_type, parent_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (note_id, cursor.lastrowid, file_name, mtime,
+             note_data.get('color', 'yellow'), note_type(note_data), note_data.get('parent_id'))
+        )
+
+    def update_note(self, note_id, file_name, note_data, mtime=None):
+        """Index (or re-index) a single note. Called every time a note is saved."""
+        with self.connection:
+            self._remove(note_id)
+            self._insert(note_id, file_name, note_data, mtime)
+
+    def remove_note(self, note_id):
+        with self.connection:
+            return self._remove(note_id)
+
+    def get_state(self):
+        """Return {note_id: (file_name, mtime)} for every indexed note"""
+        state = {}
+        for note_id, file_name, mtime in self.connection.execute('SELECT note_id, file_name, mtime FROM note_state'):
+            state[note_id] = (file_name, mtime)
+
+        return state
+
+    def get_titles(self):
+        """Return (note_id, file_name, title, id_tag) for every indexed note"""
+        return self.connection.execute('SELECT note_id, file_name, title, id_tag FROM notes_fts').fetchall()
+
+    def get_facets(self):
+        """Return (note_id, file_name, color, id_tag, note_type, parent_id) for every indexed note"""
+        return self.connection.execute(
+            'SELECT s.note_id, s.file_name, s.color, f.id_tag, s.note_type, s.parent_id '
+            'FROM note_state s JOIN notes_fts f ON f.rowid = s.doc_id'
+        ).fetchall()
+
+    def get_summaries(self, note_ids):
+        """Return search-result style dicts for note_ids, in the same order.
+
+        Used to list notes selected by something other than a text query, so
+        the snippet is just the start of the note text.
+        """
+        rows = {}
+        note_ids = list(note_ids)
+        # stay well below SQLite's host parameter limit
+        for start in range(0, len(note_ids), 500):
+            chunk = note_ids[start:start + 500]
+            for note_id, file_name, title, id_tag, text in self.connection.execute(
+                    'SELECT s.note_id, s.file_name, f.title, f.id_tag, substr(f.text, 1, 200) '
+                    'FROM note_state s JOIN notes_fts f ON f.rowid = s.doc_id '
+                    'WHERE s.note_id IN (%s)' % ', '.join('?' * len(chunk)), chunk):
+                rows[note_id] = {
+                    'note_id': note_id,
+                    'file_name': file_name,
+                    'title': title,
+                    'id_tag': id_tag,
+                    'snippet': text,
+                    'rank': 0.0
+                }
+
+        return [rows[note_id] for note_id in note_ids if note_id in rows]
+
+    def sync(self, entries, load_note):
+        """Bring the index in line with the notes on disk.
+
+        entries is an iterable of (note_id, file_name, mtime) for every note
+        that should be searchable; load_note(note_id) returns its data. Only
+        notes that are new, moved or modified since they were last indexed are
+        loaded, and notes that no longer exist are dropped. Returns the number
+        of notes that were (re-)indexed.
+        """
+        state = self.get_state()
+        wanted = set()
+        count = 0
+
+        with self.connection:
+            for note_id, file_name, mtime in entries:
+                wanted.add(note_id)
+                if state.get(note_id) == (file_name, mtime):
+                    continue
+
+                note_data = load_note(note_id)
+                self._remove(note_id)
+                if note_data is not None:
+                    self._insert(note_id, file_name, note_data, mtime)
+                    count += 1
+
+            for note_id in state:
+                if note_id not in wanted:
+                    self._remove(note_id)
+
+        return count
+
+    def search(self, search_text, limit=50, is_cancelled=None, filters=None):
+        """Return ranked results for search_text, best match first.
+
+        Each result is a dict with note_id, file_name, title, id_tag, rank and
+        a snippet where matches are wrapped in MATCH_START/MATCH_END. filters
+        takes the FacetIndex.query() arguments and is applied in the query
+        itself, so the limit counts only notes that pass them. If
+        is_cancelled is given, the query is aborted (returning no results) as
+        soon as it returns True.
+        """
+        match_query = build_match_query(search_text)
+        if match_query == '':
+            return []
+
+        (condition, filter_params) = facet_conditions(**filters) if filters else ('', [])
+        sql = ('SELECT f.note_id, f.file_name, f.title, f.id_tag, '
+               "snippet(notes_fts, -1, ?, ?, ?, ?), bm25(notes_fts, %s) AS rank "
+               'FROM notes_fts f JOIN note_state s ON s.doc_id = f.rowid '
+               'WHERE notes_fts MATCH ? %s ORDER BY rank LIMIT ?') % (
+                   ', '.join(str(w) for w in COLUMN_WEIGHTS), 'AND ' + condition if condition else '')
+
+        connection = self.get_reader()
+        if is_cancelled is not None:
+            connection.set_progress_handler(is_cancelled, CANCEL_CHECK_INTERVAL)
+
+        try:
+            rows = connection.execute(sql, [MATCH_START, MATCH_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS, match_query]
+                                      + filter_params + [limit]).fetchall()
+        except sqlite3.OperationalError as e:
+            if is_cancelled is None or not is_cancelled():
+                print(f"Search error: {e}")
+            return []
+        finally:
+            if is_cancelled is not None:
+                connection.set_progress_handler(None, 0)
+
+        results = []
+        for note_id, file_name, title, id_tag, snippet, rank in rows:
+            results.append({
+                'note_id': note_id,
+                'file_name': file_name,
+                'title': title,
+                'id_tag': id_tag,
+                'snippet': snippet,
+                'rank': rank
+            })
+
+        return results
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+"""
+Search-as-you-type plumbing shared by the Note Book and Sticky search UIs.
+
+Keystrokes restart a short debounce timer. When it fires, the query is handed
+to a single worker thread; a query that has not started yet is simply replaced
+by the newer one, and a running query is told to stop through its
+is_cancelled() callback. Results are passed back to the main loop in ranked
+batches and are dropped if a newer query was requested in the meantime, so
+fast typing never queues up work on either thread.
+"""
+
+import threading
+
+from gi.repository import GLib
+
+SEARCH_DELAY = 150  # milliseconds
+BATCH_SIZE = 25
+
+class SearchPipeline(object):
+    def __init__(self, search_func, on_start, on_batch, prepare=None, delay=SEARCH_DELAY, batch_size=BATCH_SIZE):
+        # search_func(query, is_cancelled) runs on the worker thread and returns (or yields) results best first.
+        # on_start() and on_batch(results) run on the main thread; on_start is called right before the first batch
+        # of a query, so the previous results stay visible until new ones are ready. prepare(query), if given, runs on
+        # the main thread when the debounce timer fires, e.g. to take a snapshot of data the worker must not touch.
+        self.search_func = search_func
+        self.on_start = on_start
+        self.on_batch = on_batch
+        self.prepare = prepare
+        self.delay = delay
+        self.batch_size = batch_size
+
+        self.generation = 0
+        self.timer_id = 0
+        self.pending = None
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def request(self, query):
+        self.generation += 1
+
+        if self.timer_id:
+            GLib.source_remove(self.timer_id)
+
+        self.timer_id = GLib.timeout_add(self.delay, self.dispatch, self.generation, query)
+
+    def cancel(self):
+        self.generation += 1
+
+        if self.timer_id:
+            GLib.source_remove(self.timer_id)
+            self.timer_id = 0
+
+        with self.condition:
+            self.pending = None
+
+    def dispatch(self, generation, query):
+        self.timer_id = 0
+
+        if self.prepare is not None:
+            query = self.prepare(query)
+
+        with self.condition:
+            # only the latest query ever waits for the worker
+            self.pending = (generation, query)
+            self.condition.notify()
+
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, name='search-pipeline', daemon=True)
+            self.worker.start()
+
+        return GLib.SOURCE_REMOVE
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+
+                (generation, query) = self.pending
+                self.pending = None
+
+            def is_cancelled(generation=generation):
+                return generation != self.generation
+
+            try:
+                self.stream_results(generation, query, is_cancelled)
+            except Exception as e:
+                print(f"Search failed: {e}")
+
+    def stream_results(self, generation, query, is_cancelled):
+        batch = []
+        is_first = True
+
+        for result in self.search_func(query, is_cancelled):
+            if is_cancelled():
+                return
+
+            batch.append(result)
+            if len(batch) >= self.batch_size:
+                GLib.idle_add(self.deliver, generation, batch, is_first)
+                batch = []
+                is_first = False
+
+        if is_cancelled():
+            return
+
+        if batch or is_first:
+            GLib.idle_add(self.deliver, generation, batch, is_first)
+
+    def deliver(self, generation, batch, is_first):
+        if generation == self.generation:
+            if is_first:
+                self.on_start()
+
+            self.on_batch(batch)
+
+        return GLib.SOURCE_REMOVE
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+Startup profiling for the Note Book.
+
+Spans (imports, window construction, deferred loading) and marks (first
+paint) are recorded from when this module was first imported until stop()
+is called once startup has finished; that costs a couple of perf_counter()
+calls each. With --profile-startup the Note Book prints them at that point,
+compares time-to-first-paint against FIRST_PAINT_BUDGET and keeps
+recording.
+"""
+
+import time
+from contextlib import contextmanager
+
+FIRST_PAINT_BUDGET = 400  # milliseconds
+
+origin = time.perf_counter()
+spans = []  # (name, start ms, end ms, depth); marks have start == end
+depth = 0
+recording = True
+
+def elapsed():
+    """Milliseconds since the profile started"""
+    return (time.perf_counter() - origin) * 1000
+
+@contextmanager
+def span(name):
+    global depth
+
+    if not recording:
+        yield
+        return
+
+    start = elapsed()
+    depth += 1
+    try:
+        yield
+    finally:
+        depth -= 1
+        spans.append((name, start, elapsed(), depth))
+
+def mark(name):
+    if not recording:
+        return
+    now = elapsed()
+    spans.append((name, now, now, depth))
+
+def stop():
+    """Stop recording, so a long-running process doesn't collect spans forever"""
+    global recording
+    recording = False
+
+def get_mark(name):
+    for (span_name, start, end, span_depth) in spans:
+        if span_name == name and start == end:
+            return start
+
+    return None
+
+def format_report(budget=FIRST_PAINT_BUDGET):
+    lines = ["Startup profile (ms since start):"]
+    for (name, start, end, span_depth) in sorted(spans, key=lambda item: (item[1], item[3])):
+        indent = '  ' * (span_depth + 1)
+        if start == end:
+            lines.append(f"{indent}{start:8.1f}            {name}")
+        else:
+            lines.append(f"{indent}{start:8.1f} {end - start:8.1f}ms  {name}")
+
+    first_paint = get_mark('first paint')
+    if first_paint is not None:
+        verdict = "within" if first_paint <= budget else "OVER"
+        lines.append(f"Time to first paint: {first_paint:.1f}ms ({verdict} the {budget}ms budget)")
+
+    return '\n'.join(lines)
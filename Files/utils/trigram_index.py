@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+"""
+In-memory trigram index for fuzzy "quick switcher" lookups.
+
+Every entry has a few short fields (an ID tag, a title, a Note File name).
+Their lowercased trigrams are kept in posting sets, so a query only has to
+look at entries sharing at least one trigram with it instead of scanning the
+whole notebook. Candidates are ranked by the fraction of query trigrams they
+contain, with bonuses for exact, prefix and substring matches per field.
+"""
+
+import heapq
+import itertools
+from collections import Counter
+
+# Relative importance of a match in each field, in the order fields are given to add()
+FIELD_WEIGHTS = (3.0, 2.0, 0.5)
+
+# A candidate must contain at least this fraction of the query's trigrams
+MIN_TRIGRAM_OVERLAP = 0.5
+
+# Only this many of the candidates sharing the most trigrams with the query get the full scoring pass
+CANDIDATES_PER_RESULT = 10
+
+def trigrams(text):
+    """Return the set of trigrams of text.
+
+    Every word is padded with two leading blanks, so the first one and two
+    characters of each word get a trigram of their own and short queries can
+    still be answered from the postings as word-prefix matches.
+    """
+    padded = '  ' + '  '.join(text.split()) + ' '
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+class TrigramIndex(object):
+    def __init__(self, field_weights=FIELD_WEIGHTS):
+        self.field_weights = field_weights
+        self.doc_ids = {}       # key -> doc id
+        self.docs = []          # doc id -> (key, lowercased fields, value) or None once removed
+        self.postings = {}      # trigram -> set of doc ids
+        self.field_starts = {}  # (field index, first one or two characters) -> set of doc ids
+        self.free_ids = []
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, key):
+        return key in self.doc_ids
+
+    def add(self, key, fields, value=None):
+        """Index fields (a tuple of strings) under key, replacing any previous entry"""
+        self.remove(key)
+
+        fields = tuple((field or '').lower() for field in fields)
+        if self.free_ids:
+            doc_id = self.free_ids.pop()
+            self.docs[doc_id] = (key, fields, value)
+        else:
+            doc_id = len(self.docs)
+            self.docs.append((key, fields, value))
+
+        self.doc_ids[key] = doc_id
+        for gram in self._doc_trigrams(fields):
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = {doc_id}
+            else:
+                posting.add(doc_id)
+
+        for start in self._field_starts(fields):
+            posting = self.field_starts.get(start)
+            if posting is None:
+                self.field_starts[start] = {doc_id}
+            else:
+                posting.add(doc_id)
+
+    def remove(self, key):
+        doc_id = self.doc_ids.pop(key, None)
+        if doc_id is None:
+            return False
+
+        (key, fields, value) = self.docs[doc_id]
+        for gram in self._doc_trigrams(fields):
+            posting = self.postings[gram]
+            posting.discard(doc_id)
+            if not posting:
+                del self.postings[gram]
+
+        for start in self._field_starts(fields):
+            posting = self.field_starts[start]
+            posting.discard(doc_id)
+            if not posting:
+                del self.field_starts[start]
+
+        self.docs[doc_id] = None
+        self.free_ids.append(doc_id)
+        return True
+
+    def clear(self):
+        self.doc_ids.clear()
+        self.docs = []
+        self.postings.clear()
+        self.field_starts.clear()
+        self.free_ids = []
+
+    def _doc_trigrams(self, fields):
+        grams = set()
+        for field in fields:
+            if field:
+                grams |= trigrams(field)
+
+        return grams
+
+    def _field_starts(self, fields):
+        return {(index, field[:length])
+                for (index, field) in enumerate(fields) for length in (1, 2) if len(field) >= length}
+
+    def _short_query_candidates(self, query):
+        # a field starting with the query scores highest, so those docs come first, in order of field weight;
+        # the other word-prefix matches only fill up what is left
+        fields_by_weight = sorted(range(len(self.field_weights)), key=lambda index: -self.field_weights[index])
+        postings = [self.field_starts.get((index, query), ()) for index in fields_by_weight]
+        postings.append(self.postings.get(('  ' + query)[-3:], ()))
+
+        seen = set()
+        for doc_id in itertools.chain.from_iterable(postings):
+            if doc_id not in seen:
+                seen.add(doc_id)
+                yield doc_id
+
+    def search(self, query, limit=20):
+        """Return up to limit (score, key, value) tuples, best match first"""
+        query = ' '.join(query.lower().split())
+        if query == '':
+            return []
+
+        if len(query) < 3:
+            # too short for trigrams of its own - fall back to word prefixes. In a big notebook nearly every entry
+            # has a word starting with one letter, so the candidates are capped like below
+            candidates = ((doc_id, 1.0) for doc_id in
+                          itertools.islice(self._short_query_candidates(query), limit * CANDIDATES_PER_RESULT))
+        else:
+            query_grams = trigrams(query)
+            hits = Counter()
+            for gram in query_grams:
+                posting = self.postings.get(gram)
+                if posting:
+                    hits.update(posting)
+
+            needed = len(query_grams) * MIN_TRIGRAM_OVERLAP
+            candidates = heapq.nlargest(limit * CANDIDATES_PER_RESULT,
+                                        ((doc_id, count / len(query_grams)) for (doc_id, count) in hits.items() if count >= needed),
+                                        key=lambda item: item[1])
+
+        scored = ((self._score(doc_id, query, overlap), doc_id) for (doc_id, overlap) in candidates)
+        best = heapq.nlargest(limit, scored, key=lambda item: item[0])
+
+        results = []
+        for (score, doc_id) in best:
+            (key, fields, value) = self.docs[doc_id]
+            results.append((score, key, value))
+
+        return results
+
+    def _score(self, doc_id, query, overlap):
+        fields = self.docs[doc_id][1]
+        score = overlap
+
+        for (field, weight) in zip(fields, self.field_weights):
+            if not field:
+                continue
+
+            if field == query:
+                score += 3 * weight
+            elif field.startswith(query):
+                score += 2 * weight
+            elif query in field:
+                score += weight
+
+        # prefer short entries when everything else is equal
+        return score - 0.001 * sum(len(field) for field in fields)
@@ -2,6 +2,8 @@
 
 import re
 import xml.etree.ElementTree as etree
+from difflib import SequenceMatcher
+from functools import lru_cache
 
 ip_number = r"(?:\d{1,2}|1\d{2}|2[0-4]\d|25[0-5])"
 ip_address = r"(?:(?:" + ip_number + ".){3}" + ip_number + ")"
@@ -80,24 +82,107 @@ def gnote_to_internal_format(file_path):
 
     return category, info, is_template
 
-def clean_text(text):
+SNIPPET_LENGTH = 300
+SNIPPET_ELLIPSIS = '…'
+
+def plain_text(text, symbols=False):
+    # with symbols, check boxes and bullets are kept as characters so the result can be shown as a preview
     current_index = 0
     new_text = ''
     while True:
         next_index = text.find('#', current_index)
-        new_text += text[current_index:next_index]
 
         if next_index == -1:
-            return new_text.lower()
+            return new_text + text[current_index:]
+
+        new_text += text[current_index:next_index]
 
         if text[next_index:next_index+2] == '##':
             new_text += '#'
             current_index = next_index + 2
         elif text[next_index:next_index+6] == '#check':
+            if symbols:
+                new_text += '☑ ' if text[next_index+7:next_index+8] == '1' else '☐ '
             current_index = next_index + 8
         elif text[next_index:next_index+7] == '#bullet':
+            if symbols:
+                new_text += '• '
             current_index = next_index + 8
         elif text[next_index:next_index+4] == '#tag':
             current_index = text.find(':', next_index+6) + 1
         else:
-            current_index += 1
+            new_text += '#'
+            current_index = next_index + 1
+
+def markup_to_code(text):
+    # text notes are stored in the sticky internal markup, code notes as plain text
+    return plain_text(text, symbols=True)
+
+def code_to_markup(text):
+    # a literal '#' is written '##' in the internal markup
+    return text.replace('#', '##')
+
+def clean_text(text):
+    return plain_text(text).lower()
+
+@lru_cache(maxsize=4096)
+def preview_text(text):
+    # the same notes are previewed and searched over and over, and str hashes are cached,
+    # so keying on the raw text makes repeat lookups nearly free (lru_cache is thread safe)
+    return plain_text(text, symbols=True)
+
+def find_match(text, search_text):
+    """Return the (start, end) of the first case-insensitive occurrence of search_text in text, or None.
+
+    The offsets are in text itself; finding search_text in text.lower() can be
+    off, since some characters (like 'İ') change length when lowercased.
+    """
+    match = re.search(re.escape(search_text), text, re.IGNORECASE)
+    return match.span() if match else None
+
+def make_snippet(text, match=None, length=SNIPPET_LENGTH):
+    """Cut at most length characters of plain text out for a preview.
+
+    If match is a (start, end) range in text, the snippet is positioned so the
+    match is near its start. Returns (snippet, match) with match translated to
+    offsets in the snippet, or None.
+    """
+    if match is None:
+        snippet = text[:length]
+        if len(text) > length:
+            snippet += SNIPPET_ELLIPSIS
+        return (snippet, None)
+
+    (start, end) = match
+    # keep a little context before the match, starting at a word boundary where possible
+    snippet_start = max(0, start - length // 5)
+    if snippet_start > 0:
+        space = text.find(' ', snippet_start, start)
+        if space != -1:
+            snippet_start = space + 1
+
+    snippet = text[snippet_start:snippet_start + length]
+    prefix = SNIPPET_ELLIPSIS if snippet_start > 0 else ''
+    suffix = SNIPPET_ELLIPSIS if snippet_start + length < len(text) else ''
+
+    offset = len(prefix) - snippet_start
+    match = (start + offset, min(end, snippet_start + length) + offset)
+    return (prefix + snippet + suffix, match)
+
+def list_diff(old_keys, new_keys):
+    """Compute the splices that turn a list with old_keys into one with new_keys.
+
+    Returns (position, removed, start, end) tuples, meaning "remove `removed`
+    items at `position` and insert new items [start:end] there". They are
+    ordered from the end of the list backwards, so they can be applied one
+    after another (e.g. with Gio.ListStore.splice) without adjusting positions.
+    Keys must be hashable and should be unique.
+    """
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    splices = []
+    for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+        if tag != 'equal':
+            splices.append((i1, i2 - i1, j1, j2))
+
+    splices.reverse()
+    return splices